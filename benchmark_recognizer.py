@@ -0,0 +1,155 @@
+import os
+import sys
+import csv
+import time
+import pickle
+import tempfile
+import itertools
+import configparser
+import multiprocessing
+import wave
+
+import numpy as np
+
+# class imports
+from classes import VoskHandler, read_model_sample_rate
+
+
+# ------- ENTER BENCHMARK SETTINGS HERE --------
+# Every combination is run in a fresh process (so peak RSS belongs to one setting)
+chunk_sizes = [1000, 2000, 4000, 8000, 16000]
+set_words = [True, False]
+max_alternatives = [0, 3]
+defer_json = [False, True]
+
+# number of converted files (coversion_dict.pkl of preprocessing.py) to benchmark on; 0 = synthetic audio only
+max_files = 3
+# length in seconds of the synthetic audio; used if there are no converted files
+synthetic_seconds = 60
+# ------- END --------
+
+
+# Get relevant configs: input_path, model_path, csv_results_path
+config = configparser.ConfigParser()
+config.read('config.ini')
+input_path = config.get('DATACONFIG','input_path')
+results_dir = config.get('DATACONFIG','csv_results_path')
+model_path = config.get('MODELCONFIG','model_path')
+
+
+def peak_rss_mb():
+    # ru_maxrss is KB on Linux & bytes on macOS
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
+
+def write_synthetic_audio(path, seconds, sample_rate):
+    # speech-like test signal: bursts of amplitude modulated (~4 Hz syllable rate) harmonics + noise, with pauses
+    rng = np.random.default_rng(0)
+    parts = []
+    total = 0
+    while total < seconds * sample_rate:
+        n = int(rng.uniform(1.0, 3.0) * sample_rate)
+        t = np.arange(n) / sample_rate
+        pitch = rng.uniform(100, 220)
+        voiced = sum(np.sin(2 * np.pi * pitch * k * t) / k for k in range(1, 6))
+        envelope = 0.5 * (1 - np.cos(2 * np.pi * 4 * t))
+        burst = (voiced + 0.3 * rng.standard_normal(n)) * envelope
+        pause = np.zeros(int(rng.uniform(0.3, 1.5) * sample_rate))
+        parts += [burst, pause]
+        total += n + len(pause)
+    signal = np.concatenate(parts)[:seconds * sample_rate]
+    pcm = (signal / np.max(np.abs(signal)) * 8000).astype('<i2')
+    with wave.open(path, 'wb') as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(sample_rate)
+        wf.writeframes(pcm.tobytes())
+
+
+def get_audio_duration(path):
+    with wave.open(path, 'rb') as wf:
+        return wf.getnframes() / float(wf.getframerate())
+
+
+def run_setting(job):
+    # runs in its own process: load the model, transcribe all files with one setting, measure
+    options, audio_paths = job
+    vosky = VoskHandler("bench", model_path, **options)
+    vosky.initialize_model()
+    model_rss = peak_rss_mb()
+
+    num_words = 0
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    for path in audio_paths:
+        results = vosky.transcribe_audio_to_text(path)
+        for r in results or []:
+            alternatives = r.get('alternatives')
+            text = alternatives[0].get('text', '') if alternatives else r.get('text', '')
+            num_words += len(text.split())
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+
+    audio = sum(get_audio_duration(p) for p in audio_paths)
+    row = {
+        'chunk_frames': options['recognition_frame_rate'],
+        'words': options['words'],
+        'max_alternatives': options['max_alternatives'],
+        'defer_json': options['defer_json'],
+        'audio_s': round(audio, 2),
+        'wall_s': round(wall, 3),
+        'cpu_s': round(cpu, 3),
+        'rtf': round(wall / audio, 4) if audio > 0 else None,
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'model_rss_mb': round(model_rss, 1),
+        'num_words': num_words,
+    }
+    return row
+
+
+if __name__ == '__main__':
+    #*** ----- STEP1: Pick the audio: converted files or synthetic ----- ***#
+    audio_paths = []
+    dict_path = os.path.join(input_path, 'coversion_dict.pkl')
+    if max_files > 0 and os.path.exists(dict_path):
+        with open(dict_path, 'rb') as f:
+            converted_audios = pickle.load(f)
+        audio_paths = list(converted_audios.values())[:max_files]
+
+    tmp_dir = tempfile.TemporaryDirectory()
+    if len(audio_paths) == 0:
+        path = os.path.join(tmp_dir.name, 'synthetic.wav')
+        write_synthetic_audio(path, synthetic_seconds, read_model_sample_rate(model_path))
+        audio_paths = [path]
+        print(f"[INFO]No converted files found. Using {synthetic_seconds}s of synthetic audio.")
+    print(f"[INFO]Benchmarking on {len(audio_paths)} files.")
+
+    #*** ----- STEP2: Sweep the settings, one fresh process per setting ----- ***#
+    jobs = []
+    for chunk, w, alts, defer in itertools.product(chunk_sizes, set_words, max_alternatives, defer_json):
+        options = {'recognition_frame_rate': chunk, 'words': w, 'max_alternatives': alts, 'defer_json': defer}
+        jobs.append((options, audio_paths))
+
+    rows = []
+    with multiprocessing.Pool(processes=1, maxtasksperchild=1) as pool:
+        for i, row in enumerate(pool.imap(run_setting, jobs)):
+            print("[INFO][{}/{}] chunk={chunk_frames} words={words} alts={max_alternatives} defer={defer_json}: "
+                  "RTF {rtf}, CPU {cpu_s}s, peak RSS {peak_rss_mb} MB".format(i + 1, len(jobs), **row))
+            rows.append(row)
+    tmp_dir.cleanup()
+
+    #*** ----- STEP3: Report, fastest first ----- ***#
+    rows.sort(key=lambda r: r['rtf'])
+    fields = list(rows[0].keys())
+    print("\n" + " | ".join(fields))
+    for row in rows:
+        print(" | ".join(str(row[f]) for f in fields))
+
+    target = os.path.join(results_dir, 'benchmark_recognizer.csv')
+    with open(target, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f"\n[INFO]Saved benchmark under '{target}'.")
@@ -0,0 +1,164 @@
+import os
+import sys
+import csv
+import ast
+import json
+import statistics
+import subprocess
+import configparser
+
+
+# Startup-time benchmark of the entry points: runs the startup of every script in a fresh python (-X importtime),
+# so the time is what a run (or a spawned worker) pays before doing any work. The startup is the module body up
+# to `if __name__ == '__main__':` (imports, config.ini of the current dir, grammar, caches); scripts without that
+# guard do all their work at module level, so only their imports are run.
+# Fails (exit code 1) if a script loads a library of another stage or got slower than the saved baseline.
+
+# ------- ENTER BENCHMARK SETTINGS HERE --------
+# script -> heavy libraries it must NOT load at startup (they are imported on first use)
+entry_points = {
+    'preprocessing.py': ['vosk', 'sklearn', 'scipy', 'werpy', 'pydub'],
+    'recognize_audio.py': ['sklearn', 'scipy', 'werpy', 'pydub'],
+    'transcription_service.py': ['sklearn', 'scipy', 'werpy', 'pydub'],
+    'calculations.py': ['vosk', 'pydub', 'sklearn', 'scipy', 'werpy'],
+    'pipeline.py': ['vosk', 'sklearn', 'scipy', 'werpy', 'pydub'],
+    'shard_worker.py': ['vosk', 'sklearn', 'scipy', 'werpy', 'pydub'],
+    'model_sweep.py': ['vosk', 'sklearn', 'scipy', 'werpy', 'pydub'],
+}
+# fresh processes per script; the median is reported
+repeats = 5
+# allowed slowdown against the baseline: factor & absolute seconds (small times are noisy)
+max_slowdown = 1.5
+min_slack_s = 0.05
+# number of slowest top level imports listed per script
+top_imports = 5
+# True: save this run as the new baseline
+update_baseline = False
+# ------- END --------
+
+
+# Get relevant configs: csv_results_path
+config = configparser.ConfigParser()
+config.read('config.ini')
+results_dir = config.get('DATACONFIG','csv_results_path')
+
+heavy_modules = sorted({m for modules in entry_points.values() for m in modules} | {'numpy', 'docx'})
+baseline_path = os.path.join(results_dir, 'startup_baseline.json')
+# the scripts & classes.py are next to this file
+package_dir = os.path.dirname(os.path.abspath(__file__))
+
+
+def is_main_guard(node):
+    # if __name__ == '__main__':
+    return (isinstance(node, ast.If) and isinstance(node.test, ast.Compare)
+            and isinstance(node.test.left, ast.Name) and node.test.left.id == '__name__')
+
+
+def get_startup_code(script):
+    # the module body of the script up to its main guard; only the top level imports if it has none
+    with open(os.path.join(package_dir, script), 'r') as f:
+        tree = ast.parse(f.read(), script)
+    startup = []
+    for node in tree.body:
+        if is_main_guard(node):
+            return ast.unparse(ast.Module(body=startup, type_ignores=[]))
+        startup.append(node)
+    imports = [node for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+    return ast.unparse(ast.Module(body=imports, type_ignores=[]))
+
+
+def run_startup(code):
+    # one fresh process: wall time of the startup, heavy libraries loaded & the -X importtime profile
+    # (runs in the current dir, so the scripts read the same config.ini as a real run)
+    probe = ("import time, sys, json\n"
+             "sys.path.insert(0, %r)\n" % (package_dir,)
+             + "_start = time.perf_counter()\n"
+             + code + "\n"
+             "_wall = time.perf_counter() - _start\n"
+             "print(json.dumps({'wall': _wall, 'modules': sorted(m for m in %r if m in sys.modules)}))\n"
+             % (heavy_modules,))
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', probe], capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else 'startup failed')
+    return json.loads(proc.stdout.strip().splitlines()[-1]), parse_importtime(proc.stderr)
+
+
+def parse_importtime(stderr):
+    # {top level module: cumulative seconds}; lines look like "import time:  self [us] | cumulative | name"
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if name.startswith('  '):
+            continue
+        times[name.strip()] = int(cumulative) / 1e6
+    return times
+
+
+if __name__ == '__main__':
+    baseline = {}
+    if os.path.exists(baseline_path) and not update_baseline:
+        with open(baseline_path, 'r') as f:
+            baseline = json.load(f)
+
+    #*** ----- STEP1: Start every entry point in fresh processes ----- ***#
+    rows = []
+    failures = []
+    for script, forbidden in entry_points.items():
+        if not os.path.exists(os.path.join(package_dir, script)):
+            print(f"[WARNING]'{script}' doesn't exist. Skipping it.")
+            continue
+        code = get_startup_code(script)
+        walls = []
+        try:
+            for _ in range(repeats):
+                result, times = run_startup(code)
+                walls.append(result['wall'])
+        except RuntimeError as err:
+            print(f"[ERROR]The startup of '{script}' failed: {err}")
+            failures.append(script)
+            continue
+        wall = statistics.median(walls)
+        loaded = [m for m in forbidden if m in result['modules']]
+
+        print(f"\n[INFO]{script}: {wall:.3f}s (median of {repeats}); heavy libraries: {', '.join(result['modules']) or '-'}")
+        for name, t in sorted(times.items(), key=lambda x: -x[1])[:top_imports]:
+            print(f"\t{t:.3f}s  {name}")
+
+        #*** ----- STEP2: Guard against regressions ----- ***#
+        if loaded:
+            print(f"[ERROR]{script} loads {', '.join(loaded)} at startup. Import them on first use instead.")
+            failures.append(script)
+        base = baseline.get(script)
+        if base is not None and wall > max(base * max_slowdown, base + min_slack_s):
+            print(f"[ERROR]{script} starts in {wall:.3f}s; the baseline is {base:.3f}s.")
+            failures.append(script)
+
+        rows.append({
+            'script': script,
+            'wall_s': round(wall, 4),
+            'min_wall_s': round(min(walls), 4),
+            'baseline_s': round(base, 4) if base is not None else None,
+            'heavy_modules': ' '.join(result['modules']),
+            'forbidden_loaded': ' '.join(loaded),
+        })
+
+    #*** ----- STEP3: Report & baseline ----- ***#
+    if len(rows) > 0:
+        target = os.path.join(results_dir, 'benchmark_startup.csv')
+        with open(target, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+            writer.writeheader()
+            writer.writerows(rows)
+        print(f"\n[INFO]Saved benchmark under '{target}'.")
+
+    if update_baseline or (not baseline and not failures):
+        with open(baseline_path, 'w') as f:
+            json.dump({row['script']: row['wall_s'] for row in rows}, f, indent=2)
+        print(f"[INFO]Saved baseline under '{baseline_path}'.")
+
+    if failures:
+        print(f"[FATAL]Startup regression in: {', '.join(sorted(set(failures)))}.")
+        sys.exit(1)
+    print("[INFO]No startup regressions.")
@@ -1,8 +1,10 @@
 import os
+import json
 import configparser
 
 
-from classes import CompareHandler
+from classes import CompareHandler, BatchCompareHandler, ResultsStore, NormalizationCache, MetricsCache, profiler
+from classes import hash_file
 
 
 # Get relevant configs: input_path
@@ -11,32 +13,104 @@ config.read('config.ini')
 ai_transcripts_path = config.get('DATACONFIG','output_dir')
 original_dir = config.get('DATACONFIG','orig_transcripts_path')
 results_dir = config.get('DATACONFIG','csv_results_path')
+input_path = config.get('DATACONFIG','input_path')
+model_path = config.get('MODELCONFIG','model_path')
+# 'csv', 'sqlite' or 'parquet'
+results_backend = config.get('RESULTSCONFIG', 'results_backend', fallback='csv')
+
+# stage timings & resources of this run (see StageProfiler); saved under csv_results_path
+if config.getboolean('PROFILECONFIG', 'profile', fallback=False):
+    profiler.enable(config.get('PROFILECONFIG', 'cprofile_stage', fallback=''))
+
+# normalized & tokenized transcripts are cached (by content), so an original is normalized only once
+# for all the models & settings evaluated against it
+normalization_cache = None
+if config.getboolean('EVALUATIONCONFIG', 'normalization_cache', fallback=True):
+    normalization_cache = NormalizationCache("normalization", os.path.join(results_dir, 'normalization_cache'))
+
+# metrics of a pair are cached by the content of both files, so a rerun only evaluates new & changed pairs
+metrics_cache = None
+if config.getboolean('EVALUATIONCONFIG', 'metrics_cache', fallback=True):
+    metrics_cache = MetricsCache("metrics", os.path.join(results_dir, 'metrics_cache.json'))
+
+
+# transcription infos (time, audio length) are taken from the job manifest of recognize_audio.py
+jobs = {}
+manifest_path = os.path.join(input_path, 'job_manifest.json')
+if os.path.exists(manifest_path):
+    with open(manifest_path, 'r') as f:
+        jobs = json.load(f)
 
 
 # GET List of Tuples:  [(ai_file, original_file), ...]
+# both dirs are listed once; the originals are looked up by file name
+originals = {f: os.path.join(original_dir, f) for f in os.listdir(original_dir)}
 list_of_comparison_tuples = []
 # iterate over output file dir
-for out_file in os.listdir(ai_transcripts_path):
-    ai_file = os.path.join(ai_transcripts_path, out_file)
-    if out_file in os.listdir(original_dir):
-        original_file = os.path.join(original_dir, out_file)
-        list_of_comparison_tuples.append((ai_file, original_file))
+for out_file in sorted(os.listdir(ai_transcripts_path)):
+    if out_file in originals:
+        list_of_comparison_tuples.append((os.path.join(ai_transcripts_path, out_file), originals[out_file]))
 
 
-# CALCULATE and SAVE as csv
+# TAKE cached metrics of unchanged pairs; READ & NORMALIZE the others
+rows = {}
+keys = {}
+comparisons = []
 for pair in list_of_comparison_tuples:
     # Take from input path: only filename & strip ext
     ai_file, original_file = pair
-    print(pair)
     name = str(os.path.splitext(os.path.basename(ai_file))[0])
-    print("Results for {}.".format(name))
+
+    if metrics_cache is not None:
+        with profiler.stage('hash', name):
+            keys[name] = metrics_cache.get_key(hash_file(original_file), hash_file(ai_file))
+        row = metrics_cache.get(keys[name], name)
+        if row is not None:
+            rows[name] = row
+            continue
+    print(pair)
 
     with open(original_file, 'r', encoding= 'unicode_escape') as f: original_f = f.read()
     with open(ai_file, 'r', encoding= 'unicode_escape') as f: ai_f = f.read()
 
 
-    Comparison = CompareHandler(name, original_f, ai_f)
-    Comparison.results_to_csv(results_dir)
+    comparisons.append(CompareHandler(name, original_f, ai_f, normalization_cache))
+
+
+# CALCULATE distances of all new pairs at once (one shared vocabulary & sparse matrix)
+distances = {}
+if len(comparisons) > 0:
+    distances = BatchCompareHandler("batch", comparisons).calculate_distances()
+
+for Comparison in comparisons:
+    rows[Comparison.name] = Comparison.get_results(distances=distances[Comparison.name])
+    if metrics_cache is not None:
+        metrics_cache.add(keys[Comparison.name], rows[Comparison.name])
+
+if metrics_cache is not None:
+    metrics_cache.save()
+    print(f"[INFO]Evaluated {metrics_cache.misses} pairs; {metrics_cache.hits} unchanged pairs were taken from the metrics cache.")
+
+
+# COLLECT one row per file & SAVE all rows at once
+store = ResultsStore("results", results_dir, results_backend, run_metadata={'model_path': model_path})
+for pair in list_of_comparison_tuples:
+    name = str(os.path.splitext(os.path.basename(pair[0]))[0])
+    print("Results for {}.".format(name))
+    row = rows[name]
+
+    job = jobs.get(name, {})
+    audio_duration = job.get('audio_duration')
+    transcription_time = job.get('elapsed')
+    row['audio_duration'] = audio_duration
+    row['transcription_time'] = transcription_time
+    row['rtf'] = transcription_time / audio_duration if audio_duration and transcription_time is not None else None
+    store.add_row(row)
+
+store.write()
+
+profiler.print_summary()
+profiler.save(results_dir)
 
 
 
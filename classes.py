@@ -1,42 +1,510 @@
 import os
 import sys
-import glob
 import pathlib
-from pydub import AudioSegment
+import time
+import bisect
+import itertools
+import hashlib
+import hmac
+import concurrent.futures
+import asyncio
+import subprocess
+import tempfile
+import multiprocessing
+import threading
+import socket
+import urllib.request
+import urllib.error
+import contextlib
+import cProfile
+import pstats
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+#peak memory of the process (not available on windows)
+try:
+    import resource
+except ImportError:
+    resource = None
 
 #to check wether audio conversion to mono worked 
 import wave
 
-#Imports for vosk
-from vosk import Model, KaldiRecognizer, SetLogLevel
+#NOTE: the heavy libraries are imported on first use, inside the methods that need them
+#(pydub: AudioHandler.convert_pydub; vosk: VoskHandler; werpy, sklearn & scipy: the compare handlers),
+#so every stage & worker process only loads its own dependencies. benchmark_startup.py guards this.
 
 import json #chungs return by Kaldi/vosk come in json format
 import csv #for saving chunks as csv file
 #NOTE: AUDIO CHECKING (e.g. for mono) is done in AudioHandler & VoskHandler. This is a little redundant (create parent clas?)
 
-# for docx output
-import docx
-from docx.shared import RGBColor
-
-# for distance calculations
-from sklearn.feature_extraction.text import CountVectorizer 
 import numpy as np 
-from scipy.spatial import distance 
 
-# Word Error Rate Calculation 
-import werpy
 
 
+def hash_file(path, chunk_size=1024*1024):
+    #sha256 of the file content, read in chunks so big audio files don't end up in RAM
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(chunk_size)
+            if not block:
+                break
+            h.update(block)
+    return h.hexdigest()
+
+def get_werpy_version():
+    #version of the normalizer (part of the cache keys); read from the package metadata, so the caches
+    #can be created at startup without importing werpy
+    from importlib import metadata
+    try:
+        return metadata.version('werpy')
+    except metadata.PackageNotFoundError:
+        return 'unknown'
+
+
+# What happens when an output file exists already (see commit_file)
+OUTPUT_POLICIES = ('skip', 'overwrite', 'version', 'fail')
+
+def start_ffmpeg(cmd):
+    #Starts ffmpeg with its output on a pipe (proc.stdout). The error output goes to a temp file, not a second
+    #pipe: a stderr pipe nobody reads while stdout is read fills up on many decode errors & blocks both processes
+    err_file = tempfile.TemporaryFile()
+    try:
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=err_file)
+    except BaseException:
+        err_file.close()
+        raise
+    proc.err_file = err_file
+    return proc
+
+
+def finish_ffmpeg(proc):
+    #Closes ffmpeg's output, waits for it & returns its error output (check proc.returncode afterwards)
+    proc.stdout.close()
+    proc.wait()
+    proc.err_file.seek(0)
+    err = proc.err_file.read().decode('utf-8', 'replace')
+    proc.err_file.close()
+    return err
+
+
+def get_temp_path(path, suffix='.tmp'):
+    #temp name next to path (same filesystem, so the rename is atomic), unique per process & thread
+    return "{}.{}-{}{}".format(path, os.getpid(), threading.get_ident(), suffix)
+
+def get_versioned_path(path, version):
+    root, ext = os.path.splitext(path)
+    return "{}_v{}{}".format(root, version, ext)
+
+def commit_file(tmp_path, path, policy='overwrite'):
+    #Moves a completely written temp file to path. If path exists already, policy decides:
+    #   overwrite: the new file replaces it
+    #   skip:      the existing file is kept & the new one dropped
+    #   version:   the existing file is kept & the new one saved as <name>_v2<ext> (_v3, ...)
+    #   fail:      FileExistsError
+    #Except for overwrite the name is claimed with os.link, which fails if the target exists,
+    #so processes writing into the same dir at once can't take the same name.
+    #Returns the path the file was saved under, or None if it was skipped.
+    paths = commit_files([tmp_path], [path], policy)
+    return paths[0] if paths is not None else None
+
+def claim_path(tmp_path, target):
+    #Returns True if the temp file is now (also) under target, False if target exists already
+    try:
+        os.link(tmp_path, target)
+        return True
+    except FileExistsError:
+        return False
+    except OSError:
+        # filesystem without hard links: same policies, but not safe against other processes
+        if os.path.exists(target):
+            return False
+        os.replace(tmp_path, target)
+        return True
+
+def commit_files(tmp_paths, paths, policy='overwrite'):
+    #commit_file() for files that belong together (e.g. text & word timings of one transcript):
+    #with 'version' all of them get the same _vN, with 'skip' & 'fail' none is saved if one of them exists.
+    #Returns the list of paths the files were saved under, or None if they were skipped.
+    if policy not in OUTPUT_POLICIES:
+        raise ValueError(f"Unknown overwrite policy '{policy}'. Use one of {OUTPUT_POLICIES}.")
+    if policy == 'overwrite':
+        for tmp_path, path in zip(tmp_paths, paths):
+            os.replace(tmp_path, path)
+        return list(paths)
+    version = 1
+    while True:
+        targets = [path if version == 1 else get_versioned_path(path, version) for path in paths]
+        claimed = []
+        for tmp_path, target in zip(tmp_paths, targets):
+            if not claim_path(tmp_path, target):
+                break
+            claimed.append((tmp_path, target))
+        if len(claimed) == len(targets):
+            break
+        # one name is taken: the names claimed so far are given back
+        for tmp_path, target in claimed:
+            if os.path.exists(tmp_path):
+                os.remove(target)
+            else:
+                os.replace(target, tmp_path)
+        if policy in ('skip', 'fail'):
+            for tmp_path in tmp_paths:
+                os.remove(tmp_path)
+            if policy == 'fail':
+                raise FileExistsError(f"'{targets[len(claimed)]}' exists already.")
+            print(f"[INFO]'{targets[len(claimed)]}' exists already and is kept.")
+            return None
+        version += 1
+    for tmp_path in tmp_paths:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    if version > 1:
+        print("[INFO]'{}' exists already. Saved as '{}'.".format(paths[0], "', '".join(targets)))
+    return targets
+
+def write_file_atomic(path, write, policy='overwrite', mode='w', **open_args):
+    #Calls write(f) on a temp file & moves it to path with commit_file(), so readers never see a
+    #half written file. Returns the path the file was saved under (None if skipped).
+    tmp_path = get_temp_path(path)
+    try:
+        with open(tmp_path, mode, **open_args) as f:
+            write(f)
+        return commit_file(tmp_path, path, policy)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def write_json_atomic(path, data):
+    #Write to a temp file next to the target & rename it, so readers never see a half written file
+    write_file_atomic(path, lambda f: json.dump(data, f, indent=1))
+
+
+def shift_result_times(result, offset):
+    #Shifts 'start' & 'end' of every word in a vosk result by offset seconds
+    if offset != 0:
+        #with SetMaxAlternatives > 0 every alternative has its own word list
+        for alternative in [result] + result.get('alternatives', []):
+            for obj in alternative.get('result', []):
+                obj['start'] += offset
+                obj['end'] += offset
+    return result
+
+
+def get_result_words(sentence):
+    #Returns the words of one vosk result as list of dicts (word, start, end, conf).
+    #With SetMaxAlternatives > 0 the words of the best alternative are taken (they have no 'conf').
+    #With SetWords(False) there is only the text, so the words have no times either.
+    if 'alternatives' in sentence:
+        if len(sentence['alternatives']) == 0:
+            return []
+        sentence = sentence['alternatives'][0]
+    if 'result' in sentence:
+        return sentence['result']
+    # sometimes there are bugs in recognition and it returns an empty dictionary {'text': ''}
+    return [{'word': word} for word in sentence.get('text', '').split()]
+
+
+def read_model_sample_rate(model_path, default=16000):
+    #Vosk models store their feature config in conf/mfcc.conf (e.g. '--sample-frequency=16000').
+    #Returns the sample rate the model expects, or default if it can't be found.
+    for conf in (os.path.join(model_path, 'conf', 'mfcc.conf'), os.path.join(model_path, 'am', 'conf', 'mfcc.conf')):
+        if not os.path.exists(conf):
+            continue
+        with open(conf) as f:
+            for line in f:
+                if line.strip().startswith('--sample-frequency='):
+                    try:
+                        return int(float(line.strip().split('=', 1)[1]))
+                    except ValueError:
+                        break
+    return default
+
+
+def model_supports_grammar(model_path):
+    #Runtime grammars need the dynamic graph of the model (graph/HCLr.fst & graph/Gr.fst; flat in older models).
+    #A model with a static graph (HCLG.fst, e.g. the big models) ignores the grammar; vosk only logs a warning,
+    #which SetLogLevel(-1) hides. True if the model isn't there (initialize_model stops on a missing model).
+    if not os.path.isdir(model_path):
+        return True
+    for graph_dir in (os.path.join(model_path, 'graph'), model_path):
+        if os.path.exists(os.path.join(graph_dir, 'HCLr.fst')) and os.path.exists(os.path.join(graph_dir, 'Gr.fst')):
+            return True
+    return False
+
+
+def read_vosk_options(config):
+    #Keyword arguments for VoskHandler from the PROCESSCONFIG & RECOGNIZERCONFIG sections of config.ini
+    vosk_options = {
+        'checkpoint_interval': config.getfloat('PROCESSCONFIG', 'checkpoint_interval', fallback=60.0),
+        'segment_threads': config.getint('PROCESSCONFIG', 'segment_threads', fallback=1),
+        'segment_seconds': config.getfloat('PROCESSCONFIG', 'segment_seconds', fallback=300.0),
+        'recognition_frame_rate': config.getint('RECOGNIZERCONFIG', 'chunk_frames', fallback=4000),
+        'words': config.getboolean('RECOGNIZERCONFIG', 'words', fallback=True),
+        'max_alternatives': config.getint('RECOGNIZERCONFIG', 'max_alternatives', fallback=0),
+        'defer_json': config.getboolean('RECOGNIZERCONFIG', 'defer_json', fallback=False),
+        'silence_options': None,
+    }
+    if config.getboolean('RECOGNIZERCONFIG', 'skip_silence', fallback=False):
+        vosk_options['silence_options'] = {
+            'threshold_db': config.getfloat('RECOGNIZERCONFIG', 'silence_threshold_db', fallback=-40.0),
+            'min_silence': config.getfloat('RECOGNIZERCONFIG', 'min_silence', fallback=1.0),
+            'keep_silence': config.getfloat('RECOGNIZERCONFIG', 'keep_silence', fallback=0.3),
+        }
+    vosk_options['grammar'] = read_grammar(config)
+    return vosk_options
+
+
+# VoskHandler options that change the transcript, with their defaults (see get_options_hash).
+# Chunk size, checkpoint interval & defer_json only change how fast it is done.
+RESULT_OPTIONS = {'words': True, 'max_alternatives': 0, 'silence_options': None, 'segment_threads': 1,
+                  'segment_seconds': 300.0, 'grammar': None}
+
+def get_options_hash(vosk_options, model_path=None):
+    #Hash of the options (keyword arguments of VoskHandler) a transcript was made with; stored in the job manifest
+    #& the checkpoints, so a file is transcribed again when they change. The grammar is hashed as the phrase list
+    #it resolved to, i.e. everything in the key of its GrammarCache entry (sources, mode, max phrases) is covered.
+    #model_path: a grammar the model can't use is left out (VoskHandler drops it, see model_supports_grammar)
+    options = {key: vosk_options.get(key, default) for key, default in RESULT_OPTIONS.items()}
+    if model_path is not None and not model_supports_grammar(model_path):
+        options['grammar'] = None
+    #segments are only cut with more than one thread; how many threads doesn't matter
+    options['segment_seconds'] = options['segment_seconds'] if options['segment_threads'] > 1 else None
+    options['segment_threads'] = options['segment_threads'] > 1
+    return hashlib.sha256(json.dumps(options, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+def read_grammar(config, mode=None):
+    #Phrase list for grammar-constrained recognition (see GrammarCache) from the RECOGNIZERCONFIG section,
+    #or None if grammar_mode is '' (full search space of the model). mode overrides grammar_mode.
+    if mode is None:
+        mode = config.get('RECOGNIZERCONFIG', 'grammar_mode', fallback='')
+    if not mode:
+        return None
+    source = config.get('RECOGNIZERCONFIG', 'grammar_source', fallback='originals')
+    if source == 'originals':
+        # the original transcripts are read like in the evaluation
+        original_dir = config.get('DATACONFIG','orig_transcripts_path')
+        paths = [os.path.join(original_dir, f) for f in sorted(os.listdir(original_dir)) if f.endswith('.txt')]
+        encoding = 'unicode_escape'
+    else:
+        # vocabulary file: one word or phrase per line
+        paths = [source]
+        encoding = 'utf-8'
+    cache = GrammarCache("grammar", os.path.join(config.get('DATACONFIG','csv_results_path'), 'grammar_cache'))
+    return cache.get_grammar(paths, mode, config.getint('RECOGNIZERCONFIG', 'grammar_max_phrases', fallback=0), encoding)
+
+
+class StageProfiler():
+    # Records wall time, CPU time, peak memory & bytes read/written per stage (e.g. 'decode', 'recognition')
+    # and file. Calls of the same stage & file are summed up, so a stage may be entered once per chunk.
+    # Disabled by default: stage() then costs one attribute lookup.
+    #   with profiler.stage('decode', file):
+    #       ...
+    # NOTE CPU time is the time of the calling thread; bytes (from /proc/self/io, linux only) & peak memory
+    # belong to the whole process, so stages running at the same time in other threads are included there.
+    def __init__(self, name):
+        self.name = name
+        self.enabled = False
+        #stage whose calls are run under cProfile ('' = none)
+        self.cprofile_stage = ''
+        self.cprofile = None
+        self.cprofile_lock = threading.Lock()
+        self.run_id = time.strftime('%Y%m%d-%H%M%S')
+
+        #key=(stage, file); value=dict of summed metrics
+        self.records = {}
+        self.lock = threading.Lock()
+
+    def __str__(self):
+        return self.name
+
+    def enable(self, cprofile_stage=''):
+        self.enabled = True
+        self.cprofile_stage = cprofile_stage
+        if cprofile_stage:
+            self.cprofile = cProfile.Profile()
+
+    def read_io(self):
+        #(bytes read, bytes written) of the process, or (0, 0) if unknown
+        try:
+            with open('/proc/self/io', 'rb') as f:
+                io = dict(line.split(b':') for line in f.read().splitlines())
+            return int(io[b'rchar']), int(io[b'wchar'])
+        except (OSError, KeyError, ValueError):
+            return 0, 0
+
+    def read_peak_rss(self):
+        #peak resident memory of the process in MB (linux reports kB)
+        if resource is None:
+            return 0.0
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+    def stage(self, stage, file=None):
+        if not self.enabled:
+            return contextlib.nullcontext()
+        return self.measure(stage, file)
+
+    @contextlib.contextmanager
+    def measure(self, stage, file):
+        use_cprofile = self.cprofile is not None and stage == self.cprofile_stage
+        peak_start = self.read_peak_rss()
+        read_start, write_start = self.read_io()
+        cpu_start = time.thread_time()
+        wall_start = time.perf_counter()
+        if use_cprofile:
+            # cProfile can't run twice at once (threads); the other calls are measured without it
+            use_cprofile = self.cprofile_lock.acquire(blocking=False)
+            if use_cprofile:
+                self.cprofile.enable()
+        try:
+            yield
+        finally:
+            if use_cprofile:
+                self.cprofile.disable()
+                self.cprofile_lock.release()
+            wall = time.perf_counter() - wall_start
+            cpu = time.thread_time() - cpu_start
+            read_end, write_end = self.read_io()
+            peak_end = self.read_peak_rss()
+            self.add(stage, file, {'calls': 1, 'wall_s': wall, 'cpu_s': cpu,
+                                   'peak_rss_mb': peak_end, 'rss_growth_mb': peak_end - peak_start,
+                                   'read_bytes': read_end - read_start, 'write_bytes': write_end - write_start})
+
+    def add(self, stage, file, metrics):
+        key = (stage, '' if file is None else str(file))
+        with self.lock:
+            record = self.records.get(key)
+            if record is None:
+                self.records[key] = dict(metrics)
+                return
+            for k, v in metrics.items():
+                record[k] = max(record[k], v) if k == 'peak_rss_mb' else record[k] + v
+
+    def reset_records(self):
+        #for a worker process: a forked child starts with a copy of the parent's records (& maybe of a lock a
+        #thread of the parent held), which would be sent back & merged a second time
+        self.lock = threading.Lock()
+        self.records = {}
+
+    def pop_records(self):
+        #records as a list (e.g. to send them from a worker process to the main process) & reset
+        with self.lock:
+            records = [dict(stage=stage, file=file, **metrics) for (stage, file), metrics in self.records.items()]
+            self.records = {}
+        return records
+
+    def merge(self, records):
+        for record in records:
+            record = dict(record)
+            self.add(record.pop('stage'), record.pop('file'), record)
+
+    def get_rows(self):
+        rows = []
+        for (stage, file), metrics in self.records.items():
+            row = {'run_id': self.run_id, 'stage': stage, 'file': file}
+            row.update(metrics)
+            rows.append(row)
+        return rows
+
+    def get_summary(self):
+        #one row per stage, summed over the files
+        summary = {}
+        for (stage, file), metrics in self.records.items():
+            row = summary.setdefault(stage, {'stage': stage, 'files': 0, 'calls': 0, 'wall_s': 0.0, 'cpu_s': 0.0,
+                                             'peak_rss_mb': 0.0, 'read_bytes': 0, 'write_bytes': 0})
+            row['files'] += 1
+            for k in ('calls', 'wall_s', 'cpu_s', 'read_bytes', 'write_bytes'):
+                row[k] += metrics[k]
+            row['peak_rss_mb'] = max(row['peak_rss_mb'], metrics['peak_rss_mb'])
+        return sorted(summary.values(), key=lambda row: -row['wall_s'])
+
+    def print_summary(self):
+        rows = self.get_summary()
+        if len(rows) == 0:
+            return
+        total = sum(row['wall_s'] for row in rows)
+        print("[INFO]Profile of run {} (stages may overlap or be nested):".format(self.run_id))
+        print("{:<16}{:>7}{:>9}{:>10}{:>10}{:>7}{:>10}{:>10}{:>10}".format(
+            'stage', 'files', 'calls', 'wall_s', 'cpu_s', 'wall%', 'peak_MB', 'read_MB', 'write_MB'))
+        for row in rows:
+            print("{:<16}{:>7}{:>9}{:>10.2f}{:>10.2f}{:>7.1f}{:>10.0f}{:>10.1f}{:>10.1f}".format(
+                row['stage'], row['files'], row['calls'], row['wall_s'], row['cpu_s'],
+                100 * row['wall_s'] / total if total > 0 else 0.0, row['peak_rss_mb'],
+                row['read_bytes'] / 1024 / 1024, row['write_bytes'] / 1024 / 1024))
+
+    def save(self, profile_dir):
+        #writes profile_<run_id>.json (rows + summary) & profile_<run_id>.csv (rows); with a cProfile
+        #stage also profile_<run_id>_<stage>.prof (open with pstats or snakeviz) & prints its top functions
+        if not self.enabled:
+            return
+        base = os.path.join(profile_dir, 'profile_{}'.format(self.run_id))
+        rows = self.get_rows()
+        with open(base + '.json', 'w') as f:
+            json.dump({'run_id': self.run_id, 'rows': rows, 'summary': self.get_summary()}, f, indent=2)
+        if len(rows) > 0:
+            with open(base + '.csv', 'w', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+                writer.writeheader()
+                writer.writerows(rows)
+        print(f"[INFO]Saved the profile under '{base}.json'.")
+
+        if self.cprofile is not None:
+            # NOTE only calls in this process are profiled (not in the workers of TranscriptionPool)
+            self.cprofile.create_stats()
+            if len(self.cprofile.stats) == 0:
+                print(f"[WARNING]Stage '{self.cprofile_stage}' didn't run in this process. There is no cProfile output.")
+                return
+            prof_path = '{}_{}.prof'.format(base, self.cprofile_stage)
+            self.cprofile.dump_stats(prof_path)
+            print(f"[INFO]cProfile of stage '{self.cprofile_stage}' saved under '{prof_path}'. Top functions:")
+            pstats.Stats(prof_path).sort_stats('cumulative').print_stats(15)
+
+
+# Profiler used by all handlers (see StageProfiler); scripts enable it with the PROFILECONFIG section
+profiler = StageProfiler("profiler")
+
+
+def downmix_pcm16(data, channels):
+    #Interleaved 16-bit PCM (bytes) -> mono 16-bit PCM (bytes); mean of all channels per frame
+    if channels == 1:
+        return data
+    samples = np.frombuffer(data, dtype=np.int16).reshape(-1, channels)
+    return (samples.sum(axis=1, dtype=np.int32) // channels).astype(np.int16).tobytes()
+
 
 class AudioHandler():
     def __init__(self, name, 
                 input=None, 
-                audio_format='.wav'):
+                audio_format='.wav',
+                target_frame_rate=16000,
+                max_cache_size_mb=0,
+                streaming=True,
+                block_seconds=10.0):
 
         self.name = name
 
         self.input = input
         self.audio_format = audio_format
+        #sample rate of the converted files; should match the sample rate the vosk model was trained on
+        self.target_frame_rate = target_frame_rate
+        #size limit of the conversion cache in the convert dir (0 = no limit)
+        self.max_cache_size = int(max_cache_size_mb * 1024 * 1024)
+        #streaming conversion: decode, downmix & write block by block (memory = one block, not the whole file).
+        #False: the old pydub path, which holds the whole decoded file (twice) in memory
+        self.streaming = streaming
+        #seconds of audio per block in the streaming conversion
+        self.block_seconds = block_seconds
+
+        #conversions can run in threads; the cache & its manifest are shared
+        self.cache_lock = threading.Lock()
+
+        #conversion cache; key=hash of input file + conversion params. Filled by create_convert_dir()
+        self.cache = {}
+        self.cache_manifest_path = None
+        #key=filename (no ext); value=cache key of the files handled in this run
+        self.run_keys = {}
 
         self.accepted_audio_formats = ['.wav', '.mp3', '.m4a', '.ogg', '.aiff', '.wma']
 
@@ -59,44 +527,80 @@ class AudioHandler():
 
     #used during setup()
     def create_convert_dir(self):
-        #Takes self.input_dir. Tries to create a dir 'convert' inside this dir.
-        #If dir exists, it counts number of files in it.
-        #Then prompts user input wether to clear the dir or abandon the script.
-        #NOTE dir should be cleared at the end of the script
-
-        #create dir to store converted files in
+        #Takes self.input_dir. Creates a dir 'convert' inside this dir if it doesn't exist yet.
+        #The dir is a persistent conversion cache: files are named after their cache key
+        #and described in 'cache_manifest.json', so an existing dir is simply reused.
         target_convert_path = os.path.join(self.input_dir, 'convert')
-        if os.path.isdir(target_convert_path):
-            print("\n[WARNING]Tried to create dir for converted files at\n\t'{}'\t-- Directory already exists.".format(target_convert_path))
-            #check if there are files in the dir
-            num_files = len(os.listdir(target_convert_path))
-            
-            if num_files > 0:
-                print("[INFO]There are {} files in the dir.".format(num_files))
-
-                while True:
-                    inp = input("[PROMPT]Enter 'yes' to delete all the files in the dir. Script will continue afterwards.\nEnter 'no' to abandon script.\n")
-                    if str(inp).lower() == 'yes': 
-                        #delete all files in target dir.
-                        files = glob.glob(os.path.join(target_convert_path, '*'))
-                        for f in files:
-                            os.remove(f)
-                        break
-                    elif str(inp).lower() == 'no':
-                        print("[FATAL]The script will be abandoned. Handle the dir manually and start again.\nDIR in question: ", target_convert_path)
-                        exit()
-                    else:
-                        print("[WARNING]This was not a valid input.")
-            else:
-                print("[INFO]Directory is empty. Script will continue using this dir.")
-
-        else:
+        if not os.path.isdir(target_convert_path):
             os.mkdir(target_convert_path)
 
         self.convert_dir = target_convert_path
+        self.load_cache_manifest()
+
+    def load_cache_manifest(self):
+        #manifest: key=cache key; value=dict with name, source, file, size, last_used, params
+        self.cache_manifest_path = os.path.join(self.convert_dir, 'cache_manifest.json')
+        self.cache = {}
+        if os.path.exists(self.cache_manifest_path):
+            try:
+                with open(self.cache_manifest_path, 'r') as f:
+                    self.cache = json.load(f)
+            except Exception as err:
+                print("[WARNING]Couldn't read the cache manifest. Starting with an empty cache.\n", err)
+
+        #drop entries whose file was deleted by hand
+        for key in list(self.cache):
+            if not os.path.exists(os.path.join(self.convert_dir, self.cache[key]['file'])):
+                del self.cache[key]
+
+        known = set(entry['file'] for entry in self.cache.values())
+        untracked = [f for f in os.listdir(self.convert_dir) if f not in known and f != 'cache_manifest.json']
+        print("[INFO]Conversion cache under '{}' holds {} files.".format(self.convert_dir, len(self.cache)))
+        if len(untracked) > 0:
+            print("[WARNING]{} files in the convert dir are not part of the cache and will be ignored.".format(len(untracked)))
+
+    def save_cache_manifest(self):
+        write_json_atomic(self.cache_manifest_path, self.cache)
+
+    def get_conversion_params(self):
+        #everything that changes the converted output has to be part of the cache key
+        params = {'frame_rate': self.target_frame_rate, 'channels': 1, 'sample_width': 2, 'format': 'wav'}
+        #the two paths resample differently (ffmpeg vs pydub), so their files are cached separately
+        if self.streaming:
+            params['converter'] = 'stream'
+        return params
+
+    def get_cache_key(self, aud):
+        params = json.dumps(self.get_conversion_params(), sort_keys=True)
+        return hashlib.sha256((hash_file(aud) + params).encode('utf-8')).hexdigest()
+
+    def evict_cache(self, keep_keys=()):
+        #Remove least recently used files until the cache fits into self.max_cache_size (bytes).
+        #Files used in the current run are never evicted, nor are those of keep_keys (e.g. the run keys of
+        #other handlers sharing the convert dir).
+        if not self.max_cache_size:
+            return
+        total = sum(entry['size'] for entry in self.cache.values())
+        for key in sorted(self.cache, key=lambda k: self.cache[k]['last_used']):
+            if total <= self.max_cache_size:
+                break
+            if key in self.run_keys.values() or key in keep_keys:
+                continue
+            entry = self.cache.pop(key)
+            try:
+                os.remove(os.path.join(self.convert_dir, entry['file']))
+            except FileNotFoundError:
+                pass
+            total -= entry['size']
+            print("[INFO]Evicted '{}' from the conversion cache.".format(entry['name']))
+        if total > self.max_cache_size:
+            print("[WARNING]The files of this run alone exceed the cache size limit ({:.1f} MB).".format(total / 1024 / 1024))
+        self.save_cache_manifest()
 
     #actually does more than evaluation now... change name to setup()
-    def setup(self):
+    def collect_audios(self):
+        #Fills self.audios_to_convert with (path, ext) of all accepted audio files in self.input
+        #& sets self.input_dir. Used by setup() and by the streaming mode, which needs no convert dir.
 
         #for the input
         if os.path.isdir(self.input):
@@ -130,101 +634,206 @@ class AudioHandler():
         
         #WILL NOT Check for the format ...
 
+    def setup(self):
+        #collect the audios & create the convert dir
+        self.collect_audios()
 
         #call self.create_convert_dir() to CREATE a direcotry for the converted audios to be stored in
         self.create_convert_dir()
 
-    def convert_audio_to_wav(self):
+    def open_source(self, aud, ext):
+        #Opens the input for the streaming conversion. Returns (wave reader, ffmpeg process or None).
+        #16-bit PCM .wav files at the target rate are read directly; everything else is decoded
+        #& resampled by ffmpeg into a .wav on its stdout. The channels are kept (downmix happens in numpy).
+        #Raises FileNotFoundError if ffmpeg isn't installed.
+        if ext == ".wav":
+            try:
+                wf = wave.open(str(aud), "rb")
+            except (wave.Error, EOFError):
+                wf = None
+            if wf is not None:
+                if wf.getsampwidth() == 2 and wf.getcomptype() == "NONE" and wf.getframerate() == self.target_frame_rate:
+                    return wf, None
+                wf.close()
+
+        cmd = ['ffmpeg', '-nostdin', '-loglevel', 'error', '-i', str(aud), '-map_metadata', '-1',
+               '-ar', str(self.target_frame_rate), '-acodec', 'pcm_s16le', '-f', 'wav', '-']
+        proc = start_ffmpeg(cmd)
+        try:
+            return wave.open(proc.stdout, "rb"), proc
+        except (wave.Error, EOFError):
+            err = finish_ffmpeg(proc)
+            raise RuntimeError(f"ffmpeg couldn't decode '{aud}'.\n{err}")
+
+    def convert_stream(self, aud, ext, tmp_path, name):
+        #Streaming conversion: reads fixed size blocks of interleaved 16-bit PCM, downmixes each block
+        #to mono in numpy & appends it to tmp_path. Memory stays at one block no matter how long the file is.
+        with profiler.stage('decode', name):
+            wf, proc = self.open_source(aud, ext)
+        try:
+            channels = wf.getnchannels()
+            block_frames = max(1, int(self.block_seconds * self.target_frame_rate))
+            with wave.open(tmp_path, "wb") as out:
+                out.setnchannels(1)
+                out.setsampwidth(2)
+                out.setframerate(self.target_frame_rate)
+                while True:
+                    with profiler.stage('decode', name):
+                        data = wf.readframes(block_frames)
+                    if len(data) == 0:
+                        break
+                    with profiler.stage('downmix', name):
+                        data = downmix_pcm16(data, channels)
+                    with profiler.stage('export', name):
+                        out.writeframes(data)
+        finally:
+            wf.close()
+            if proc is not None:
+                err = finish_ffmpeg(proc)
+        # ffmpeg's exit code is only known at the end
+        if proc is not None and proc.returncode != 0:
+            raise RuntimeError(f"ffmpeg couldn't decode '{aud}'.\n{err}")
+
+    def convert_pydub(self, aud, ext, tmp_path, name):
+        #Converts with pydub: the whole file is decoded into memory
+        from pydub import AudioSegment
+        #create audiosegment (decode)
+        with profiler.stage('decode', name):
+            if ext == ".wav":
+                audio_seg = AudioSegment.from_wav(aud)
+            elif ext == ".mp3":
+                audio_seg = AudioSegment.from_mp3(aud)
+            else:
+                e = ext.removeprefix('.')
+                audio_seg = AudioSegment.from_file(aud, e)
+
+        #downmix + sample format + resampling happen in memory on the decoded segment
+        with profiler.stage('downmix', name):
+            audio_seg = audio_seg.set_channels(1).set_sample_width(2).set_frame_rate(self.target_frame_rate)
+
+        with profiler.stage('export', name):
+            audio_seg.export(tmp_path, format = 'wav')
+
+    def convert_file(self, aud, ext):
+        #Converts ONE audio file in a single pass: decode once, downmix to mono,
+        #16-bit PCM & resample to self.target_frame_rate, then write the final .wav exactly once.
+        #Unchanged files (same content & same conversion params) are taken from the cache instead.
+        #Can be called from several threads at once.
+        #Returns the path of the converted file
+        name = os.path.splitext(os.path.basename(aud))[0]
+        with profiler.stage('hash', name):
+            key = self.get_cache_key(aud)
+        self.run_keys[name] = key
+
+        with self.cache_lock:
+            if key in self.cache:
+                entry = self.cache[key]
+                entry['last_used'] = time.time()
+                print("[INFO]'{}' is unchanged. Using cached conversion.".format(aud))
+                return os.path.join(self.convert_dir, entry['file'])
+
+        print("[INFO]Starting to convert '{}'.".format(aud))
+        #EXPORT as wav file named after the cache key. Export to a temp name first,
+        #so an interrupted run never leaves a broken file under a valid key
+        file = key + '.wav'
+        target_path = os.path.join(self.convert_dir, file)
+        tmp_path = get_temp_path(target_path, '.part')
+        try:
+            if self.streaming:
+                try:
+                    self.convert_stream(aud, ext, tmp_path, name)
+                except FileNotFoundError:
+                    print("[WARNING]ffmpeg was not found. Converting '{}' in memory with pydub.".format(aud))
+                    self.convert_pydub(aud, ext, tmp_path, name)
+            else:
+                self.convert_pydub(aud, ext, tmp_path, name)
+            os.replace(tmp_path, target_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        with self.cache_lock:
+            self.cache[key] = {
+                'name': name,
+                'source': str(aud),
+                'file': file,
+                'size': os.path.getsize(target_path),
+                'last_used': time.time(),
+                'params': self.get_conversion_params(),
+            }
+            self.save_cache_manifest()
+        return target_path
+
+    def convert_audio(self, num_workers=1, evict=True):
         #converts all audio stored in self.audios_to_convert
-        #target conversion: .wav mono
+        #target conversion: .wav mono 16-bit PCM at self.target_frame_rate
+        #num_workers: files converted at the same time (threads; ffmpeg & numpy do the work outside the GIL)
+        #evict: False = the caller runs evict_cache() later (e.g. after all handlers sharing the dir are done)
         if len(self.audios_to_convert) == 0:
             print("[FATAL]Nothing to convert here. Did you run setup()?")
             quit()
-        else: 
-            for audio in self.audios_to_convert:
-                aud = audio[0]
-                ext = str(audio[1])
-                print("[INFO]Starting to convert '{}'.".format(aud))
-                #create audiosegment
-                if ext == ".wav":
-                    audio_seg = AudioSegment.from_wav(aud)
-                elif ext == ".mp3":
-                    audio_seg = AudioSegment.from_mp3(aud)
-                
-                else:
-                    e = ext.removeprefix('.')
-                    audio_seg = AudioSegment.from_file(aud, e)
-                
-                #EXPORT as wav file
-                #Take audio_file_path - get only the filename - strip extension - add .wav as extension
-                aud_file_export = str(os.path.splitext(os.path.basename(aud))[0] + '.wav')
-                audio_seg.export(os.path.join(self.convert_dir, aud_file_export), format = 'wav')
-            print("[INFO]Files are converted to '.wav' under directory: {}.".format(self.convert_dir))
-                
-    def convert_audio_to_mono(self):
-        #Take the .wav files and convert them to mono .wav files
-        #Files have to be converted to mono first
         if self.convert_dir is None:
-            print("[ERROR]You have to convert the audio files first (e.g. using convert_audio). Method called to early. Quit...")
-            exit()
-
-        # iterate over convert_dir to convert each file to mono. Then safe in same dir.
-        for a in os.listdir(self.convert_dir):
-            #load file as AudioSegment
-            try:
-                stereo_a = AudioSegment.from_wav(os.path.join(self.convert_dir, a))
-            except Exception as err:
-                print("[FATAL]Couldn't create an AudioSegment object from a file in the convert dir.\nNOTE: run covert_audio_to_wav first & make sure there are only .wav files in the dir.")
-                print(err)
+            print("[FATAL]There is no dir to store the converted files in. Did you run setup()?")
+            quit()
 
-            #convert to mono = set audio to one channel
-            mono_a = stereo_a.set_channels(1)
-            fl_name = str("mono_" + a)
-            mono_a.export(os.path.join(self.convert_dir, fl_name), format='wav')
-            os.remove(os.path.join(self.convert_dir, a))
+        if num_workers > 1:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=num_workers) as executor:
+                futures = [executor.submit(self.convert_file, audio[0], str(audio[1])) for audio in self.audios_to_convert]
+                for future in futures:
+                    future.result()
+        else:
+            for audio in self.audios_to_convert:
+                self.convert_file(audio[0], str(audio[1]))
+        #saves the last_used timestamps of cache hits as well
+        self.save_cache_manifest()
+        print("[INFO]Files are converted to mono '.wav' ({} Hz) under directory: {}.".format(self.target_frame_rate, self.convert_dir))
 
-        print("[INFO]Conversion to mono is done.")
+        if evict:
+            self.evict_cache()
 
     def check_convert_dir(self):
-        #just printing the info about the conversion dir and its files respectively        
-        dir_list = os.listdir(self.convert_dir)
+        #Reads the converted files from the cache manifest & checks them.
+        #Only the files of the current run are returned; if nothing was converted in this run, all cached files.
+        if len(self.run_keys) != 0:
+            to_check = self.run_keys
+        else:
+            to_check = {entry['name']: key for key, entry in self.cache.items()}
+
         print("""
         \n[INFO]Checking the conversion dir & printing infos.
         Convert_DIR is {}
-        DIR contains {} files:
-        """.format(self.convert_dir, len(dir_list)))
+        Cache contains {} files, {} of them are checked:
+        """.format(self.convert_dir, len(self.cache), len(to_check)))
 
         valid_audios = {}
 
-        for f in range(len(dir_list)):
-            file = dir_list[f]
-            print("FILE: ", file)
-            fl_name, ext = os.path.splitext(file)
-            
-            print("\t[{}] {}".format(f+1, file))
-            #check if file is in wave format
-            if ext != '.wav':
-                print("[WARNING]This file is not in .wav format.")
+        for i, fl_name in enumerate(to_check):
+            key = to_check[fl_name]
+            print("\t[{}] {}".format(i+1, fl_name))
+            if key not in self.cache:
+                print("\t[WARNING]This file is missing in the cache manifest.")
+                continue
+            file_path = os.path.join(self.convert_dir, self.cache[key]['file'])
+            if not os.path.exists(file_path):
+                print("\t[WARNING]The converted file '{}' doesn't exist anymore.".format(file_path))
                 continue
-            #if yes, check if its single channel (mono)
-            else:
-                #load file and check for mono characteristics
-                wf = wave.open(os.path.join(self.convert_dir, file), "rb")
-                if wf.getnchannels() != 1 or wf.getsampwidth() != 2 or wf.getcomptype() != "NONE":
-                    print("\t[WARNING]File is in .wav, but not converted to mono correctly.")
-                    continue
-            
-            #Arrive here if all checks are good (move to a new func 'check audio')
-            print("\tThis file is in the correct format & converted to mono correctly.") 
 
-            #try to remove 'mono_' from the file name which is added during conversion
-            #TODO Later take this out and just create the dict earlier?
-            print(fl_name)
-            fl_name = fl_name.removeprefix('mono_')
-            
+            #load file and check for mono characteristics
+            try:
+                with wave.open(file_path, "rb") as wf:
+                    if wf.getnchannels() != 1 or wf.getsampwidth() != 2 or wf.getcomptype() != "NONE":
+                        print("\t[WARNING]File is in .wav, but not converted to mono correctly.")
+                        continue
+            except Exception as err:
+                print("\t[WARNING]File couldn't be read as .wav.", err)
+                continue
+
+            #Arrive here if all checks are good
+            print("\tThis file is in the correct format & converted to mono correctly.")
 
             # valid_audios is a dict: key=filename, value=full_path
-            valid_audios[fl_name] = os.path.join(self.convert_dir, file)
+            valid_audios[fl_name] = file_path
 
 
         #if any items have been appended return list; else return None
@@ -232,33 +841,260 @@ class AudioHandler():
             return valid_audios
         else:
             return None
-        
+
+
+def get_profile_name(audio_path, name=None):
+    #file name under which the profiler records the stages of a file
+    if name is not None:
+        return name
+    return os.path.splitext(os.path.basename(str(audio_path)))[0]
+
+
+class SilenceFilter():
+    # Energy based voice activity filter in front of the recognizer.
+    # The PCM is cut into short frames; frames below threshold_db (dBFS) count as silence.
+    # Pauses longer than min_silence are shortened to keep_silence (half after the speech, half before
+    # the next speech). Everything else is passed through.
+    # The shortened pause is too short for the endpointing of Kaldi, so process_parts() splits the output at
+    # every cut & the caller ends the utterance there (see VoskHandler.iter_recognize_chunks).
+    # Every cut is recorded, so times of the filtered audio can be mapped back to the original audio (map_time).
+    # Works on a stream: process() takes chunks of any size, memory is bounded by min_silence.
+    def __init__(self, name, sample_rate=16000, threshold_db=-40.0, frame_ms=30, min_silence=1.0, keep_silence=0.3):
+        self.name = name
+        self.sample_rate = sample_rate
+        self.threshold_db = threshold_db
+        self.frame_len = int(sample_rate * frame_ms / 1000)
+        # in frames
+        self.keep_after = int(round(keep_silence / 2 * 1000 / frame_ms))
+        self.keep_before = int(round(keep_silence / 2 * 1000 / frame_ms))
+        self.min_silence = max(int(round(min_silence * 1000 / frame_ms)), self.keep_after + self.keep_before)
+
+        self.rest = b''
+        self.silence_run = 0 # silent frames in a row
+        self.held = [] # silent frames that may still be passed on, when the pause turns out to be short
+        self.dropping = False # current pause is long: only the last keep_before frames are held
+
+        self.original_pos = 0 # samples read
+        self.processed_pos = 0 # samples passed on
+        # cut points: at processed sample cut_points[i] the original audio is cut_shifts[i] samples ahead
+        self.cut_points = []
+        self.cut_shifts = []
+
+    def __str__(self):
+        return self.name
+
+    def is_silent(self, frame):
+        samples = np.frombuffer(frame, dtype='<i2').astype(np.float64)
+        rms = np.sqrt(np.mean(samples * samples)) if len(samples) > 0 else 0.0
+        if rms <= 0:
+            return True
+        return 20 * np.log10(rms / 32768.0) < self.threshold_db
+
+    def emit(self, frames, out):
+        for frame in frames:
+            out.append(frame)
+            self.processed_pos += len(frame) // 2
+
+    def process(self, data):
+        # returns the bytes of data that should go to the recognizer (may be empty)
+        return b''.join(part for part, _ in self.process_parts(data))
+
+    def process_parts(self, data):
+        # like process(), but split at the cuts: returns a list of (bytes, cut). For all parts but the last, cut is
+        # the position (samples of the original audio) where a long pause was cut out right after the part;
+        # the last part has cut None. Parts may be empty.
+        data = self.rest + data
+        step = self.frame_len * 2
+        usable = len(data) - len(data) % step
+        self.rest = data[usable:]
+
+        parts = []
+        out = []
+        for i in range(0, usable, step):
+            frame = data[i:i + step]
+            self.original_pos += self.frame_len
+            if not self.is_silent(frame):
+                if self.dropping:
+                    # pause was long: remember the cut, then pass the frames right before the speech
+                    first = self.original_pos - self.frame_len * (len(self.held) + 1)
+                    self.cut_points.append(self.processed_pos)
+                    self.cut_shifts.append(first - self.processed_pos)
+                    parts.append((b''.join(out), first))
+                    out = []
+                self.emit(self.held, out)
+                self.held = []
+                self.dropping = False
+                self.silence_run = 0
+                self.emit([frame], out)
+                continue
+
+            self.silence_run += 1
+            if self.silence_run <= self.keep_after:
+                self.emit([frame], out)
+                continue
+            self.held.append(frame)
+            if self.silence_run >= self.min_silence:
+                self.dropping = True
+            if self.dropping and len(self.held) > self.keep_before:
+                self.held = self.held[len(self.held) - self.keep_before:]
+        parts.append((b''.join(out), None))
+        return parts
+
+    def flush(self):
+        # end of the audio: a short pause at the end is passed on, a long one is dropped
+        out = []
+        if not self.dropping:
+            self.emit(self.held, out)
+        self.held = []
+        self.emit([self.rest] if len(self.rest) > 0 else [], out)
+        self.original_pos += len(self.rest) // 2
+        self.rest = b''
+        return b''.join(out)
+
+    def map_time(self, t):
+        # time (s) in the filtered audio -> time (s) in the original audio
+        i = bisect.bisect_right(self.cut_points, t * self.sample_rate) - 1
+        if i < 0:
+            return t
+        return t + self.cut_shifts[i] / float(self.sample_rate)
+
+    def map_result(self, result):
+        # maps 'start' & 'end' of every word in a vosk result back to the original audio
+        for alternative in [result] + result.get('alternatives', []):
+            for obj in alternative.get('result', []):
+                obj['start'] = self.map_time(obj['start'])
+                obj['end'] = self.map_time(obj['end'])
+        return result
+
+    def get_skipped(self):
+        # seconds of audio that were not passed on
+        return (self.original_pos - self.processed_pos) / float(self.sample_rate)
+
+
+class GrammarCache():
+    # Derives the phrase list ("grammar") of a corpus for grammar-constrained recognition & caches it, keyed by
+    # the content hashes of the source files & the settings. The sources are normalized like the transcripts in
+    # the evaluation (werpy), so the grammar has the same spelling as the WER.
+    # Modes: 'words' = every word of the corpus is a phrase (the recognizer can put them in any order),
+    #        'phrases' = every line of the sources is a phrase (only whole lines are recognized).
+    # '[unk]' is always added, so speech outside the grammar becomes [unk] instead of a wrong word.
+    modes = ('words', 'phrases')
+
+    def __init__(self, name, cache_dir):
+        self.name = name
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def __str__(self):
+        return self.name
+
+    def get_key(self, paths, mode, max_phrases, encoding):
+        settings = json.dumps({'mode': mode, 'max_phrases': max_phrases, 'encoding': encoding,
+                               'normalizer_version': get_werpy_version()}, sort_keys=True)
+        h = hashlib.sha256(settings.encode('utf-8'))
+        for path in sorted(paths):
+            h.update('\0{}\0{}'.format(os.path.basename(path), hash_file(path)).encode('utf-8'))
+        return h.hexdigest()
+
+    def build(self, paths, mode, max_phrases, encoding):
+        #phrases, most frequent first (ties alphabetical); max_phrases > 0 keeps only the most frequent ones
+        import werpy
+        counts = {}
+        for path in paths:
+            with open(path, 'r', encoding=encoding) as f:
+                text = f.read()
+            if mode == 'words':
+                phrases = werpy.normalize(text).split()
+            else:
+                phrases = [' '.join(werpy.normalize(line).split()) for line in text.splitlines()]
+            for phrase in phrases:
+                if phrase:
+                    counts[phrase] = counts.get(phrase, 0) + 1
+        phrases = sorted(counts, key=lambda phrase: (-counts[phrase], phrase))
+        if max_phrases > 0:
+            phrases = phrases[:max_phrases]
+        return phrases + ['[unk]']
+
+    def get_grammar(self, paths, mode='words', max_phrases=0, encoding='utf-8'):
+        #Returns the phrase list of the sources (from the cache if they didn't change)
+        if mode not in self.modes:
+            raise ValueError(f"Unknown grammar mode '{mode}'. Use one of {self.modes}.")
+        key = self.get_key(paths, mode, max_phrases, encoding)
+        path = os.path.join(self.cache_dir, key + '.json')
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                return json.load(f)['phrases']
+        with profiler.stage('grammar', self.name):
+            phrases = self.build(paths, mode, max_phrases, encoding)
+        write_json_atomic(path, {'mode': mode, 'sources': len(paths), 'phrases': phrases})
+        print(f"[INFO]Built a grammar of {len(phrases) - 1} {mode} from {len(paths)} files.")
+        return phrases
+
+
 class VoskHandler():
 
-    def __init__(self, name, model_path, log_level=int(-1), recognition_frame_rate=4000):
+    def __init__(self, name, model_path, log_level=int(-1), recognition_frame_rate=4000, checkpoint_interval=60.0,
+                 words=True, max_alternatives=0, defer_json=False, silence_options=None,
+                 segment_threads=1, segment_seconds=300.0, grammar=None):
         
         self.name = name 
         self.model_path = model_path
         self.log_level = log_level #Set to 0 to get a vosk-log
 
+        #number of frames passed to the recognizer at once (chunk size)
         self.frame_rate = recognition_frame_rate #default rate when working with Kaldi
 
+        #recognizer options (see create_recognizer)
+        self.words = words
+        self.max_alternatives = max_alternatives
+        #True: keep the raw json strings during recognition & parse them after the audio is done
+        self.defer_json = defer_json
+        #None: every frame goes to the recognizer; otherwise keyword arguments of a SilenceFilter
+        #that shortens long pauses before recognition
+        self.silence_options = silence_options
+
+        #>1: .wav files longer than 2 * segment_seconds are cut at quiet points into segments of about
+        #segment_seconds, which are recognized by segment_threads threads sharing this handler's model
+        self.segment_threads = segment_threads
+        self.segment_seconds = segment_seconds
+
+        #seconds of audio between two checkpoints of the results (only used if a checkpoint_path is given)
+        self.checkpoint_interval = checkpoint_interval
+
+        #None: full search space of the model; otherwise list of phrases the recognizer is limited to (see GrammarCache).
+        #Needs a model with a dynamic graph (most small models); words the model doesn't know are dropped by vosk
+        #A model without one would ignore the grammar, so it is dropped (warning in initialize_model)
+        self.grammar_dropped = grammar is not None and not model_supports_grammar(model_path)
+        self.grammar = None if self.grammar_dropped else grammar
+
+        #the options above that change the transcript; checkpoints of other options aren't resumed
+        self.options_hash = get_options_hash({'words': words, 'max_alternatives': max_alternatives,
+                                              'silence_options': silence_options, 'segment_threads': segment_threads,
+                                              'segment_seconds': segment_seconds, 'grammar': self.grammar})
 
         #Will be initialized
         self.model = None
 
+        #length in seconds of the audio transcribed last; used for progress & throughput reports
+        self.last_audio_duration = 0.0
+
     def initialize_model(self):
         # Set log level (Set to 0 to get a vosk-log)
         #TODO buggy when using self.loglevel
+        from vosk import Model, SetLogLevel
         SetLogLevel(-1)
 
         #Check if path exists
         if not os.path.exists(self.model_path):
             print(f"[FATAL]Please download the model from https://alphacephei.com/vosk/models and unpack as {self.model_path}")
             sys.exit()
+        if self.grammar_dropped:
+            print(f"[WARNING]The model '{self.model_path}' has no dynamic graph (graph/HCLr.fst & graph/Gr.fst), so it "
+                  "can't use a grammar. The full search space of the model is used.")
         #Read the vosk model
         print(f"[INFO]Reading your vosk model '{self.model_path}'...")
-        self.model = Model(self.model_path)
+        with profiler.stage('model_load'):
+            self.model = Model(self.model_path)
         print(self.model)
         print(f"[INFO]'{self.model_path}' model was successfully read.")
         
@@ -282,10 +1118,147 @@ class VoskHandler():
 
         return wf
 
-
-
-    # BETTER CALL IT TRANSCRIBE AUDIO TO DATA!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
-    def transcribe_audio_to_text(self, audio_path):
+    def load_checkpoint(self, checkpoint_path):
+        #Returns (frames, results) of an interrupted run, or (0, None) if there is nothing to resume.
+        #The checkpoint has one json line per finished utterance:
+        #   {"frames": <position after it>, "offset": <shift of the word times>, "options": <see get_options_hash>,
+        #    "result": <raw vosk result>}
+        #A checkpoint made with other options (e.g. another grammar) is dropped & the file starts over.
+        if checkpoint_path is None or not os.path.exists(checkpoint_path):
+            return 0, None
+        frames, results = 0, []
+        # byte position after the last complete line
+        valid_end = 0
+        with open(checkpoint_path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    # last line was cut off by the crash
+                    break
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                # lines of checkpoints written before the options were recorded have none
+                if entry.get('options', self.options_hash) != self.options_hash:
+                    print(f"[INFO]The checkpoint '{checkpoint_path}' was made with other recognizer options. Starting over.")
+                    frames, results, valid_end = 0, [], 0
+                    break
+                frames = int(entry['frames'])
+                # lines of checkpoints written before the offset existed have none
+                results.append(shift_result_times(entry['result'], entry.get('offset', 0.0)))
+                valid_end += len(line)
+        # drop the broken rest (or the whole checkpoint of other options), otherwise the lines appended on resume
+        # would be glued to it
+        if valid_end < os.path.getsize(checkpoint_path):
+            with open(checkpoint_path, 'r+b') as f:
+                f.truncate(valid_end)
+        return frames, results
+
+    def create_recognizer(self, sample_rate):
+        #Initialize KalidRecognizer with framerate of audio file & the options of this handler
+        from vosk import KaldiRecognizer
+        if self.grammar is not None:
+            recognizer = KaldiRecognizer(self.model, sample_rate, json.dumps(self.grammar, ensure_ascii=False))
+        else:
+            recognizer = KaldiRecognizer(self.model, sample_rate)
+        #Word Recognitiion: start, end & conf of every word
+        recognizer.SetWords(self.words)
+        if self.max_alternatives > 0:
+            recognizer.SetMaxAlternatives(self.max_alternatives)
+        return recognizer
+
+    def iter_recognize_chunks(self, recognizer, chunks, sample_rate, start_frame=0, results=None, checkpoint_path=None,
+                              profile_name=None):
+        #Feeds chunks of 16-bit mono PCM (bytes) to the recognizer & yields each json result as soon as it is there
+        #(with self.defer_json all results are parsed & yielded after the last chunk)
+        #start_frame: position in the audio where the chunks start. Word times are shifted by it,
+        #   because a new recognizer always starts counting at 0
+        #results: results of an interrupted run that is continued here (yielded first)
+        #checkpoint_path: every result is appended there; the file is flushed every self.checkpoint_interval seconds of audio
+        #profile_name: file name under which the stages are recorded by the profiler
+        if results is not None:
+            for part_result in results:
+                yield part_result
+        time_offset = start_frame / float(sample_rate)
+        frames = start_frame
+        last_checkpoint = start_frame
+        deferred = []
+
+        #long pauses are cut out before recognition; word times are mapped back to the original audio
+        silence_filter = None
+        if self.silence_options is not None:
+            silence_filter = SilenceFilter("silence", sample_rate, **self.silence_options)
+
+        def parse(raw_result, map_times=False):
+            with profiler.stage('result_parsing', profile_name):
+                part_result = json.loads(raw_result)
+                if map_times and silence_filter is not None:
+                    part_result = silence_filter.map_result(part_result)
+                return shift_result_times(part_result, time_offset)
+
+        if silence_filter is not None:
+            chunks = itertools.chain(chunks, [None])
+
+        checkpoint = None
+        if checkpoint_path is not None:
+            checkpoint = open(checkpoint_path, 'a')
+        try:
+            for data in chunks:
+                frames += len(data) // 2 if data is not None else 0
+                if silence_filter is None:
+                    parts = [(data, None)]
+                else:
+                    # the end of the audio (data is None) hands the frames still held by the filter to the recognizer
+                    with profiler.stage('silence_filter', profile_name):
+                        parts = silence_filter.process_parts(data) if data is not None else [(silence_filter.flush(), None)]
+                for data, cut in parts:
+                    with profiler.stage('recognition', profile_name):
+                        endpoint = len(data) > 0 and recognizer.AcceptWaveform(data)
+                        # a long pause was cut out after this part: end the utterance there, like Kaldi would have
+                        # in the pause (Result() finishes the utterance even without an endpoint)
+                        # vosk pretty prints its json; newlines can only be whitespace there, so one line per result is safe
+                        raw_result = recognizer.Result().replace('\n', ' ') if endpoint or cut is not None else None
+                    if raw_result is None:
+                        continue
+                    if silence_filter is not None:
+                        # times in the checkpoint have to refer to the original audio
+                        with profiler.stage('result_parsing', profile_name):
+                            raw_result = json.dumps(silence_filter.map_result(json.loads(raw_result)))
+                    # the recognizer just finished an utterance, so everything up to 'frames' (or the cut) is done
+                    done = frames if cut is None else start_frame + cut
+                    if checkpoint is not None:
+                        with profiler.stage('checkpoint', profile_name):
+                            checkpoint.write('{{"frames": {}, "offset": {}, "options": "{}", "result": {}}}\n'.format(
+                                done, time_offset, self.options_hash, raw_result))
+                            if done - last_checkpoint >= self.checkpoint_interval * sample_rate:
+                                checkpoint.flush()
+                                last_checkpoint = done
+                    if self.defer_json:
+                        deferred.append(raw_result)
+                    else:
+                        yield parse(raw_result)
+        finally:
+            if checkpoint is not None:
+                checkpoint.close()
+        for raw_result in deferred:
+            yield parse(raw_result)
+        # add last chunk of data to the results
+        self.last_audio_duration = frames / float(sample_rate)
+        if silence_filter is not None:
+            skipped = silence_filter.get_skipped()
+            print("[INFO]Skipped {:.1f}s of silence ({:.0f}% of the audio).".format(
+                skipped, 100 * skipped / max(self.last_audio_duration - time_offset, 1e-9)))
+        with profiler.stage('recognition', profile_name):
+            raw_result = recognizer.Result()
+        yield parse(raw_result, map_times=True)
+
+        #file is done, the checkpoint isn't needed anymore
+        if checkpoint_path is not None and os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+
+    def iter_transcribe_audio(self, audio_path, checkpoint_path=None, name=None):
+        #Streaming variant of transcribe_audio_to_text(): returns a generator that yields the results
+        #while recognition runs (or None if the audio check fails)
         #check audio first to reduce errors of Transcription
         check = self.check_audio(audio_path)
         if check is None:
@@ -294,108 +1267,944 @@ class VoskHandler():
         else:
             wf = check
         
+        #long files are recognized in parallel segments (see iter_transcribe_segments)
+        if self.segment_threads > 1 and wf.getnframes() >= 2 * self.segment_seconds * wf.getframerate():
+            return self.iter_transcribe_segments(wf, audio_path, checkpoint_path, name)
+
         #Initialize KalidRecognizer with framerate of audio file
-        recognizer = KaldiRecognizer(self.model, wf.getframerate())
-        
-        #Word Recognitiion (always True)
-        recognizer.SetWords(True)
-        #TODO Enable for modification options here
+        recognizer = self.create_recognizer(wf.getframerate())
 
-        #recognize speech using vosk model
-        results = [] #empty list, being filled with the partial results for each framerate respectively
+        #continue an interrupted run of this file
+        start_frame, results = self.load_checkpoint(checkpoint_path)
+        if start_frame > 0:
+            print(f"[INFO]Resuming '{audio_path}' at {start_frame / float(wf.getframerate()):.1f}s.")
+            wf.setpos(start_frame)
 
         #iterate through audio file in specified framrate (default:4000)
+        def read_chunks():
+            while True:
+                data = wf.readframes(self.frame_rate)
+                if len(data) == 0:
+                    break
+                yield data
+
+        def recognize():
+            try:
+                for part_result in self.iter_recognize_chunks(recognizer, read_chunks(), wf.getframerate(),
+                                                              start_frame, results, checkpoint_path,
+                                                              get_profile_name(audio_path, name)):
+                    yield part_result
+            finally:
+                wf.close()
+            print(f"[INFO]Finished transcribing file under '{audio_path}'.")
+        return recognize()
+
+    def find_segment_bounds(self, wf, frame_ms=30):
+        #Returns the frame positions [0, cut_1, ..., n_frames] that split the audio into segments of about
+        #segment_seconds. Every cut is placed at the quietest frame_ms window near its target position,
+        #so words are (almost) never cut. Only the energy per window is kept in memory, not the audio.
+        sample_rate = wf.getframerate()
+        window = int(sample_rate * frame_ms / 1000)
+        energies = []
+        wf.rewind()
         while True:
-            data = wf.readframes(4000)
-            if len(data) == 0:
+            # ~10 s of audio per read, a multiple of the window
+            data = wf.readframes(window * 300)
+            samples = np.frombuffer(data, dtype='<i2').astype(np.float32)
+            if len(samples) < window:
                 break
-            if recognizer.AcceptWaveform(data):
-                part_result = json.loads(recognizer.Result())
-                results.append(part_result)
-        # add last chunk of data to the results
-        part_result = json.loads(recognizer.Result())
-        results.append(part_result)
+            samples = samples[:len(samples) - len(samples) % window].reshape(-1, window)
+            energies.append(np.mean(samples * samples, axis=1))
+        wf.rewind()
+        energies = np.concatenate(energies)
+
+        n_frames = wf.getnframes()
+        segment = int(self.segment_seconds * 1000 / frame_ms) # in windows
+        search = max(segment // 4, 1) # search the cut in +-search windows around the target
+        bounds = [0]
+        target = segment
+        while target + segment // 2 < len(energies):
+            low, high = max(target - search, bounds[-1] // window + 1), min(target + search, len(energies))
+            cut = low + int(np.argmin(energies[low:high]))
+            # middle of the quietest window
+            bounds.append(cut * window + window // 2)
+            target = cut + segment
+        bounds.append(n_frames)
+        return bounds
+
+    def iter_transcribe_segments(self, wf, audio_path, checkpoint_path=None, name=None):
+        #Parallel variant of iter_transcribe_audio() for long files: the audio is cut into segments at quiet
+        #points (find_segment_bounds), every segment gets its own KaldiRecognizer & all recognizers share
+        #self.model. Vosk releases the GIL while decoding, so segment_threads threads use as many cores
+        #with ONE copy of the model in RAM. The word times of every segment are shifted by its start, the
+        #results are yielded in the order of the audio.
+        #Checkpoints aren't used in this mode; an interrupted file is transcribed again.
+        sample_rate = wf.getframerate()
+        bounds = self.find_segment_bounds(wf)
+        wf.close()
+        if checkpoint_path is not None and os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        print(f"[INFO]Transcribing '{audio_path}' in {len(bounds) - 1} segments with {self.segment_threads} threads.")
+
+        def recognize_segment(start, end):
+            with wave.open(str(audio_path), "rb") as segment_wf:
+                segment_wf.setpos(start)
+                def read_chunks():
+                    left = end - start
+                    while left > 0:
+                        data = segment_wf.readframes(min(self.frame_rate, left))
+                        if len(data) == 0:
+                            break
+                        left -= len(data) // 2
+                        yield data
+                recognizer = self.create_recognizer(sample_rate)
+                # start_frame shifts the word times of the segment to its position in the file
+                return list(self.iter_recognize_chunks(recognizer, read_chunks(), sample_rate, start,
+                                                       profile_name=get_profile_name(audio_path, name)))
+
+        def recognize():
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.segment_threads) as executor:
+                futures = [executor.submit(recognize_segment, start, end) for start, end in zip(bounds[:-1], bounds[1:])]
+                try:
+                    for future in futures:
+                        for part_result in future.result():
+                            yield part_result
+                finally:
+                    for future in futures:
+                        future.cancel()
+            self.last_audio_duration = bounds[-1] / float(sample_rate)
+            print(f"[INFO]Finished transcribing file under '{audio_path}'.")
+        return recognize()
+
+    # BETTER CALL IT TRANSCRIBE AUDIO TO DATA!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
+    def transcribe_audio_to_text(self, audio_path, checkpoint_path=None):
+        #recognize speech using vosk model & return the list of all results at the end
+        results = self.iter_transcribe_audio(audio_path, checkpoint_path)
+        if results is None:
+            return None
+        return list(results)
+
+    def iter_transcribe_audio_stream(self, audio_path, sample_rate=16000, checkpoint_path=None, name=None):
+        #Streaming input mode: decodes the ORIGINAL audio (mp3, m4a, ogg, wav, ...) with an ffmpeg subprocess
+        #& feeds the PCM chunks from the pipe straight into the recognizer.
+        #No converted .wav is needed, memory stays at one chunk & recognition starts with the first decoded chunk.
+        #Returns a generator of results like iter_transcribe_audio() (or None if ffmpeg can't be started).
+        #Raises RuntimeError at the end of the iteration if ffmpeg couldn't decode the file.
+        if not os.path.exists(audio_path):
+            print(f"[ERROR]File '{audio_path}' doesn't exist")
+            return None
+
+        #continue an interrupted run of this file; ffmpeg seeks there before decoding
+        start_frame, results = self.load_checkpoint(checkpoint_path)
+        seek = []
+        if start_frame > 0:
+            print(f"[INFO]Resuming '{audio_path}' at {start_frame / float(sample_rate):.1f}s.")
+            seek = ['-ss', '{:.4f}'.format(start_frame / float(sample_rate))]
+
+        # ffmpeg does decoding, downmix to mono & resampling; s16le = raw 16-bit PCM on stdout
+        cmd = ['ffmpeg', '-nostdin', '-loglevel', 'error'] + seek + ['-i', str(audio_path),
+               '-ar', str(sample_rate), '-ac', '1', '-f', 's16le', '-']
+        try:
+            proc = start_ffmpeg(cmd)
+        except FileNotFoundError:
+            print("[ERROR]ffmpeg was not found. It is needed for the streaming mode.")
+            return None
+
+        recognizer = self.create_recognizer(sample_rate)
+
+        def read_chunks():
+            while True:
+                # frames * 2 bytes per sample (16-bit mono)
+                data = proc.stdout.read(self.frame_rate * 2)
+                if len(data) == 0:
+                    break
+                yield data
+
+        def recognize():
+            try:
+                for part_result in self.iter_recognize_chunks(recognizer, read_chunks(), sample_rate,
+                                                              start_frame, results, checkpoint_path,
+                                                              get_profile_name(audio_path, name)):
+                    yield part_result
+            finally:
+                err = finish_ffmpeg(proc)
+            # ffmpeg's exit code is only known at the end
+            if proc.returncode != 0:
+                raise RuntimeError(f"ffmpeg couldn't decode '{audio_path}'.\n{err}")
+            print(f"[INFO]Finished transcribing (streamed) file under '{audio_path}'.")
+        return recognize()
+
+    def transcribe_audio_stream(self, audio_path, sample_rate=16000, checkpoint_path=None):
+        #Returns the list of all results like transcribe_audio_to_text()
+        results = self.iter_transcribe_audio_stream(audio_path, sample_rate, checkpoint_path)
+        if results is None:
+            return None
+        try:
+            return list(results)
+        except RuntimeError as err:
+            print(f"[ERROR]{err}")
+            return None
+
+    def iter_live_transcribe(self, chunks, sample_rate=16000, partials=True):
+        #Live mode: feeds chunks of 16-bit mono PCM from any source (stdin, a socket, a file replayed in real time;
+        #see iter_pcm_stream & iter_wav_realtime) & yields events as soon as the recognizer has them:
+        #   {'type': 'partial', 'text', 'audio_time'}: current guess for the running utterance (only when it changed)
+        #   {'type': 'final', 'text', 'result', 'audio_time', 'start', 'end', 'latency'}: a finished utterance
+        #audio_time: seconds of audio received so far
+        #latency: seconds from the arrival of the utterance's last audio until its final result (incl. endpointing)
+        recognizer = self.create_recognizer(sample_rate)
+        frames = 0
+        #frames received & perf_counter after every chunk; used to look up when a position of the audio arrived
+        arrived_frames = []
+        arrived_at = []
+        last_partial = ''
+
+        def final(raw_result):
+            now = time.perf_counter()
+            result = json.loads(raw_result)
+            words = get_result_words(result)
+            end = words[-1].get('end') if len(words) > 0 else None
+            if end is None:
+                end = frames / float(sample_rate)
+            i = min(bisect.bisect_left(arrived_frames, end * sample_rate), len(arrived_frames) - 1)
+            latency = now - arrived_at[i]
+            #the audio before this utterance isn't needed anymore
+            del arrived_frames[:i]
+            del arrived_at[:i]
+            return {'type': 'final', 'text': ' '.join(w['word'] for w in words), 'result': result,
+                    'audio_time': frames / float(sample_rate), 'start': words[0].get('start') if len(words) > 0 else None,
+                    'end': end, 'latency': latency}
+
+        for data in chunks:
+            frames += len(data) // 2
+            arrived_frames.append(frames)
+            arrived_at.append(time.perf_counter())
+            with profiler.stage('recognition', 'live'):
+                done = recognizer.AcceptWaveform(data)
+            if done:
+                last_partial = ''
+                event = final(recognizer.Result())
+                #silence between utterances gives empty results
+                if event['text']:
+                    yield event
+            elif partials:
+                partial = json.loads(recognizer.PartialResult()).get('partial', '')
+                if partial and partial != last_partial:
+                    last_partial = partial
+                    yield {'type': 'partial', 'text': partial, 'audio_time': frames / float(sample_rate)}
+        if frames > 0:
+            event = final(recognizer.FinalResult())
+            if event['text']:
+                yield event
+        self.last_audio_duration = frames / float(sample_rate)
+
+
+def iter_pcm_stream(stream, chunk_size=3200):
+    #Yields chunks of raw 16-bit PCM (bytes) from a binary stream until it ends:
+    #sys.stdin.buffer, socket.makefile('rb'), the stdout of ffmpeg, ...
+    #A chunk is handed on as soon as data is there (at most chunk_size bytes), so live audio isn't held back.
+    read = getattr(stream, 'read1', stream.read)
+    rest = b''
+    while True:
+        data = read(chunk_size)
+        if not data:
+            break
+        data = rest + data
+        #only whole samples; an odd byte waits for the next read
+        cut = len(data) - len(data) % 2
+        rest = data[cut:]
+        if cut > 0:
+            yield data[:cut]
+
+
+def iter_wav_realtime(wf, chunk_frames=1600, speed=1.0):
+    #Replays an open mono 16-bit .wav (wave reader) chunk by chunk at real-time speed, like a live recording:
+    #a chunk is yielded once its last sample would have been recorded.
+    #speed: 2.0 = twice as fast, 0 = as fast as possible
+    rate = wf.getframerate()
+    start = time.perf_counter()
+    sent = 0
+    while True:
+        data = wf.readframes(chunk_frames)
+        if len(data) == 0:
+            break
+        sent += len(data) // 2
+        if speed > 0:
+            delay = start + sent / float(rate) / speed - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        yield data
+
+
+def get_latency_summary(latencies):
+    #count, mean, median, 95th percentile & max of a list of latencies (seconds)
+    if len(latencies) == 0:
+        return {'count': 0, 'mean': None, 'p50': None, 'p95': None, 'max': None}
+    values = np.array(latencies, dtype=float)
+    return {'count': len(values), 'mean': float(values.mean()), 'p50': float(np.percentile(values, 50)),
+            'p95': float(np.percentile(values, 95)), 'max': float(values.max())}
+
+
+def get_checkpoint_path(checkpoint_dir, file):
+    if checkpoint_dir is None:
+        return None
+    return os.path.join(checkpoint_dir, file + '.json')
+
+
+class JobManifest():
+    # Keeps track of the transcription state of every file, so an interrupted batch can be rerun
+    # and only does the files that are not done yet.
+    # States: 'pending', 'running', 'done', 'failed'. The manifest is written atomically after every change.
+    def __init__(self, name, path):
+        self.name = name
+        self.path = path
+
+        #key=filename (no ext); value=dict with state, source, input_hash, updated (+ infos of the run)
+        self.jobs = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r') as f:
+                    self.jobs = json.load(f)
+            except Exception as err:
+                print(f"[WARNING]Job manifest '{self.path}' couldn't be read. All files will be transcribed.\n", err)
+
+    def __str__(self):
+        return self.name
+
+    def save(self):
+        write_json_atomic(self.path, self.jobs)
+
+    def is_done(self, file, input_hash, model_path=None, options_hash=None):
+        #done = finished before AND the input (and the model & recognizer options, if given) didn't change since
+        #options_hash: see get_options_hash; stored with set_state(..., options_hash=...)
+        job = self.jobs.get(file)
+        if job is None or job['state'] != 'done' or job['input_hash'] != input_hash:
+            return False
+        if options_hash is not None and job.get('options_hash') != options_hash:
+            return False
+        return model_path is None or job.get('model_path') == model_path
+
+    def add(self, file, source, input_hash):
+        #(re)register a file as pending. Returns False if the input changed since the last run,
+        #i.e. checkpoints of an earlier run belong to a different file
+        job = self.jobs.get(file)
+        unchanged = job is not None and job['input_hash'] == input_hash
+        self.jobs[file] = {'state': 'pending', 'source': str(source), 'input_hash': input_hash, 'updated': time.time()}
+        return unchanged
+
+    def set_state(self, file, state, **infos):
+        #infos are stored with the job, e.g. elapsed time, audio duration or an error
+        job = self.jobs[file]
+        job['state'] = state
+        job['updated'] = time.time()
+        job.update(infos)
+        self.save()
+
+    def count(self, state):
+        return sum(1 for job in self.jobs.values() if job['state'] == state)
+
+
+class LeaseQueue():
+    # Lets independent workers (processes on one or many hosts) share the tasks of ONE stage through a shared dir,
+    # without a server. Layout of stage_dir:
+    #   leases/<task>.lease  created exclusively (O_EXCL) by the worker running the task; kept alive by touching it
+    #   done/<task>.json     result of the task ({'worker', 'ok', 'result' or 'error'}), written atomically
+    # A lease that wasn't touched for lease_seconds belongs to a dead worker & is taken over (renamed away
+    # atomically, so only one worker wins). Times are compared to the clock of the shared file system
+    # (mtime of a touched file), so hosts with different clocks agree on expiry.
+    # Sharding: a task belongs to shard hash(task) % num_workers. Every worker does its own shard first,
+    # then steals tasks nobody has started from the following shards (work stealing for stragglers).
+    # Tasks can run more than once (a lease lost while its worker still runs), so tasks have to be idempotent.
+    def __init__(self, name, stage_dir, worker_index=0, num_workers=1, lease_seconds=60.0, worker_id=None):
+        self.name = name
+        self.stage_dir = stage_dir
+        self.worker_index = worker_index
+        self.num_workers = max(1, num_workers)
+        self.lease_seconds = lease_seconds
+        #unique over all hosts & restarts
+        self.worker_id = worker_id or '{}-{}-{}'.format(socket.gethostname(), os.getpid(), worker_index)
+
+        self.lease_dir = os.path.join(stage_dir, 'leases')
+        self.done_dir = os.path.join(stage_dir, 'done')
+        self.clock_path = os.path.join(stage_dir, 'clock', self.worker_id)
+        for path in (self.lease_dir, self.done_dir, os.path.dirname(self.clock_path)):
+            os.makedirs(path, exist_ok=True)
+
+        #tasks this worker holds a lease for; touched by the heartbeat thread
+        self.held = set()
+        self.lost = set()
+        self.lock = threading.Lock()
+        self.heartbeat = None
+        self.stopped = threading.Event()
+
+        #tasks this worker did: own shard / stolen from other shards / taken over from dead workers
+        self.counts = {'own': 0, 'stolen': 0, 'recovered': 0}
+
+    def __str__(self):
+        return self.name
+
+    def get_shard(self, task):
+        #the same on every host (no python hash randomization)
+        return int(hashlib.sha256(task.encode('utf-8')).hexdigest()[:8], 16) % self.num_workers
+
+    def order_tasks(self, tasks):
+        #own shard first, then the following shards; ties in task order, so every worker scans deterministically
+        return sorted(tasks, key=lambda task: (self.get_shard(task) - self.worker_index) % self.num_workers)
+
+    def get_lease_path(self, task):
+        return os.path.join(self.lease_dir, task + '.lease')
+
+    def get_done_path(self, task):
+        return os.path.join(self.done_dir, task + '.json')
+
+    def shared_now(self):
+        #current time of the shared file system
+        with open(self.clock_path, 'w'):
+            pass
+        return os.stat(self.clock_path).st_mtime
+
+    def get_done(self):
+        return set(os.path.splitext(f)[0] for f in os.listdir(self.done_dir) if f.endswith('.json'))
+
+    def get_result(self, task):
+        #done entry of the task or None
+        try:
+            with open(self.get_done_path(task), 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def is_expired(self, path):
+        try:
+            return self.shared_now() - os.stat(path).st_mtime > self.lease_seconds
+        except FileNotFoundError:
+            return False
+
+    def create_lease(self, task):
+        try:
+            fd = os.open(self.get_lease_path(task), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'worker': self.worker_id, 'created': time.time()}, f)
+        with self.lock:
+            self.held.add(task)
+        return True
+
+    def take_over(self, task):
+        #Removes the expired lease of a dead worker. Returns False if another worker was faster or the lease is alive.
+        path = self.get_lease_path(task)
+        stale_path = '{}.{}.stale'.format(path, self.worker_id)
+        try:
+            os.rename(path, stale_path)
+        except FileNotFoundError:
+            return False
+        if not self.is_expired(stale_path):
+            #touched between the check & the rename: give it back (link doesn't replace a new lease)
+            try:
+                os.link(stale_path, path)
+            except FileExistsError:
+                pass
+            os.remove(stale_path)
+            return False
+        os.remove(stale_path)
+        return True
+
+    def claim(self, task):
+        #Returns 'own', 'stolen' or 'recovered' if this worker got the lease of the task, else None
+        kind = 'own' if self.get_shard(task) == self.worker_index else 'stolen'
+        if not self.create_lease(task):
+            if not self.is_expired(self.get_lease_path(task)) or not self.take_over(task):
+                return None
+            if not self.create_lease(task):
+                return None
+            kind = 'recovered'
+            print(f"[WARNING]Lease of '{task}' ({self.name}) expired. Taking it over.")
+        if os.path.exists(self.get_done_path(task)):
+            #finished by its previous owner just before
+            self.release(task)
+            return None
+        return kind
+
+    def claim_next(self, tasks, ready=None):
+        #First task (in shard order) that isn't done, is ready & could be claimed.
+        #Returns (task, kind, number of tasks that aren't done); task & kind are None if nothing could be claimed
+        done = self.get_done()
+        leased = set(os.path.splitext(f)[0] for f in os.listdir(self.lease_dir) if f.endswith('.lease'))
+        pending = [task for task in self.order_tasks(tasks) if task not in done]
+        for task in pending:
+            if ready is not None and not ready(task):
+                continue
+            if task in leased and not self.is_expired(self.get_lease_path(task)):
+                continue
+            kind = self.claim(task)
+            if kind is not None:
+                return task, kind, len(pending)
+        return None, None, len(pending)
+
+    def complete(self, task, kind, ok=True, result=None, error=None):
+        entry = {'worker': self.worker_id, 'ok': ok, 'finished': time.time()}
+        if ok:
+            entry['result'] = result
+        else:
+            entry['error'] = error
+        write_json_atomic(self.get_done_path(task), entry)
+        self.counts[kind] += 1
+        if task in self.lost:
+            print(f"[WARNING]'{task}' ({self.name}) was finished, but its lease had expired meanwhile.")
+        self.release(task)
+
+    def release(self, task):
+        with self.lock:
+            self.held.discard(task)
+            self.lost.discard(task)
+        path = self.get_lease_path(task)
+        try:
+            with open(path, 'r') as f:
+                owner = json.load(f).get('worker')
+        except (FileNotFoundError, ValueError):
+            return
+        if owner == self.worker_id:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def renew(self):
+        #touch every held lease; a missing lease means another worker took it over
+        with self.lock:
+            held = list(self.held)
+        for task in held:
+            try:
+                os.utime(self.get_lease_path(task))
+            except FileNotFoundError:
+                with self.lock:
+                    self.lost.add(task)
+
+    def start(self):
+        #heartbeat: renews the leases 3 times per lease_seconds
+        def beat():
+            while not self.stopped.wait(self.lease_seconds / 3.0):
+                self.renew()
+        self.stopped.clear()
+        self.heartbeat = threading.Thread(target=beat, name=self.name + '_heartbeat', daemon=True)
+        self.heartbeat.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.heartbeat is not None:
+            self.heartbeat.join()
+            self.heartbeat = None
+
+
+def run_leased_tasks(stages, poll_seconds=5.0):
+    #Worker loop over several LeaseQueues. stages: list of (queue, tasks, func, ready) in pipeline order;
+    #func(task) returns a json serializable result & raises on failure (also if its input failed in an earlier stage);
+    #ready(task) (or None) tells if the earlier stage is done with the task's input.
+    #Later stages go first, so files are finished before new ones are started.
+    #Returns when every task of every stage is done.
+    for queue, tasks, func, ready in stages:
+        queue.start()
+    try:
+        while True:
+            claimed = False
+            pending = 0
+            for queue, tasks, func, ready in reversed(stages):
+                task, kind, not_done = queue.claim_next(tasks, ready)
+                pending += not_done
+                if task is None:
+                    continue
+                claimed = True
+                print(f"[INFO]{queue.name}: '{task}' ({kind}).")
+                try:
+                    result = func(task)
+                except Exception as err:
+                    print(f"[ERROR]{queue.name}: '{task}' failed.\n", err)
+                    queue.complete(task, kind, ok=False, error=str(err))
+                else:
+                    queue.complete(task, kind, result=result)
+                break
+            if not claimed:
+                if pending == 0:
+                    break
+                #the rest is leased by other workers or waits for an earlier stage
+                time.sleep(poll_seconds)
+    finally:
+        for queue, tasks, func, ready in stages:
+            queue.stop()
+    return {queue.name: dict(queue.counts) for queue, tasks, func, ready in stages}
+
+
+def transcribe_to_files(vosky, data_handle, job, stream_rate=None):
+    #Transcribes ONE file & streams text + word timings straight to disk while recognition runs.
+    #job: dict with file, audio_path, text_path, word_timings_path, checkpoint_path (may be None)
+    #stream_rate: None for converted .wav files; otherwise the original audio is decoded through ffmpeg at this rate
+    #Returns a tuple (file, ok, elapsed, audio_duration). text_path & word_timings_path of the job are set to the
+    #paths the outputs were saved under (e.g. <name>_v2 with the overwrite policy 'version').
+    #Any error fails only this job (the caller marks it 'failed' in the manifest); the next jobs still run.
+    start = time.perf_counter()
+    ok = False
+    try:
+        if stream_rate is None:
+            results = vosky.iter_transcribe_audio(job['audio_path'], job['checkpoint_path'], job['file'])
+        else:
+            results = vosky.iter_transcribe_audio_stream(job['audio_path'], stream_rate, job['checkpoint_path'], job['file'])
+        if results is not None:
+            _, text_path, word_timings_path = data_handle.stream_to_files(results, job['text_path'], job['word_timings_path'])
+            if text_path is not None:
+                job['text_path'], job['word_timings_path'] = text_path, word_timings_path
+            ok = True
+    except Exception as err:
+        # e.g. FileExistsError: outputs exist & the overwrite policy is 'fail'; a broken audio file; a full disk
+        print(f"[ERROR]{job['file']}: {type(err).__name__}: {err}")
+    return job['file'], ok, time.perf_counter() - start, vosky.last_audio_duration
+
+
+# --- Worker state for TranscriptionPool ---
+# Every worker process holds exactly one VoskHandler (and therefore one vosk Model).
+# The model is read once in the pool initializer and reused for all files the worker gets.
+_worker_vosky = None
+_worker_data_handle = None
+_worker_stream_rate = None
+
+def _init_transcription_worker(model_path, vosk_options, stream_rate, output_dir, profile=False,
+                               overwrite_policy='overwrite'):
+    global _worker_vosky, _worker_data_handle, _worker_stream_rate
+    # the records of the worker are sent back with every file (see _transcribe_in_worker)
+    profiler.reset_records()
+    if profile:
+        profiler.enable()
+    _worker_vosky = VoskHandler("vosky_{}".format(os.getpid()), model_path, **vosk_options)
+    _worker_vosky.initialize_model()
+    _worker_data_handle = DataHandler("data_{}".format(os.getpid()), output_dir, overwrite_policy)
+    _worker_stream_rate = stream_rate
+
+def _transcribe_in_worker(job):
+    result = transcribe_to_files(_worker_vosky, _worker_data_handle, job, _worker_stream_rate)
+    return result, profiler.pop_records()
+
+class TranscriptionPool():
+    # Transcribes many files in parallel, one VoskHandler per worker process.
+    # The workers write their outputs themselves (see transcribe_to_files).
+    # NOTE every worker loads its own copy of the model, so RAM use is num_workers * model size
+    def __init__(self, name, model_path, output_dir, num_workers=None, stream_rate=None, vosk_options=None,
+                 overwrite_policy='overwrite'):
+        self.name = name
+        self.model_path = model_path
+        self.output_dir = output_dir
+        #what the workers do with existing output files (see commit_file)
+        self.overwrite_policy = overwrite_policy
+        #keyword arguments for the VoskHandler of every worker (chunk size, recognizer options, ...)
+        self.vosk_options = vosk_options if vosk_options is not None else {}
+        #None: files are converted .wav files; otherwise original audio streamed through ffmpeg at this rate
+        self.stream_rate = stream_rate
+
+        #default: one worker per core
+        if num_workers is None or num_workers < 1:
+            num_workers = os.cpu_count() or 1
+        self.num_workers = num_workers
+
+    def __str__(self):
+        return self.name
+
+    def transcribe(self, jobs):
+        #Takes a list of jobs (dicts, see transcribe_to_files).
+        #Yields a tuple (file, ok, elapsed, audio_duration) for each file as soon as it is finished & saved.
+
+        #check here: a sys.exit() inside a worker initializer would make the pool respawn workers forever
+        if not os.path.exists(self.model_path):
+            print(f"[FATAL]Please download the model from https://alphacephei.com/vosk/models and unpack as {self.model_path}")
+            sys.exit()
+
+        if len(jobs) == 0:
+            return
+
+        num_workers = min(self.num_workers, len(jobs))
+        print(f"[INFO]Starting {num_workers} transcription workers for {len(jobs)} files.")
+        with multiprocessing.Pool(processes=num_workers,
+                                  initializer=_init_transcription_worker,
+                                  initargs=(self.model_path, self.vosk_options, self.stream_rate,
+                                            self.output_dir, profiler.enabled, self.overwrite_policy)) as pool:
+            # chunksize=1: files differ a lot in length, so hand them out one by one
+            for item, records in pool.imap_unordered(_transcribe_in_worker, jobs, chunksize=1):
+                profiler.merge(records)
+                yield item
+
+class _ServiceRequestHandler(BaseHTTPRequestHandler):
+    # HTTP front end of TranscriptionService (self.server.service)
+
+    def send_json(self, status, data):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def is_authorized(self):
+        # every request has to carry the shared token of the service: "Authorization: Bearer <token>"
+        expected = 'Bearer ' + self.server.service.token
+        if hmac.compare_digest(self.headers.get('Authorization', '').encode('utf-8'), expected.encode('utf-8')):
+            return True
+        self.send_json(401, {'error': 'missing or wrong token'})
+        return False
+
+    def do_GET(self):
+        if not self.is_authorized():
+            return
+        if self.path == '/health':
+            self.send_json(200, self.server.service.get_status())
+        else:
+            self.send_json(404, {'error': 'unknown path'})
+
+    def do_POST(self):
+        if not self.is_authorized():
+            return
+        if self.path != '/transcribe':
+            self.send_json(404, {'error': 'unknown path'})
+            return
+        if self.headers.get('Content-Type', '').split(';')[0].strip().lower() != 'application/json':
+            self.send_json(415, {'error': 'expected Content-Type application/json'})
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            request = json.loads(self.rfile.read(length).decode('utf-8'))
+            audio_path = request['audio_path']
+        except (ValueError, KeyError, TypeError):
+            self.send_json(400, {'error': "expected json with 'audio_path'"})
+            return
+        # only existing files are read; nothing else of the disk is touched
+        if not isinstance(audio_path, str) or not os.path.isfile(audio_path):
+            self.send_json(400, {'error': "'audio_path' isn't an existing file"})
+            return
+        self.send_json(200, self.server.service.submit(audio_path, request.get('stream_rate'),
+                                                       bool(request.get('checkpoint'))))
+
+    def log_message(self, format, *args):
+        # one line per job is printed by the service itself
+        pass
+
+
+class TranscriptionService():
+    # Long running local HTTP service that reads the vosk model ONCE & transcribes files on request,
+    # so scripts don't pay the model loading time on every run (see TranscriptionClient).
+    #   POST /transcribe  {"audio_path": ..., "stream_rate": null|rate, "checkpoint": true|false}
+    #                     -> {"ok", "results" (vosk results), "text", "audio_duration", "elapsed"}
+    #   GET  /health      -> {"status", "model_path", "options_hash", "queued", "running", "done", "failed"}
+    # Files are read from the local disk (paths, not uploads). Requests are queued onto num_threads threads,
+    # which share the one model. Every request needs the shared token (header "Authorization: Bearer <token>").
+    # Checkpoints are kept by the service itself under checkpoint_dir (None = no checkpoints); clients only ask for one.
+    def __init__(self, name, model_path, host='127.0.0.1', port=8765, num_threads=2, vosk_options=None,
+                 token='', checkpoint_dir=None):
+        self.name = name
+        self.model_path = model_path
+        self.host = host
+        self.port = port
+        self.num_threads = num_threads
+        #keyword arguments for the VoskHandler of every job (chunk size, recognizer options, ...)
+        self.vosk_options = vosk_options if vosk_options is not None else {}
+        #clients compare it with their own options (see get_options_hash): the service decodes with these
+        self.options_hash = get_options_hash(self.vosk_options, model_path)
+        if not token:
+            raise ValueError("The transcription service needs a token (service_token in config.ini).")
+        self.token = token
+        self.checkpoint_dir = checkpoint_dir
+
+        #Will be initialized
+        self.model = None
+        self.executor = None
+        self.server = None
+
+        self.lock = threading.Lock()
+        self.counts = {'queued': 0, 'running': 0, 'done': 0, 'failed': 0}
+
+    def __str__(self):
+        return self.name
+
+    def count(self, state, n):
+        with self.lock:
+            self.counts[state] += n
+
+    def get_status(self):
+        with self.lock:
+            status = dict(self.counts)
+        status.update({'status': 'ok', 'model_path': self.model_path, 'options_hash': self.options_hash})
+        return status
+
+    def get_checkpoint_path(self, audio_path):
+        #named after the hash of the audio (path, size & modification time), so a changed file starts over
+        if self.checkpoint_dir is None:
+            return None
+        stat = os.stat(audio_path)
+        key = '{}|{}|{}'.format(os.path.realpath(audio_path), stat.st_size, stat.st_mtime_ns)
+        return get_checkpoint_path(self.checkpoint_dir, hashlib.sha256(key.encode('utf-8')).hexdigest())
+
+    def transcribe(self, audio_path, stream_rate=None, checkpoint=False):
+        self.count('queued', -1)
+        self.count('running', 1)
+        start = time.perf_counter()
+        checkpoint_path = self.get_checkpoint_path(audio_path) if checkpoint else None
+        #a handler per job (last_audio_duration is per file), all with the model of the service
+        vosky = VoskHandler("vosky", self.model_path, **self.vosk_options)
+        vosky.model = self.model
+        try:
+            if stream_rate is None:
+                results = vosky.transcribe_audio_to_text(audio_path, checkpoint_path)
+            else:
+                results = vosky.transcribe_audio_stream(audio_path, stream_rate, checkpoint_path)
+        except Exception as err:
+            print(f"[ERROR]Transcription of '{audio_path}' failed.\n", err)
+            results = None
+        finally:
+            self.count('running', -1)
+        elapsed = time.perf_counter() - start
+        if results is None:
+            self.count('failed', 1)
+            return {'ok': False, 'error': f"recognition of '{audio_path}' failed", 'elapsed': elapsed}
+        self.count('done', 1)
+        text = ' '.join(obj['word'] for sentence in results for obj in get_result_words(sentence))
+        return {'ok': True, 'results': results, 'text': text,
+                'audio_duration': vosky.last_audio_duration, 'elapsed': elapsed}
+
+    def submit(self, audio_path, stream_rate=None, checkpoint=False):
+        #waits until a thread of the service is free & the file is done
+        self.count('queued', 1)
+        return self.executor.submit(self.transcribe, audio_path, stream_rate, checkpoint).result()
+
+    def serve_forever(self):
+        vosky = VoskHandler("vosky", self.model_path, **self.vosk_options)
+        vosky.initialize_model()
+        self.model = vosky.model
+        if self.checkpoint_dir is not None:
+            os.makedirs(self.checkpoint_dir, exist_ok=True)
+
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.num_threads)
+        self.server = ThreadingHTTPServer((self.host, self.port), _ServiceRequestHandler)
+        self.server.daemon_threads = True
+        self.server.service = self
+        print(f"[INFO]Transcription service listening on http://{self.host}:{self.port} with {self.num_threads} threads.")
+        try:
+            self.server.serve_forever()
+        except KeyboardInterrupt:
+            print("[INFO]Stopping transcription service.")
+        finally:
+            self.server.server_close()
+            self.executor.shutdown(wait=True)
+
+
+class TranscriptionClient():
+    # Client of a running TranscriptionService. Paths are sent as absolute paths, so the service
+    # (which may run in another working directory) finds the same files.
+    def __init__(self, name, url, token, timeout=None):
+        self.name = name
+        self.url = url.rstrip('/')
+        #the shared token of the service (service_token in config.ini)
+        self.headers = {'Authorization': 'Bearer ' + token}
+        #seconds to wait for a file; None = wait as long as the recognition takes
+        self.timeout = timeout
+
+    def __str__(self):
+        return self.name
+
+    def health(self):
+        #status dict of the service, or None if it can't be reached
+        try:
+            req = urllib.request.Request(self.url + '/health', headers=self.headers)
+            with urllib.request.urlopen(req, timeout=5) as response:
+                return json.loads(response.read().decode('utf-8'))
+        except (urllib.error.URLError, OSError, ValueError):
+            return None
+
+    def transcribe(self, audio_path, stream_rate=None, checkpoint=False):
+        #Returns the response dict of the service (see TranscriptionService)
+        #checkpoint: the service keeps a checkpoint of the file (in its own checkpoint dir) & resumes from it
+        request = {'audio_path': os.path.abspath(audio_path), 'stream_rate': stream_rate, 'checkpoint': checkpoint}
+        data = json.dumps(request).encode('utf-8')
+        req = urllib.request.Request(self.url + '/transcribe', data=data,
+                                     headers=dict(self.headers, **{'Content-Type': 'application/json'}))
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as response:
+                return json.loads(response.read().decode('utf-8'))
+        except (urllib.error.URLError, OSError, ValueError) as err:
+            return {'ok': False, 'error': f"transcription service at '{self.url}' failed: {err}"}
+
+
+def transcribe_with_service(client, data_handle, job, stream_rate=None):
+    #Like transcribe_to_files(), but the recognition is done by a TranscriptionService.
+    #Returns a tuple (file, ok, elapsed, audio_duration)
+    start = time.perf_counter()
+    response = client.transcribe(job['audio_path'], stream_rate, job['checkpoint_path'] is not None)
+    if not response.get('ok'):
+        print(f"[ERROR]{response.get('error')}")
+        return job['file'], False, time.perf_counter() - start, 0.0
+    try:
+        _, text_path, word_timings_path = data_handle.stream_to_files(iter(response['results']), job['text_path'],
+                                                                      job['word_timings_path'])
+        if text_path is not None:
+            job['text_path'], job['word_timings_path'] = text_path, word_timings_path
+    except Exception as err:
+        print(f"[ERROR]{job['file']}: {type(err).__name__}: {err}")
+        return job['file'], False, time.perf_counter() - start, response['audio_duration']
+    return job['file'], True, time.perf_counter() - start, response['audio_duration']
 
-        #Recognition finished, return list of data stored in results
-        print(f"[INFO]Finished transcribing file under '{audio_path}'.")
-        return results
 
 class DataHandler():
-    def __init__(self, name, output_dir):
+    def __init__(self, name, output_dir, overwrite_policy='overwrite'):
         self.name = name
 
+        #what happens when an output file exists already: 'skip', 'overwrite', 'version' or 'fail' (see commit_file)
+        if overwrite_policy not in OUTPUT_POLICIES:
+            raise ValueError(f"Unknown overwrite policy '{overwrite_policy}'. Use one of {OUTPUT_POLICIES}.")
+        self.overwrite_policy = overwrite_policy
+
         #output_dir
-        #Check wether path for Output_dir exists, if not ask wether to create it
+        #Check wether path for Output_dir exists, if not create it (safe if many workers do it at once)
         if not os.path.exists(output_dir):
             print(f"[WARNING]DIR '{output_dir}' doesn't exist")
-            create_dir = input("[PROMPT]Should a new dir be created under this path? (Yes/No)\n")
-            if create_dir.lower() == 'yes':
-                try:
-                    os.mkdir(output_dir)
-                    print(f"[INFO]New dir under this path '{output_dir}' was created.")
-                    self.output_dir = output_dir
-                except Exception as err:
-                    print(f"[FATAL]No dir under this path '{output_dir}' could be created. Exit...")
-                    sys.exit()
-            elif create_dir.lower() == 'no':
-                print("[FATAL]Please create the dir or enter a different path. Exiting...")
-                sys.exit()
-            else:
-                print("[FATAL]This was not a valid input.")
-                sys.exit()
+            try:
+                os.makedirs(output_dir, exist_ok=True)
+            except OSError as err:
+                print(f"[FATAL]No dir under this path '{output_dir}' could be created.")
+                raise
+            print(f"[INFO]New dir under this path '{output_dir}' was created.")
         else:
-            self.output_dir = output_dir
             print("[INFO]Path to output dir accepted.")
+        self.output_dir = output_dir
 
 
     def save_text(self, text, filename):
         #All data is safed under output dir
         #add .txt as extension to the file name (remove ext before in case it was provided)
+        #Returns the path of the saved file (None if it was skipped because of the overwrite policy)
         filename = 'pure_text_' + os.path.splitext(filename)[0] + '.txt'
 
         target_path = os.path.join(self.output_dir, filename)
 
-        if os.path.exists(target_path):
-            rem = input(f"[PROMPT]A file under the name '{filename}' already exists in the output dir. Overwrite this file? (Yes/No)\n")
-            if rem.lower() ==  'no':
-                print("[FATAL]Please provide a different filename.")
-                sys.exit()
-            elif rem.lower() != 'yes':
-                print("[FATAL]This was not a valid input.")
-                sys.exit()
-
-
         print(f"[INFO]Saving pure text to '{target_path}'...")
-        with open(target_path, "w") as text_file:
-            text_file.write(text)
-        print(f"[INFO]Text successfully saved as '{filename}'.")
+        target_path = write_file_atomic(target_path, lambda text_file: text_file.write(text), self.overwrite_policy)
+        if target_path is not None:
+            print(f"[INFO]Text successfully saved as '{os.path.basename(target_path)}'.")
+        return target_path
 
     def save_as_csv(self, data, filename):
          #All data is safed under output dir
         #add .csv as extension to the file name (remove ext before in case it was provided)
+        #Returns the path of the saved file (None if it was skipped because of the overwrite policy)
         filename = 'csv_' + os.path.splitext(filename)[0] + '.csv'
 
-        #TODO DUPLICATE CODE FIX THAT IN FUNCTION!
         target_path = os.path.join(self.output_dir, filename)
 
-        if os.path.exists(target_path):
-            rem = input(f"[PROMPT]A file under the name '{filename}' already exists in the output dir. Overwrite this file? (Yes/No)\n")
-            if rem.lower() ==  'no':
-                print("[FATAL]Please provide a different filename.")
-                sys.exit()
-            elif rem.lower() != 'yes':
-                print("[FATAL]This was not a valid input.")
-                sys.exit()
-
         # Save values in a csv file
         print(f"[INFO]Saving csv info to '{filename}'...")
         fields = ["WORD", "START", "END", "CONF"]
-        with open(target_path, 'w') as f:
+        def write(f):
             writer = csv.DictWriter(f, fieldnames = fields)
             writer.writeheader()
             writer.writerows(data)
-
-        print("[INFO]Saved csv data under:  ", target_path)
+        target_path = write_file_atomic(target_path, write, self.overwrite_policy, newline='')
+        if target_path is not None:
+            print("[INFO]Saved csv data under:  ", target_path)
+        return target_path
 
 
     def convert_to_text_and_list_of_word_dicts(self, data, autosave=False):
@@ -404,26 +2213,24 @@ class DataHandler():
 
         #create empty list: yields one dict for each word (word, start, end, conf)
         list_word_dicts = []
-        #create empty string to add the single words to
-        pure_text = ''
+        #collect the words & join them once at the end (repeated += on a string copies the whole text every time)
+        words = []
 
         #iterate over each sentence in the data
         for sentence in data:
-            if len(sentence) == 1:
-                # sometimes there are bugs in recognition 
-                # and it returns an empty dictionary
-                # {'text': ''}
-                continue
-            for obj in sentence['result']:
+            for obj in get_result_words(sentence):
                 # create a dict with infos & append it to list
+                # (times/conf are missing with SetWords(False) or SetMaxAlternatives > 0)
                 list_word_dicts.append({
                         "WORD" : obj['word'], 
-                        "START" : obj['start'], 
-                        "END" : obj['end'],
-                        "CONF" : obj['conf'],
+                        "START" : obj.get('start', float('nan')), 
+                        "END" : obj.get('end', float('nan')),
+                        "CONF" : obj.get('conf', float('nan')),
                 }) 
-                #add the word to the pure_text string
-                pure_text += obj['word'] + ' '
+                words.append(obj['word'])
+
+        #add the words to the pure_text string (every word followed by a space)
+        pure_text = ''.join(word + ' ' for word in words)
 
         #If autosave is set, automatically call the methods to save data
         #TODO make this later. Need a way to handle filenames
@@ -431,34 +2238,506 @@ class DataHandler():
         #returns a tuple of (pure_text, list_word_dicts)
         return (pure_text, list_word_dicts)
 
+    def stream_to_files(self, data, text_path, word_timings_path, buffer_size=1024*1024):
+        #Streaming variant of convert_to_text_and_list_of_word_dicts():
+        #takes the results as generator (e.g. VoskHandler.iter_transcribe_audio) while recognition runs &
+        #writes the text & the word timings (.npz, see WordTimingWriter) incrementally through buffered writers.
+        #Memory doesn't grow with the length of the recording. Both files are written under a temp name &
+        #renamed when the data is complete, so they are never half written (existing files: see self.overwrite_policy;
+        #both files are saved under the same version & with 'skip'/'fail' neither or both).
+        #Returns (number of words, text path, word timings path) with the paths the files were saved under
+        #(None if they were skipped).
+        text_part = get_temp_path(text_path, '.part')
+        num_words = 0
+        timings = WordTimingWriter(os.path.basename(word_timings_path), word_timings_path)
+        try:
+            with open(text_part, 'w', buffering=buffer_size) as text_file:
+                for sentence in data:
+                    for obj in get_result_words(sentence):
+                        text_file.write(obj['word'] + ' ')
+                        timings.add(obj['word'], obj.get('start', np.nan), obj.get('end', np.nan), obj.get('conf', np.nan))
+                        num_words += 1
+            with profiler.stage('write_outputs', os.path.splitext(os.path.basename(text_path))[0]):
+                timings_tmp = timings.finish()
+        except BaseException:
+            # nothing half written stays behind
+            timings.discard()
+            if os.path.exists(text_part):
+                os.remove(text_part)
+            raise
+        paths = commit_files([text_part, timings_tmp], [text_path, word_timings_path], self.overwrite_policy)
+        if paths is None:
+            return num_words, None, None
+        return num_words, paths[0], paths[1]
+
+def align_words(reference, hypothesis):
+    # Word level alignment (Levenshtein on words) of two token lists in a single pass.
+    # Returns dict with wer, ld (edit distance), m (number of reference words), insertions, deletions, substitutions.
+    # Tokens are encoded as integers & the DP is computed one reference word (= one row) at a time with numpy,
+    # carrying the insertion/deletion counts of the best path along, so memory is O(len(hypothesis)).
+    # Of several best paths the one of werpy is counted: its backtrace (from the end) prefers a match or
+    # substitution, then an insertion, then a deletion. Each cell takes its predecessor by the same rule.
+    n, m = len(reference), len(hypothesis)
+
+    # integer encoding; words only in the reference get ids the hypothesis doesn't have
+    ids = {}
+    hyp = np.array([ids.setdefault(w, len(ids)) for w in hypothesis], dtype=np.int64)
+    ref = [ids.setdefault(w, len(ids)) for w in reference]
+
+    cols = np.arange(m + 1, dtype=np.int64)
+    # row 0: hypothesis words against an empty reference -> only insertions
+    cost = cols.copy()
+    ins = cols.copy()
+    dels = np.zeros(m + 1, dtype=np.int64)
+
+    for i, word in enumerate(ref, start=1):
+        # best way into cell j without an insertion: substitution/match (diagonal) or deletion (from above)
+        diag = cost[:-1] + (hyp != word)
+        up = cost[1:] + 1
+        cand_cost = np.empty(m + 1, dtype=np.int64)
+        cand_cost[0] = i
+        cand_cost[1:] = np.minimum(diag, up)
+        # insertions run along the row: cost[j] = min over k<=j of cand_cost[k] + (j - k).
+        # A running minimum over (cand_cost[k] - k) does this without a python loop.
+        cost = np.minimum.accumulate(cand_cost - cols) + cols
+
+        # predecessor of every cell: diagonal if it's a best path, else insertion (from the left), else deletion
+        take_diag = np.zeros(m + 1, dtype=bool)
+        take_diag[1:] = cost[1:] == diag
+        take_left = np.zeros(m + 1, dtype=bool)
+        take_left[1:] = ~take_diag[1:] & (cost[1:] == cost[:-1] + 1)
+        cand_ins = np.empty(m + 1, dtype=np.int64)
+        cand_ins[0] = 0
+        cand_ins[1:] = np.where(take_diag[1:], ins[:-1], ins[1:])
+        cand_del = np.empty(m + 1, dtype=np.int64)
+        cand_del[0] = i
+        cand_del[1:] = np.where(take_diag[1:], dels[:-1], dels[1:] + 1)
+
+        # a run of insertions starts at the last cell k<=j that isn't reached from the left
+        src = np.maximum.accumulate(np.where(take_left, 0, cols))
+        ins = cand_ins[src] + (cols - src)
+        dels = cand_del[src]
+
+    ld = int(cost[m])
+    insertions = int(ins[m])
+    deletions = int(dels[m])
+    return {
+        'wer': ld / n if n > 0 else float('nan'),
+        'ld': ld,
+        'm': n,
+        'insertions': insertions,
+        'deletions': deletions,
+        'substitutions': ld - insertions - deletions,
+    }
+
+
+class WordTimingStore():
+    # Compact, array backed word timings of one or many files (replaces the JSON lists of word dicts).
+    #   vocab:    every distinct word once
+    #   word_ids: int32 index into vocab for every word
+    #   start, end, conf: float64 per word (float32 would turn 0.1 into 0.10000000149011612)
+    #   keys/offsets: the words of keys[i] are at [offsets[i]:offsets[i+1]] in the arrays above
+    # save() writes either one .npz file or a dir of .npy files. A dir is opened memory-mapped by load(),
+    # so get() returns zero-copy views & a whole corpus can be analysed without reading it into RAM.
+    arrays = ['word_ids', 'start', 'end', 'conf']
+
+    def __init__(self, name):
+        self.name = name
+        self.clear()
+
+    def clear(self):
+        self.vocab = []
+        self.vocab_ids = {}
+        self.keys = []
+        self.key_index = {}
+        self.offsets = [0]
+
+        # arrays are collected in chunks (one per file) & concatenated on first access
+        self.chunks = {a: [] for a in self.arrays}
+        self.data = {a: np.zeros(0, dtype=np.int32 if a == 'word_ids' else np.float64) for a in self.arrays}
+
+    def __str__(self):
+        return self.name
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self.key_index
+
+    def add(self, key, word_dicts):
+        # word_dicts: list of {"WORD", "START", "END", "CONF"} as made by DataHandler
+        if key in self.key_index:
+            print(f"[WARNING]'{key}' is already in the word timing store. Skipped.")
+            return
+        ids = np.empty(len(word_dicts), dtype=np.int32)
+        start = np.empty(len(word_dicts), dtype=np.float64)
+        end = np.empty(len(word_dicts), dtype=np.float64)
+        conf = np.empty(len(word_dicts), dtype=np.float64)
+        for i, wd in enumerate(word_dicts):
+            ids[i] = self.get_word_id(wd['WORD'])
+            start[i] = wd['START']
+            end[i] = wd['END']
+            conf[i] = wd['CONF']
+        self.add_arrays(key, ids, start, end, conf)
+
+    def add_arrays(self, key, word_ids, start, end, conf):
+        # word_ids have to refer to self.vocab
+        self.key_index[key] = len(self.keys)
+        self.keys.append(key)
+        self.offsets.append(self.offsets[-1] + len(word_ids))
+        for a, values in zip(self.arrays, (word_ids, start, end, conf)):
+            self.chunks[a].append(values)
+
+    def get_word_id(self, word):
+        word_id = self.vocab_ids.get(word)
+        if word_id is None:
+            word_id = len(self.vocab)
+            self.vocab_ids[word] = word_id
+            self.vocab.append(word)
+        return word_id
+
+    def finalize(self):
+        # concatenate the chunks added since the last call
+        for a in self.arrays:
+            if len(self.chunks[a]) > 0:
+                self.data[a] = np.concatenate([self.data[a]] + self.chunks[a])
+                self.chunks[a] = []
+
+    def get(self, key):
+        # returns dict of views ('word_ids', 'start', 'end', 'conf') for one file + 'words' (the vocab lookup)
+        self.finalize()
+        i = self.key_index[key]
+        lo, hi = self.offsets[i], self.offsets[i + 1]
+        views = {a: self.data[a][lo:hi] for a in self.arrays}
+        views['words'] = [self.vocab[w] for w in views['word_ids']]
+        return views
+
+    def to_word_dicts(self, key):
+        # back to the list of dicts for code that still needs it
+        v = self.get(key)
+        return [{"WORD": w, "START": float(s), "END": float(e), "CONF": float(c)}
+                for w, s, e, c in zip(v['words'], v['start'], v['end'], v['conf'])]
+
+    def get_text(self, key):
+        return ' '.join(self.get(key)['words'])
+
+    def save(self, path):
+        # path ending with .npz: one (uncompressed) file; anything else: a dir of memory-mappable .npy files
+        self.finalize()
+        arrays = dict(self.data)
+        arrays['vocab'] = np.array(self.vocab, dtype=str)
+        arrays['keys'] = np.array(self.keys, dtype=str)
+        arrays['offsets'] = np.array(self.offsets, dtype=np.int64)
+
+        if str(path).endswith('.npz'):
+            tmp_path = get_temp_path(path, '.tmp.npz')
+            np.savez(tmp_path, **arrays)
+            os.replace(tmp_path, path)
+        else:
+            if not os.path.isdir(path):
+                os.makedirs(path)
+            for a in arrays:
+                np.save(os.path.join(path, a + '.npy'), arrays[a])
+
+    def load(self, path):
+        # loads a .npz file or a dir from save(); a dir is memory-mapped (read only)
+        if str(path).endswith('.npz'):
+            with np.load(path) as f:
+                arrays = {a: f[a] for a in f.files}
+        else:
+            arrays = {}
+            for a in self.arrays + ['vocab', 'keys', 'offsets']:
+                arrays[a] = np.load(os.path.join(path, a + '.npy'), mmap_mode='r')
+
+        self.clear()
+        self.vocab = arrays['vocab'].tolist()
+        self.vocab_ids = {w: i for i, w in enumerate(self.vocab)}
+        self.keys = arrays['keys'].tolist()
+        self.key_index = {k: i for i, k in enumerate(self.keys)}
+        self.offsets = arrays['offsets'].tolist()
+        for a in self.arrays:
+            self.data[a] = arrays[a]
+
+    def add_store(self, other):
+        # merges the files of another store (e.g. a per-file .npz) into this one; word ids are remapped
+        remap = np.array([self.get_word_id(w) for w in other.vocab], dtype=np.int32)
+        other.finalize()
+        for key in other.keys:
+            if key in self.key_index:
+                print(f"[WARNING]'{key}' is already in the word timing store. Skipped.")
+                continue
+            v = other.get(key)
+            self.add_arrays(key, remap[v['word_ids']], np.array(v['start']), np.array(v['end']), np.array(v['conf']))
+
+
+class WordTimingWriter():
+    # Writes the word timings of ONE file incrementally, in the .npz format of WordTimingStore.
+    # Words are buffered in a small record array & appended to a raw temp file; close() builds the .npz
+    # from a memory map of that file. Only the vocabulary (distinct words) is kept in memory.
+    record = np.dtype([('word_ids', '<i4'), ('start', '<f8'), ('end', '<f8'), ('conf', '<f8')])
+
+    def __init__(self, name, path, buffer_words=4096):
+        self.name = name
+        self.path = path
+        self.part_path = get_temp_path(path, '.part')
+        self.part_file = open(self.part_path, 'wb')
+        self.vocab = []
+        self.vocab_ids = {}
+        self.buffer = np.empty(buffer_words, dtype=self.record)
+        self.buffered = 0
+        self.count = 0
+
+    def __str__(self):
+        return self.name
+
+    def add(self, word, start, end, conf):
+        word_id = self.vocab_ids.get(word)
+        if word_id is None:
+            word_id = len(self.vocab)
+            self.vocab_ids[word] = word_id
+            self.vocab.append(word)
+        self.buffer[self.buffered] = (word_id, start, end, conf)
+        self.buffered += 1
+        self.count += 1
+        if self.buffered == len(self.buffer):
+            self.flush()
+
+    def flush(self):
+        self.part_file.write(self.buffer[:self.buffered].tobytes())
+        self.buffered = 0
+
+    def close(self, policy='overwrite'):
+        #builds the .npz & moves it to self.path (existing file: see commit_file). Returns the final path.
+        return commit_file(self.finish(), self.path, policy)
+
+    def finish(self):
+        #builds the .npz under a temp name (see close) & returns that name
+        self.flush()
+        self.part_file.close()
+        if self.count > 0:
+            records = np.memmap(self.part_path, dtype=self.record, mode='r')
+        else:
+            records = np.zeros(0, dtype=self.record)
+        tmp_path = get_temp_path(self.path, '.tmp.npz')
+        # np.savez copies the (strided) fields in blocks, so the records are never all in RAM
+        np.savez(tmp_path,
+                 word_ids=records['word_ids'], start=records['start'], end=records['end'], conf=records['conf'],
+                 vocab=np.array(self.vocab, dtype=str),
+                 keys=np.array([os.path.splitext(os.path.basename(self.path))[0]], dtype=str),
+                 offsets=np.array([0, self.count], dtype=np.int64))
+        del records
+        os.remove(self.part_path)
+        return tmp_path
+
+    def discard(self):
+        if not self.part_file.closed:
+            self.part_file.close()
+        if os.path.exists(self.part_path):
+            os.remove(self.part_path)
+
+
+class NormalizationCache():
+    # Memoizes werpy.normalize + tokenization of whole transcripts, keyed by the hash of the raw text and
+    # the normalizer settings. An original transcript is normalized once, no matter how many models or
+    # settings are evaluated against it. Entries are kept in memory (up to max_items) & as one .npz per text
+    # in cache_dir (optional), so later runs & other processes reuse them.
+    # An entry: normalized text, token ids + vocabulary of the text, number of tokens & characters.
+    def __init__(self, name, cache_dir=None, max_items=256):
+        self.name = name
+        self.cache_dir = cache_dir
+        if cache_dir is not None and not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir, exist_ok=True)
+        self.max_items = max_items
+        #everything that changes the normalized output has to be part of the key
+        self.settings = json.dumps({'normalizer': 'werpy', 'version': get_werpy_version()}, sort_keys=True)
+
+        #key=cache key; value=entry dict (insertion order = least recently used first)
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __str__(self):
+        return self.name
+
+    def get_key(self, text):
+        return hashlib.sha256((self.settings + '\0' + text).encode('utf-8')).hexdigest()
+
+    def get_path(self, key):
+        return os.path.join(self.cache_dir, key + '.npz')
+
+    def remember(self, key, entry):
+        self.entries.pop(key, None)
+        self.entries[key] = entry
+        while len(self.entries) > self.max_items:
+            del self.entries[next(iter(self.entries))]
+
+    def load_entry(self, key):
+        if self.cache_dir is None or not os.path.exists(self.get_path(key)):
+            return None
+        try:
+            with np.load(self.get_path(key)) as f:
+                vocab = f['vocab']
+                token_ids = f['token_ids']
+                text = f['text'].tobytes().decode('utf-8')
+        except (OSError, ValueError, KeyError) as err:
+            print(f"[WARNING]Normalization cache entry '{key}' couldn't be read. Normalizing again.\n", err)
+            return None
+        return {'text': text, 'tokens': vocab[token_ids].tolist(), 'token_ids': token_ids, 'vocab': vocab.tolist(),
+                'n_tokens': len(token_ids), 'n_chars': len(text)}
+
+    def save_entry(self, key, entry):
+        if self.cache_dir is None:
+            return
+        write_file_atomic(self.get_path(key),
+                          lambda f: np.savez(f, text=np.frombuffer(entry['text'].encode('utf-8'), dtype=np.uint8),
+                                             token_ids=entry['token_ids'],
+                                             vocab=np.array(entry['vocab'], dtype=str)),
+                          mode='wb')
+
+    def normalize(self, text):
+        #Returns the entry of text: dict with text (normalized), tokens (list), token_ids, vocab, n_tokens, n_chars
+        key = self.get_key(text)
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = self.load_entry(key)
+        if entry is not None:
+            self.hits += 1
+            self.remember(key, entry)
+            return entry
+
+        self.misses += 1
+        import werpy
+        normalized = werpy.normalize(text)
+        tokens = normalized.split()
+        ids = {}
+        token_ids = np.array([ids.setdefault(token, len(ids)) for token in tokens], dtype=np.int32)
+        entry = {'text': normalized, 'tokens': tokens, 'token_ids': token_ids,
+                 'vocab': list(ids), 'n_tokens': len(tokens), 'n_chars': len(normalized)}
+        self.save_entry(key, entry)
+        self.remember(key, entry)
+        return entry
+
+
+class MetricsCache():
+    # Persisted metrics (rows of CompareHandler.get_results()) of (original, ai transcript) pairs, keyed by
+    # the content hashes of both files & the metric settings. A pair is only evaluated again when one of
+    # its files or the settings changed. Saved as one json file: {key: row}.
+    # bump when get_results() or the way the files are read changes
+    version = 1
+
+    def __init__(self, name, path, encoding='unicode_escape'):
+        self.name = name
+        self.path = path
+        #everything that changes the metrics has to be part of the key
+        self.settings = json.dumps({'metrics': self.version, 'encoding': encoding, 'normalizer': 'werpy',
+                                    'normalizer_version': get_werpy_version()}, sort_keys=True)
+
+        #key=cache key; value=row without the file name
+        self.entries = {}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r') as f:
+                    self.entries = json.load(f)
+            except ValueError as err:
+                print(f"[WARNING]Metrics cache '{path}' can't be read & is rebuilt.", err)
+        self.hits = 0
+        self.misses = 0
+
+    def __str__(self):
+        return self.name
+
+    def get_key(self, original_hash, ai_hash):
+        return hashlib.sha256((self.settings + '\0' + original_hash + '\0' + ai_hash).encode('utf-8')).hexdigest()
+
+    def get(self, key, name):
+        #Returns the cached row (with the file name of this run) or None
+        #evaluation_time is 0: nothing was evaluated in this run (the time of the run that did isn't kept)
+        row = self.entries.get(key)
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return dict(row, file=name, evaluation_time=0.0)
+
+    def add(self, key, row):
+        #numpy scalars -> python numbers, so the row can be saved as json; file & evaluation_time belong to the run
+        self.entries[key] = {k: v.item() if isinstance(v, np.generic) else v for k, v in row.items()
+                             if k not in ('file', 'evaluation_time')}
+
+    def save(self):
+        write_json_atomic(self.path, self.entries)
+
+
+def jaccard_distances(originals, ai_transcripts):
+    # Jaccard distance of row i of originals & row i of ai_transcripts (sparse count matrices of one vocabulary)
+    # like scipy 1.9 (see requirements.txt): words whose counts differ / words that occur in at least one of the texts
+    # NOTE newer scipy versions compare the vectors as booleans (only presence of a word counts)
+    diff = originals - ai_transcripts
+    diff.eliminate_zeros()
+    unequal = np.diff(diff.indptr)
+    occurring = originals + ai_transcripts
+    occurring.eliminate_zeros()
+    nonzero = np.diff(occurring.indptr)
+    dist = np.zeros(originals.shape[0])
+    np.divide(unequal, nonzero, out=dist, where=nonzero != 0)
+    return dist
+
+
 class CompareHandler():
     # Takes two transcribed files and compares
-    def __init__(self, name, original, ai_transcribed):
+    # normalization_cache: optional NormalizationCache, so a text that was normalized before isn't normalized again
+    def __init__(self, name, original, ai_transcribed, normalization_cache=None):
         self.name = str(name)
 
-        # normailze input data 
-        self.original = werpy.normalize(original)
-        self.ai_transcript = werpy.normalize(ai_transcribed)
+        # normailze input data & split it into words
+        with profiler.stage('normalization', self.name):
+            if normalization_cache is not None:
+                original_entry = normalization_cache.normalize(original)
+                ai_entry = normalization_cache.normalize(ai_transcribed)
+                self.original, self.original_tokens = original_entry['text'], original_entry['tokens']
+                self.ai_transcript, self.ai_tokens = ai_entry['text'], ai_entry['tokens']
+            else:
+                import werpy
+                self.original = werpy.normalize(original)
+                self.ai_transcript = werpy.normalize(ai_transcribed)
+                self.original_tokens = self.original.split()
+                self.ai_tokens = self.ai_transcript.split()
 
         # create corpus as tuple
         self.corpus = (self.original, self.ai_transcript)
 
-        # initialize Vecotrizer
-        self.vectorizer = CountVectorizer()
-
-        # transform Corupus into csrMatrix
-        self.csrMatrix = self.vectorizer.fit_transform(self.corpus) 
-        self.csrMatrix.toarray()
-
-        # Convert each Matrix (of text) to an array
-        # returns nested list with each matrix row converted to an array
-        self.row_0 = self.csrMatrix.getrow(0).toarray()[0]
-        self.row_1 = self.csrMatrix.getrow(1).toarray()[0]
+        # count vectors of the pair; only built when a distance of this single pair is asked for
+        # (use BatchCompareHandler to get the distances of many pairs at once)
+        self.vectorizer = None
+        self.csrMatrix = None
+        self.row_0 = None
+        self.row_1 = None
+
+        # word alignment of the pair; computed on first use
+        self.alignment = None
+
+    def vectorize(self):
+        if self.row_0 is not None:
+            return
+        with profiler.stage('vectorization', self.name):
+            # initialize Vecotrizer
+            from sklearn.feature_extraction.text import CountVectorizer
+            self.vectorizer = CountVectorizer()
+
+            # transform Corupus into csrMatrix
+            self.csrMatrix = self.vectorizer.fit_transform(self.corpus) 
+
+            # Convert each Matrix (of text) to an array
+            # returns nested list with each matrix row converted to an array
+            self.row_0 = self.csrMatrix.getrow(0).toarray()[0]
+            self.row_1 = self.csrMatrix.getrow(1).toarray()[0]
     
     
     # display matrix
     def display_matrix(self):
         try:
+            self.vectorize()
             print("Displaying the matrix for {}.".format(self.name))
             print(self.row_0)
             print(self.row_1)
@@ -468,92 +2747,380 @@ class CompareHandler():
     # check basic infos: len of text
     def get_len_infos(self):
         # Get Length of files
-        len_original = len(self.original.split())
+        len_original = len(self.original_tokens)
         # print(len_original)
-        len_ai = len(self.ai_transcript.split())
+        len_ai = len(self.ai_tokens)
         return len_original, len_ai
 
     
     #--- CALCULATE DISTANCES --#
     # euclidean Distance
     def calculate_euclidean(self):
+        self.vectorize()
+        from scipy.spatial import distance
         dist = distance.euclidean(self.row_0, self.row_1)
         return dist
 
     # cosine Distance
     def calculate_cosine(self):
+        self.vectorize()
+        from scipy.spatial import distance
         dist = distance.cosine(self.row_0, self.row_1)
         return dist
 
     # jaccard Distance
+    # (same implementation as BatchCompareHandler, so both give the same values)
     def calculate_jaccard(self):
-        dist = distance.jaccard(self.row_0, self.row_1)
-        return dist
+        self.vectorize()
+        dist = jaccard_distances(self.csrMatrix[0], self.csrMatrix[1])[0]
+        return float(dist)
  
     #--- CALCULATE Word Error Rate (WER) --#
+    # The alignment is computed once (align_words) & shared by all WER methods
+    def calculate_alignment(self):
+        if self.alignment is None:
+            with profiler.stage('wer', self.name):
+                self.alignment = align_words(self.original_tokens, self.ai_tokens)
+        return self.alignment
+
     def calculate_wer(self):
-        wer = werpy.wer(self.original, self.ai_transcript)
+        wer = self.calculate_alignment()['wer']
         return wer
     
     def calculate_wer_summary(self):
-        wer_res = werpy.summary(self.original, self.ai_transcript)
-        # Since it is only 1 column it will give the dict nested 
-            # {0: {...}}
-        wd = wer_res.to_dict('index')[0]
-
-        # Create wer_res_dict as formatted dictionary
-        wer_res_dict = {
-            'wer': wd['wer'],
-            'ld': wd['ld'], 
-            'm': wd['m'], 
-            'insertions': wd['insertions'],
-            'deletions': wd['deletions'], 
-            'substitutions': wd['substitutions']
-        }
-
+        # Create wer_res_dict as formatted dictionary (copy, so callers can't change the cached alignment)
+        wer_res_dict = dict(self.calculate_alignment())
         return wer_res_dict
     
 
-    # takes one file & writes resullt to csv
-    # TODO all columns in one row --> multiple results in one csv file
-    # TODO add more basic infos (audio-length, etc.)
-    def results_to_csv(self, output_dir, euc_cos_jac=True, wer=True):
-        filename = os.path.join(output_dir, self.name + ".csv")
-        
-        # -- BASIC INFO -- (Only len for now)
+    # all metrics of this pair as ONE flat row (see ResultsStore)
+    # distances: precomputed {'Euclidean', 'Cosine', 'Jaccard'} of this pair (e.g. from BatchCompareHandler)
+    def get_results(self, distances=None):
+        start = time.perf_counter()
+
+        # -- BASIC INFO --
         len_orig, len_ai = self.get_len_infos()
-        len_data = {'LEN Original': len_orig, 
-                    'LEN AI-Transcript': len_ai}
-        len_fields = list(len_data.keys())
 
         # -- Euclidean, Cosine & Jaccard -- 
-        ecj_data = {'Euclidean': self.calculate_euclidean(),
-                    'Cosine': self.calculate_cosine(),
-                    'Jaccard': self.calculate_jaccard()}
-        ecj_fields = list(ecj_data.keys())
+        if distances is None:
+            distances = {'Euclidean': self.calculate_euclidean(),
+                         'Cosine': self.calculate_cosine(),
+                         'Jaccard': self.calculate_jaccard()}
 
         # -- WER Infos --
-        wer_data = self.calculate_wer_summary()  # get Dicitonary of wer-results to save
-        wer_fields = list(wer_data.keys())
+        wer_data = self.calculate_wer_summary()
+
+        return {
+            'file': self.name,
+            'len_original': len_orig,
+            'len_ai': len_ai,
+            'euclidean': distances['Euclidean'],
+            'cosine': distances['Cosine'],
+            'jaccard': distances['Jaccard'],
+            'wer': wer_data['wer'],
+            'ld': wer_data['ld'],
+            'm': wer_data['m'],
+            'insertions': wer_data['insertions'],
+            'deletions': wer_data['deletions'],
+            'substitutions': wer_data['substitutions'],
+            'evaluation_time': time.perf_counter() - start,
+        }
 
-        def write_to_csv(f, fields, data):
-            writer = csv.DictWriter(f, fieldnames = fields)
-            writer.writeheader()
-            writer.writerow(data)
-            
-        
 
-        with open(filename, 'w') as f:
-            # Setup 'empty' writer to insert blank rows
-            blank_writer = csv.writer(f)
+class ResultsStore():
+    # Collects one row of metrics per file & writes them in bulk into ONE appendable results table.
+    # Backends: 'csv' (default), 'sqlite' (stdlib) & 'parquet' (needs pandas + pyarrow).
+    # Every row of a run gets the same run_id, so runs can be compared with a single query.
+    backends = {'csv': '.csv', 'sqlite': '.sqlite', 'parquet': '.parquet'}
+
+    def __init__(self, name, results_dir, backend='csv', run_metadata=None, table='results'):
+        self.name = name
+        if backend not in self.backends:
+            print(f"[WARNING]Unknown results backend '{backend}'. Using csv instead.")
+            backend = 'csv'
+        self.backend = backend
+        self.results_dir = results_dir
+        # name of the table (file name & sqlite table)
+        self.table = table
+        self.path = os.path.join(results_dir, table + self.backends[backend])
+
+        # added to every row, e.g. model_path
+        self.run_metadata = {
+            'run_id': time.strftime('%Y%m%d-%H%M%S'),
+            'run_time': time.strftime('%Y-%m-%d %H:%M:%S'),
+        }
+        if run_metadata is not None:
+            self.run_metadata.update(run_metadata)
+
+        self.rows = []
 
-            # Write BASIC INFOS + Empty row
-            write_to_csv(f, len_fields, len_data)
-            blank_writer.writerow("") #emptyrow
+    def __str__(self):
+        return self.name
 
-            # Write EUCLIDEAN, COSINE, JACCARD + Empty row
-            write_to_csv(f, ecj_fields, ecj_data)
-            blank_writer.writerow("") #emptyrow
+    def add_row(self, row):
+        full_row = dict(self.run_metadata)
+        full_row.update(row)
+        self.rows.append(full_row)
+
+    def get_fields(self):
+        # union of all keys, in the order they appear
+        fields = []
+        for row in self.rows:
+            for key in row:
+                if key not in fields:
+                    fields.append(key)
+        return fields
+
+    def write(self):
+        if len(self.rows) == 0:
+            print("[INFO]No results to write.")
+            return
+        if self.backend == 'sqlite':
+            self.write_sqlite()
+        elif self.backend == 'parquet':
+            self.write_parquet()
+        else:
+            self.write_csv()
+        print(f"[INFO]Saved {len(self.rows)} result rows under '{self.path}'.")
+        self.rows = []
+
+    def write_csv(self):
+        fields = self.get_fields()
+        new_file = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        if not new_file:
+            # keep the columns of the existing table
+            with open(self.path, 'r', newline='') as f:
+                fields_file = next(csv.reader(f), fields)
+            missing = [key for key in fields if key not in fields_file]
+            if len(missing) > 0:
+                print(f"[WARNING]Columns {missing} are not in '{self.path}' and won't be saved.")
+            fields = fields_file
+
+        with open(self.path, 'a', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames = fields, extrasaction='ignore')
+            if new_file:
+                writer.writeheader()
+            writer.writerows(self.rows)
+
+    def write_sqlite(self):
+        import sqlite3
+        fields = self.get_fields()
+        con = sqlite3.connect(self.path)
+        try:
+            with con:
+                con.execute('CREATE TABLE IF NOT EXISTS "{}" ({})'.format(self.table, ', '.join('"{}"'.format(f) for f in fields)))
+                # add columns that are new since the table was created
+                existing = [r[1] for r in con.execute('PRAGMA table_info("{}")'.format(self.table))]
+                for f in fields:
+                    if f not in existing:
+                        con.execute('ALTER TABLE "{}" ADD COLUMN "{}"'.format(self.table, f))
+                con.executemany('INSERT INTO "{}" ({}) VALUES ({})'.format(self.table,
+                                    ', '.join('"{}"'.format(f) for f in fields), ', '.join('?' * len(fields))),
+                                [tuple(row.get(f) for f in fields) for row in self.rows])
+        finally:
+            con.close()
+
+    def write_parquet(self):
+        # parquet files can't be appended to, so the existing table is read & rewritten
+        try:
+            import pandas as pd
+            frame = pd.DataFrame(self.rows, columns=self.get_fields())
+            if os.path.exists(self.path):
+                frame = pd.concat([pd.read_parquet(self.path), frame], ignore_index=True)
+            frame.to_parquet(self.path, index=False)
+        except ImportError as err:
+            print("[ERROR]Parquet needs pandas & pyarrow. Saving as csv instead.\n", err)
+            self.backend = 'csv'
+            self.path = os.path.join(self.results_dir, self.table + '.csv')
+            self.write_csv()
+
+
+class BatchCompareHandler():
+    # Computes euclidean, cosine & jaccard distance for many (original, ai_transcript) pairs at once.
+    # All texts share ONE vocabulary & ONE sparse count matrix; the distances are row-wise sparse operations,
+    # so nothing gets densified and there is no per-pair vectorizer.
+    # Gives the same values as CompareHandler (scipy.spatial.distance on the count vectors of each pair).
+    def __init__(self, name, comparisons):
+        # comparisons: list of CompareHandler objects (their texts are already normalized)
+        self.name = str(name)
+        self.names = [c.name for c in comparisons]
+
+        corpus = [c.original for c in comparisons] + [c.ai_transcript for c in comparisons]
+        with profiler.stage('vectorization', self.name):
+            from sklearn.feature_extraction.text import CountVectorizer
+            self.vectorizer = CountVectorizer()
+            csrMatrix = self.vectorizer.fit_transform(corpus).tocsr()
+
+        # row i of originals & row i of ai_transcripts belong to the same pair
+        n = len(comparisons)
+        self.originals = csrMatrix[:n]
+        self.ai_transcripts = csrMatrix[n:]
+        self.diff = self.originals - self.ai_transcripts
+        self.diff.eliminate_zeros()
+
+    def __str__(self):
+        return self.name
+
+    def row_sums(self, matrix):
+        # sum of every row as flat array
+        return np.asarray(matrix.sum(axis=1)).ravel()
+
+    #--- CALCULATE DISTANCES (one value per pair) --#
+    def calculate_euclidean(self):
+        return np.sqrt(self.row_sums(self.diff.multiply(self.diff)))
+
+    def calculate_cosine(self):
+        dot = self.row_sums(self.originals.multiply(self.ai_transcripts))
+        norm_0 = np.sqrt(self.row_sums(self.originals.multiply(self.originals)))
+        norm_1 = np.sqrt(self.row_sums(self.ai_transcripts.multiply(self.ai_transcripts)))
+        # like scipy: nan if one of the texts has no words at all
+        with np.errstate(divide='ignore', invalid='ignore'):
+            dist = 1.0 - dot / (norm_0 * norm_1)
+        return np.clip(dist, 0.0, 2.0)
+
+    def calculate_jaccard(self):
+        return jaccard_distances(self.originals, self.ai_transcripts)
+
+    def calculate_distances(self):
+        # returns dict: key=name of the pair; value={'Euclidean', 'Cosine', 'Jaccard'}
+        with profiler.stage('distances', self.name):
+            euclidean = self.calculate_euclidean()
+            cosine = self.calculate_cosine()
+            jaccard = self.calculate_jaccard()
+        distances = {}
+        for i, name in enumerate(self.names):
+            distances[name] = {'Euclidean': float(euclidean[i]),
+                               'Cosine': float(cosine[i]),
+                               'Jaccard': float(jaccard[i])}
+        return distances
+
+
+# marks the end of the items in the queues of AsyncPipeline
+_PIPELINE_STOP = object()
+
+class PipelineStage():
+    # One stage of AsyncPipeline. func(item) runs in executor (thread or process pool) for every item
+    # & returns the item for the next stage (None = drop the item). callback(result) runs in the event loop,
+    # e.g. to update a manifest without locks. Collects the metrics of the stage.
+    def __init__(self, name, func, executor, num_workers=1, callback=None):
+        self.name = name
+        self.func = func
+        self.executor = executor
+        self.num_workers = num_workers
+        self.callback = callback
+
+        #metrics
+        self.items = 0
+        self.failed = 0
+        self.busy = 0.0 # seconds spent in func (summed over the workers)
+        self.starved = 0.0 # seconds the workers waited for input
+        self.blocked = 0.0 # seconds the workers waited for room in the next queue (backpressure)
+        self.max_queue = 0 # longest input queue seen
+
+    def __str__(self):
+        return self.name
+
+    def get_metrics(self, wall):
+        return {
+            'stage': self.name,
+            'workers': self.num_workers,
+            'items': self.items,
+            'failed': self.failed,
+            'busy_s': round(self.busy, 3),
+            'starved_s': round(self.starved, 3),
+            'blocked_s': round(self.blocked, 3),
+            'max_queue': self.max_queue,
+            'items_per_min': round(self.items / wall * 60, 2) if wall > 0 else 0.0,
+            'utilization': round(self.busy / (wall * self.num_workers), 3) if wall > 0 else 0.0,
+        }
+
+
+class AsyncPipeline():
+    # Runs PipelineStages concurrently with asyncio: the stages are connected by bounded queues
+    # (queue_size items), so a fast stage waits for a slow one instead of piling up work (backpressure),
+    # and item N+1 is in stage 1 while item N is in stage 2.
+    # The work itself runs in the executors of the stages, the event loop only moves items.
+    def __init__(self, name, stages, queue_size=2):
+        self.name = name
+        self.stages = stages
+        self.queue_size = queue_size
+        self.wall = 0.0
+
+    def __str__(self):
+        return self.name
+
+    async def run_worker(self, stage, queue_in, queue_out, results):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = time.perf_counter()
+            item = await queue_in.get()
+            stage.starved += time.perf_counter() - start
+            if item is _PIPELINE_STOP:
+                return
+            stage.max_queue = max(stage.max_queue, queue_in.qsize() + 1)
+
+            start = time.perf_counter()
+            try:
+                result = await loop.run_in_executor(stage.executor, stage.func, item)
+            except Exception as err:
+                stage.failed += 1
+                print(f"[ERROR]Pipeline stage '{stage.name}' failed.\n", err)
+                continue
+            finally:
+                stage.busy += time.perf_counter() - start
+            stage.items += 1
+            if stage.callback is not None:
+                stage.callback(result)
+            if result is None:
+                continue
+
+            if queue_out is None:
+                results.append(result)
+                continue
+            start = time.perf_counter()
+            await queue_out.put(result)
+            stage.blocked += time.perf_counter() - start
+
+    async def run_stage(self, stage, queue_in, queue_out, results):
+        await asyncio.gather(*[self.run_worker(stage, queue_in, queue_out, results) for i in range(stage.num_workers)])
+        # all workers are done: tell every worker of the next stage
+        if queue_out is not None:
+            for i in range(self.next_workers[stage.name]):
+                await queue_out.put(_PIPELINE_STOP)
+
+    async def feed(self, items, queue):
+        for item in items:
+            await queue.put(item)
+        for i in range(self.stages[0].num_workers):
+            await queue.put(_PIPELINE_STOP)
+
+    async def run_async(self, items):
+        queues = [asyncio.Queue(maxsize=self.queue_size) for stage in self.stages]
+        self.next_workers = {stage.name: (self.stages[i + 1].num_workers if i + 1 < len(self.stages) else 0)
+                             for i, stage in enumerate(self.stages)}
+        results = []
+        tasks = [self.feed(items, queues[0])]
+        for i, stage in enumerate(self.stages):
+            queue_out = queues[i + 1] if i + 1 < len(self.stages) else None
+            tasks.append(self.run_stage(stage, queues[i], queue_out, results))
+        await asyncio.gather(*tasks)
+        return results
+
+    def run(self, items):
+        #Returns the outputs of the last stage (in the order they were finished)
+        start = time.perf_counter()
+        results = asyncio.run(self.run_async(items))
+        self.wall = time.perf_counter() - start
+        return results
 
-            # Write WER - RESULTS
-            write_to_csv(f, wer_fields, wer_data)
+    def get_metrics(self):
+        return [stage.get_metrics(self.wall) for stage in self.stages]
+
+    def print_metrics(self):
+        print("[INFO]Pipeline finished in {:.1f}s.".format(self.wall))
+        print("{:<12}{:>8}{:>7}{:>8}{:>10}{:>11}{:>11}{:>11}{:>10}{:>7}".format(
+            'stage', 'workers', 'items', 'failed', 'busy_s', 'starved_s', 'blocked_s', 'items/min', 'util', 'queue'))
+        for m in self.get_metrics():
+            print("{:<12}{:>8}{:>7}{:>8}{:>10.1f}{:>11.1f}{:>11.1f}{:>11.2f}{:>10.2f}{:>7}".format(
+                m['stage'], m['workers'], m['items'], m['failed'], m['busy_s'], m['starved_s'], m['blocked_s'],
+                m['items_per_min'], m['utilization'], m['max_queue']))
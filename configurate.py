@@ -11,6 +11,140 @@ orig_transcripts = 'data/deutsche-welle/Transkripte'
 
 model_path = '../vosk_models/vosk-model-de-tuda-0.6-900k'
 
+# Number of parallel transcription processes (1 = one file after another).
+# NOTE every worker loads its own copy of the model into RAM.
+num_workers = 1
+
+# 'wav'    = transcribe the converted files from preprocessing.py
+# 'stream' = skip preprocessing.py & decode the original audio through an ffmpeg pipe while transcribing
+input_mode = 'wav'
+
+# Seconds of audio between two flushes of a file's checkpoint (its finished utterances).
+# After a crash, recognize_audio.py skips finished files and resumes long files near the failure point.
+checkpoint_interval = 60
+
+# > 1: converted .wav files longer than 2 * segment_seconds are cut at quiet points into segments, which are
+# recognized in parallel by this many threads. The threads share ONE model, so long files finish faster
+# without extra RAM. Uses num_workers * segment_threads cores in total.
+segment_threads = 1
+segment_seconds = 300
+
+# Recognizer settings (use benchmark_recognizer.py to find the fastest ones for a model)
+# frames passed to the recognizer at once
+chunk_frames = 4000
+# word times & confidences (needed for the word timings)
+words = True
+# > 0: vosk returns this many alternatives; the best one is used
+max_alternatives = 0
+# True: parse vosk's json results after the whole file is recognized instead of after every utterance
+defer_json = False
+# True: pauses longer than min_silence seconds (quieter than silence_threshold_db dBFS) are shortened to
+# keep_silence seconds before recognition; word times still refer to the original audio
+skip_silence = False
+silence_threshold_db = -40
+min_silence = 1.0
+keep_silence = 0.3
+# Grammar-constrained recognition (for collections with a known, limited vocabulary):
+# grammar_mode: '' = full search space of the model, 'words' = only the words of grammar_source,
+# 'phrases' = only whole lines of grammar_source. Needs a model with a dynamic graph (most small models).
+# grammar_source: 'originals' = the original transcripts (orig_transcripts_path; the WER is then optimistic)
+# or the path of a vocabulary file (one word / phrase per line). Cached under csv_results/grammar_cache.
+# grammar_max_phrases: > 0 keeps only the most frequent words / phrases
+# grammar_compare.py compares speed & accuracy with & without the grammar.
+grammar_mode = ''
+grammar_source = 'originals'
+grammar_max_phrases = 0
+
+# Size limit of the conversion cache in '<input>/convert' in MB (0 = no limit).
+# Least recently used files are deleted first.
+max_cache_size_mb = 0
+# Streaming conversion: files are decoded, downmixed & written in blocks of conversion_block_seconds,
+# so memory doesn't grow with the length of a file. False: convert in memory with pydub.
+streaming_conversion = True
+conversion_block_seconds = 10
+# files preprocessing.py converts at the same time
+conversion_workers = 1
+
+# Where calculations.py stores the metrics (one row per file, all runs in one table):
+# 'csv', 'sqlite' or 'parquet' (needs pandas + pyarrow)
+results_backend = 'csv'
+
+# What happens when a transcript (text / word timings) exists already:
+# 'overwrite', 'skip' (keep it), 'version' (save the new one as <name>_v2, _v3, ...) or 'fail' (the file fails)
+overwrite_policy = 'overwrite'
+
+# True: calculations.py & pipeline.py cache normalized transcripts under csv_results/normalization_cache,
+# so the same original transcript is normalized only once for all evaluated models
+normalization_cache = True
+# True: calculations.py caches the metrics of every pair under csv_results/metrics_cache.json (keyed by the
+# content of both transcripts), so a rerun only evaluates new & changed pairs
+metrics_cache = True
+
+# model_sweep.py: transcribe & evaluate the same audio with several models (accuracy vs. speed)
+sweep_model_paths = [
+    # '../vosk_models/vosk-model-small-de-0.15',
+    # '../vosk_models/vosk-model-de-tuda-0.6-900k',
+]
+# RAM in MB for all models running at once (0 = 80% of the available RAM); a model needs about
+# model_ram_factor * the size of its dir
+sweep_ram_limit_mb = 0
+model_ram_factor = 1.2
+max_parallel_models = 2
+
+# Transcription service (transcription_service.py keeps the model loaded between runs).
+# service_url: '' = recognize_audio.py loads the model itself; e.g. 'http://127.0.0.1:8765' = send the files to the service
+service_url = ''
+service_host = '127.0.0.1'
+service_port = 8765
+# shared secret of the service & its clients (sent with every request); the service doesn't start without one
+service_token = ''
+# checkpoints of the files the service transcribes ('' = no checkpoints)
+service_checkpoint_dir = './service_checkpoints'
+# files the service transcribes at the same time (threads sharing one model)
+service_threads = 2
+
+# live_transcribe.py (live captioning: partial & final results as the audio comes in, latency per utterance)
+# live_source: 'file' = replay the mono 16-bit .wav live_input in real time, 'stdin' = raw 16-bit mono PCM on stdin
+# (e.g. ffmpeg -re -i talk.mp3 -ar 16000 -ac 1 -f s16le - | python live_transcribe.py), 'socket' = raw PCM from
+# ONE client connecting to live_host:live_port
+live_source = 'file'
+live_input = ''
+# sample rate of the raw PCM of stdin & socket; 0 = the rate of the model
+live_sample_rate = 0
+live_host = '127.0.0.1'
+live_port = 8766
+# ms of audio per chunk; replay speed of 'file' (1.0 = real time, 0 = as fast as possible)
+live_chunk_ms = 100
+live_speed = 1.0
+# show partial results of the running utterance
+live_partials = True
+
+# shard_worker.py (many independent workers on one or several hosts, coordinated through a shared dir)
+# shard_work_dir: shared by all workers (same path on every host); delete it to start a new batch
+shard_work_dir = os.path.join(input_dir, 'shards')
+# total number of workers & the index of this one (usually given as arguments: shard_worker.py <index> <count>)
+shard_num_workers = 1
+shard_worker_index = 0
+# a worker that didn't renew its lease for this long is taken as dead & its task is taken over
+shard_lease_seconds = 120
+shard_poll_seconds = 5
+# stages the workers of this config take part in (e.g. 'convert' on a file server, 'transcribe,evaluate' elsewhere)
+shard_stages = 'convert,transcribe,evaluate'
+
+# pipeline.py (conversion, recognition & evaluation as concurrent stages)
+# files waiting between two stages; a full queue makes the stage before it wait
+pipeline_queue_size = 2
+# threads converting files; threads recognizing files (sharing one model); processes evaluating files
+convert_workers = 1
+recognize_workers = 1
+evaluate_workers = 1
+
+# Profiling: wall & CPU time, peak memory & bytes read/written per stage (decode, recognition, wer, ...) & file.
+# Saved as profile_<run>.json/.csv under csv_results
+profile = False
+# name of ONE stage that is also run under cProfile (e.g. 'recognition'); '' = none
+cprofile_stage = ''
+
 # ------- END --------
 
 # Create output_dir
@@ -49,6 +183,109 @@ config_object["MODELCONFIG"] = {
     "model_path": model_path,
 }
 
+# Specify processing
+config_object["PROCESSCONFIG"] = {
+    "num_workers": num_workers,
+    "input_mode": input_mode,
+    "checkpoint_interval": checkpoint_interval,
+    "segment_threads": segment_threads,
+    "segment_seconds": segment_seconds,
+}
+
+# Specify recognizer
+config_object["RECOGNIZERCONFIG"] = {
+    "chunk_frames": chunk_frames,
+    "words": words,
+    "max_alternatives": max_alternatives,
+    "defer_json": defer_json,
+    "skip_silence": skip_silence,
+    "silence_threshold_db": silence_threshold_db,
+    "min_silence": min_silence,
+    "keep_silence": keep_silence,
+    "grammar_mode": grammar_mode,
+    "grammar_source": grammar_source,
+    "grammar_max_phrases": grammar_max_phrases,
+}
+
+# Specify conversion
+config_object["CONVERTCONFIG"] = {
+    "max_cache_size_mb": max_cache_size_mb,
+    "streaming": streaming_conversion,
+    "block_seconds": conversion_block_seconds,
+    "num_workers": conversion_workers,
+}
+
+# Specify results
+config_object["RESULTSCONFIG"] = {
+    "results_backend": results_backend,
+}
+
+# Specify output handling
+config_object["OUTPUTCONFIG"] = {
+    "overwrite_policy": overwrite_policy,
+}
+
+# Specify evaluation
+config_object["EVALUATIONCONFIG"] = {
+    "normalization_cache": normalization_cache,
+    "metrics_cache": metrics_cache,
+}
+
+# Specify model sweep
+config_object["SWEEPCONFIG"] = {
+    "model_paths": ','.join(sweep_model_paths),
+    "sweep_dir": os.path.join(input_dir, 'model_sweep'),
+    "ram_limit_mb": sweep_ram_limit_mb,
+    "model_ram_factor": model_ram_factor,
+    "max_parallel_models": max_parallel_models,
+}
+
+# Specify transcription service
+config_object["SERVICECONFIG"] = {
+    "service_url": service_url,
+    "service_host": service_host,
+    "service_port": service_port,
+    "service_token": service_token,
+    "service_checkpoint_dir": service_checkpoint_dir,
+    "service_threads": service_threads,
+}
+
+# Specify live transcription
+config_object["LIVECONFIG"] = {
+    "source": live_source,
+    "input": live_input,
+    "sample_rate": live_sample_rate,
+    "host": live_host,
+    "port": live_port,
+    "chunk_ms": live_chunk_ms,
+    "speed": live_speed,
+    "partials": live_partials,
+}
+
+# Specify sharded workers
+config_object["SHARDCONFIG"] = {
+    "work_dir": shard_work_dir,
+    "num_workers": shard_num_workers,
+    "worker_index": shard_worker_index,
+    "lease_seconds": shard_lease_seconds,
+    "poll_seconds": shard_poll_seconds,
+    "stages": shard_stages,
+}
+
+# Specify pipeline
+config_object["PIPELINECONFIG"] = {
+    "queue_size": pipeline_queue_size,
+    "convert_workers": convert_workers,
+    "recognize_workers": recognize_workers,
+    "evaluate_workers": evaluate_workers,
+}
+
+# Specify profiling
+config_object["PROFILECONFIG"] = {
+    "profile": profile,
+    "cprofile_stage": cprofile_stage,
+}
+
 #Write the above sections to config.ini file
 with open('config.ini', 'w') as conf:
     config_object.write(conf)
\ No newline at end of file
@@ -0,0 +1,52 @@
+import os
+import json
+import configparser
+
+# class imports
+from classes import WordTimingStore
+
+
+# Get relevant configs: word_dicts_path
+config = configparser.ConfigParser()
+config.read('config.ini')
+wd_path = config.get('DATACONFIG','word_dicts_path')
+
+# The whole corpus is saved as one memory-mappable store next to the word_dicts dir
+store_path = os.path.join(os.path.dirname(os.path.normpath(wd_path)), 'word_dicts_store')
+
+
+#*** ----- STEP1: Convert old JSON word dicts (recognize_audio.py used to write them) to .npz ----- ***#
+for file in sorted(os.listdir(wd_path)):
+    path = os.path.join(wd_path, file)
+    if os.path.isdir(path) or file.endswith('.npz'):
+        continue
+    try:
+        with open(path, 'r') as f:
+            word_dicts = json.load(f)
+    except Exception as err:
+        print(f"[WARNING]'{path}' is not a JSON word dict file. Skipped.\n", err)
+        continue
+
+    name = os.path.splitext(file)[0]
+    target = os.path.join(wd_path, name + '.npz')
+    if os.path.exists(target):
+        print(f"[INFO]'{target}' already exists. Skipped.")
+        continue
+    single = WordTimingStore(name)
+    single.add(name, word_dicts)
+    single.save(target)
+    print(f"[INFO]Converted '{path}' to '{target}'.")
+
+
+#*** ----- STEP2: Collect all files in ONE corpus store ----- ***#
+corpus = WordTimingStore("corpus")
+for file in sorted(os.listdir(wd_path)):
+    if not file.endswith('.npz'):
+        continue
+    single = WordTimingStore(file)
+    single.load(os.path.join(wd_path, file))
+    corpus.add_store(single)
+
+corpus.save(store_path)
+print(f"[INFO]Saved word timings of {len(corpus)} files ({len(corpus.vocab)} distinct words) under '{store_path}'.")
+print("[INFO]Load it with WordTimingStore.load() to get memory-mapped, zero-copy views per file.")
@@ -0,0 +1,183 @@
+import os
+import sys
+import configparser
+
+# class imports
+from classes import AudioHandler, VoskHandler, DataHandler, CompareHandler, BatchCompareHandler, ResultsStore
+from classes import NormalizationCache, profiler
+from classes import read_model_sample_rate, read_vosk_options, read_grammar, transcribe_to_files
+from classes import model_supports_grammar
+
+
+# Speed & accuracy of grammar-constrained recognition (RECOGNIZERCONFIG grammar_*) against the full search
+# space of the same model: every file is transcribed both ways (one after the other, with the one loaded model)
+# & both transcripts are evaluated against the original transcript.
+# Output: one row per variant & file ('grammar_comparison' table) + one row per variant ('grammar_comparison_summary').
+
+# Get relevant configs
+config = configparser.ConfigParser()
+config.read('config.ini')
+input_path = config.get('DATACONFIG','input_path')
+original_dir = config.get('DATACONFIG','orig_transcripts_path')
+results_dir = config.get('DATACONFIG','csv_results_path')
+model_path = config.get('MODELCONFIG','model_path')
+max_cache_size_mb = config.getint('CONVERTCONFIG', 'max_cache_size_mb', fallback=0)
+streaming_conversion = config.getboolean('CONVERTCONFIG', 'streaming', fallback=True)
+conversion_block_seconds = config.getfloat('CONVERTCONFIG', 'block_seconds', fallback=10.0)
+conversion_workers = config.getint('CONVERTCONFIG', 'num_workers', fallback=1)
+results_backend = config.get('RESULTSCONFIG', 'results_backend', fallback='csv')
+vosk_options = read_vosk_options(config)
+# the configured grammar; 'words' if grammar_mode is ''
+grammar_mode = config.get('RECOGNIZERCONFIG', 'grammar_mode', fallback='') or 'words'
+grammar_source = config.get('RECOGNIZERCONFIG', 'grammar_source', fallback='originals')
+# transcripts of both variants go to <compare_dir>/<variant>/
+compare_dir = os.path.join(input_path, 'grammar_compare')
+
+# stage timings & resources of this run (see StageProfiler); saved under csv_results_path
+if config.getboolean('PROFILECONFIG', 'profile', fallback=False):
+    profiler.enable(config.get('PROFILECONFIG', 'cprofile_stage', fallback=''))
+
+
+def summarize(variant, rows, baseline=None):
+    # corpus level numbers of one variant: WER over all words (not the mean of the files)
+    m = sum(row['m'] for row in rows)
+    ld = sum(row['ld'] for row in rows)
+    audio = sum(row['audio_duration'] for row in rows)
+    elapsed = sum(row['transcription_time'] for row in rows)
+    summary = {
+        'variant': variant,
+        'files': len(rows),
+        'wer': ld / m if m > 0 else float('nan'),
+        'audio_duration': audio,
+        'transcription_time': elapsed,
+        'rtf': elapsed / audio if audio > 0 else None,
+        'oov_rate': sum(row['oov_words'] for row in rows) / m if m > 0 else None,
+    }
+    # against the unconstrained run: > 1 = faster; < 0 = fewer errors
+    if baseline is not None:
+        summary['speedup'] = baseline['transcription_time'] / elapsed if elapsed > 0 else None
+        summary['wer_change'] = summary['wer'] - baseline['wer']
+    return summary
+
+
+if __name__ == '__main__':
+    #*** ----- STEP1: convert & build (or load) the grammar ----- ***#
+    if not model_supports_grammar(model_path):
+        print(f"[FATAL]The model '{model_path}' has no dynamic graph (graph/HCLr.fst & graph/Gr.fst), so it can't use a grammar.")
+        sys.exit()
+    AudioHandle = AudioHandler('data1', input_path,
+                               target_frame_rate=read_model_sample_rate(model_path),
+                               max_cache_size_mb=max_cache_size_mb,
+                               streaming=streaming_conversion,
+                               block_seconds=conversion_block_seconds)
+    AudioHandle.setup()
+    AudioHandle.convert_audio(conversion_workers)
+    converted_audios = AudioHandle.check_convert_dir()
+    if converted_audios is None:
+        print("[FATAL] There are no converted audios to transcribe.")
+        sys.exit()
+
+    grammar = read_grammar(config, grammar_mode)
+    print(f"[INFO]Grammar: {len(grammar) - 1} {grammar_mode} from '{grammar_source}'.")
+    if grammar_source == 'originals':
+        print("[WARNING]The grammar is derived from the original transcripts, so its WER is an optimistic bound.")
+    grammar_words = set(word for phrase in grammar for word in phrase.split())
+
+    #*** ----- STEP2: transcribe every file with & without the grammar (one model) ----- ***#
+    variant_name = 'grammar_' + grammar_mode
+    variants = {'unconstrained': None, variant_name: grammar}
+    handlers = {}
+    model = None
+    for variant, phrases in variants.items():
+        options = dict(vosk_options, grammar=phrases)
+        vosky = VoskHandler(variant, model_path, **options)
+        if model is None:
+            vosky.initialize_model()
+            model = vosky.model
+        vosky.model = model
+        # timings have to be fresh, so earlier transcripts are always overwritten
+        handlers[variant] = (vosky, DataHandler(variant, os.path.join(compare_dir, variant, 'ai'), 'overwrite'))
+
+    timings = {variant: {} for variant in variants}
+    for file in sorted(converted_audios):
+        for variant, (vosky, DataHandle) in handlers.items():
+            job = {
+                'file': file,
+                'audio_path': converted_audios[file],
+                'text_path': os.path.join(compare_dir, variant, 'ai', file + '.txt'),
+                'word_timings_path': os.path.join(compare_dir, variant, 'word_dicts', file + '.npz'),
+                'checkpoint_path': None,
+            }
+            os.makedirs(os.path.dirname(job['word_timings_path']), exist_ok=True)
+            _, ok, elapsed, audio_duration = transcribe_to_files(vosky, DataHandle, job)
+            if not ok:
+                print(f"[ERROR]Failure during recognizing audio with name {file} ({variant}).")
+                continue
+            timings[variant][file] = (elapsed, audio_duration)
+            print("[INFO]'{}' ({}): {:.1f}s for {:.1f}s of audio.".format(file, variant, elapsed, audio_duration))
+
+    #*** ----- STEP3: evaluate both variants ----- ***#
+    originals = set(os.listdir(original_dir))
+    normalization_cache = NormalizationCache("normalization", os.path.join(results_dir, 'normalization_cache'))
+    store = ResultsStore("grammar_comparison", results_dir, results_backend, table='grammar_comparison',
+                         run_metadata={'model_path': model_path, 'grammar_source': grammar_source})
+    summary_store = ResultsStore("grammar_comparison_summary", results_dir, results_backend,
+                                 table='grammar_comparison_summary',
+                                 run_metadata={'model_path': model_path, 'grammar_source': grammar_source})
+    rows_by_variant = {}
+    for variant in variants:
+        comparisons = []
+        for file in sorted(timings[variant]):
+            name = file + '.txt'
+            if name not in originals:
+                continue
+            with open(os.path.join(original_dir, name), 'r', encoding= 'unicode_escape') as f: original_f = f.read()
+            with open(os.path.join(compare_dir, variant, 'ai', name), 'r', encoding= 'unicode_escape') as f: ai_f = f.read()
+            comparisons.append(CompareHandler(file, original_f, ai_f, normalization_cache))
+        if len(comparisons) == 0:
+            continue
+        distances = BatchCompareHandler(variant, comparisons).calculate_distances()
+        rows = []
+        for Comparison in comparisons:
+            elapsed, audio_duration = timings[variant][Comparison.name]
+            row = {'variant': variant}
+            row.update(Comparison.get_results(distances=distances[Comparison.name]))
+            row['audio_duration'] = audio_duration
+            row['transcription_time'] = elapsed
+            row['rtf'] = elapsed / audio_duration if audio_duration > 0 else None
+            # words of the original the grammar can't produce
+            row['oov_words'] = sum(1 for token in Comparison.original_tokens if token not in grammar_words)
+            store.add_row(row)
+            rows.append(row)
+        rows_by_variant[variant] = rows
+    store.write()
+
+    if 'unconstrained' not in rows_by_variant or variant_name not in rows_by_variant:
+        print("[FATAL]Nothing to compare: there are no evaluated transcripts of both variants.")
+        sys.exit()
+
+    #*** ----- STEP4: speed & accuracy trade-off ----- ***#
+    baseline = summarize('unconstrained', rows_by_variant['unconstrained'])
+    summaries = [baseline, summarize(variant_name, rows_by_variant[variant_name], baseline)]
+    for summary in summaries:
+        summary_store.add_row(summary)
+    summary_store.write()
+
+    wers = {variant: {row['file']: row['wer'] for row in rows} for variant, rows in rows_by_variant.items()}
+    print("\n{:<30}{:>16}{:>16}".format('WER', 'unconstrained', variant_name[:14]))
+    for file in sorted(wers['unconstrained']):
+        print("{:<30}{:>16.3f}{:>16}".format(file[:28], wers['unconstrained'][file],
+              '{:.3f}'.format(wers[variant_name][file]) if file in wers[variant_name] else '-'))
+
+    print("\n{:<20}{:>8}{:>8}{:>8}{:>10}{:>12}{:>10}".format('variant', 'files', 'WER', 'RTF', 'speedup', 'WER change', 'OOV'))
+    for summary in summaries:
+        print("{:<20}{:>8}{:>8.3f}{:>8}{:>10}{:>12}{:>10}".format(
+            summary['variant'][:18], summary['files'], summary['wer'],
+            '{:.2f}'.format(summary['rtf']) if summary['rtf'] is not None else '-',
+            '{:.2f}x'.format(summary['speedup']) if summary.get('speedup') else '-',
+            '{:+.3f}'.format(summary['wer_change']) if 'wer_change' in summary else '-',
+            '{:.1%}'.format(summary['oov_rate']) if summary['oov_rate'] is not None else '-'))
+
+    profiler.print_summary()
+    profiler.save(results_dir)
+    print("[INFO] All done.")
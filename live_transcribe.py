@@ -0,0 +1,98 @@
+import sys
+import socket
+import configparser
+
+# class imports
+from classes import VoskHandler, ResultsStore, profiler
+from classes import read_model_sample_rate, read_vosk_options, iter_pcm_stream, iter_wav_realtime, get_latency_summary
+
+
+# Live captioning: audio comes in chunk by chunk (a file replayed in real time, stdin or a socket),
+# partial results are shown while someone speaks & every finished utterance is printed with its latency.
+# The latencies are saved in the 'live_latency' table under csv_results_path.
+
+# Get relevant configs
+config = configparser.ConfigParser()
+config.read('config.ini')
+model_path = config.get('MODELCONFIG','model_path')
+results_dir = config.get('DATACONFIG','csv_results_path')
+results_backend = config.get('RESULTSCONFIG', 'results_backend', fallback='csv')
+# Recognizer options (see VoskHandler); the same as for recognize_audio.py
+vosk_options = read_vosk_options(config)
+# 'file', 'stdin' or 'socket'
+source = config.get('LIVECONFIG', 'source', fallback='file')
+live_input = config.get('LIVECONFIG', 'input', fallback='')
+# raw PCM of stdin & socket; 0 = the rate of the model
+sample_rate = config.getint('LIVECONFIG', 'sample_rate', fallback=0) or read_model_sample_rate(model_path)
+host = config.get('LIVECONFIG', 'host', fallback='127.0.0.1')
+port = config.getint('LIVECONFIG', 'port', fallback=8766)
+chunk_ms = config.getint('LIVECONFIG', 'chunk_ms', fallback=100)
+speed = config.getfloat('LIVECONFIG', 'speed', fallback=1.0)
+partials = config.getboolean('LIVECONFIG', 'partials', fallback=True)
+
+# stage timings & resources of this run (see StageProfiler); saved under csv_results_path
+if config.getboolean('PROFILECONFIG', 'profile', fallback=False):
+    profiler.enable(config.get('PROFILECONFIG', 'cprofile_stage', fallback=''))
+
+
+if __name__ == '__main__':
+    vosky = VoskHandler("live", model_path, **vosk_options)
+    vosky.initialize_model()
+
+    #*** ----- Audio source ----- ***#
+    connection = None
+    server = None
+    if source == 'file':
+        wf = vosky.check_audio(live_input)
+        if wf is None:
+            print("[FATAL]'{}' has to be a mono 16-bit .wav (see preprocessing.py).".format(live_input))
+            sys.exit()
+        sample_rate = wf.getframerate()
+        chunks = iter_wav_realtime(wf, sample_rate * chunk_ms // 1000, speed)
+        print(f"[INFO]Replaying '{live_input}' at {speed}x real time.")
+    elif source == 'stdin':
+        chunks = iter_pcm_stream(sys.stdin.buffer, sample_rate * chunk_ms // 1000 * 2)
+        print(f"[INFO]Reading 16-bit mono PCM ({sample_rate} Hz) from stdin.")
+    elif source == 'socket':
+        server = socket.create_server((host, port))
+        print(f"[INFO]Waiting for 16-bit mono PCM ({sample_rate} Hz) on {host}:{port}...")
+        connection, address = server.accept()
+        print(f"[INFO]{address[0]}:{address[1]} connected.")
+        chunks = iter_pcm_stream(connection.makefile('rb'), sample_rate * chunk_ms // 1000 * 2)
+    else:
+        print(f"[FATAL]Unknown live source '{source}'. Use 'file', 'stdin' or 'socket'.")
+        sys.exit()
+
+    #*** ----- Recognition: partial & final results as they come in ----- ***#
+    store = ResultsStore("live", results_dir, results_backend, table='live_latency',
+                         run_metadata={'model_path': model_path, 'source': source})
+    latencies = []
+    try:
+        for event in vosky.iter_live_transcribe(chunks, sample_rate, partials):
+            if event['type'] == 'partial':
+                # overwritten by the next partial or the final result
+                print("\r... " + event['text'][-100:], end='', flush=True)
+                continue
+            latencies.append(event['latency'])
+            print("\r[{:.1f}s] {} ({:.0f} ms)".format(event['audio_time'], event['text'], event['latency'] * 1000), flush=True)
+            store.add_row({'utterance': len(latencies), 'start': event['start'], 'end': event['end'],
+                           'latency': event['latency'], 'text': event['text']})
+    except KeyboardInterrupt:
+        print("\n[INFO]Stopped.")
+    finally:
+        if connection is not None:
+            connection.close()
+        if server is not None:
+            server.close()
+
+    store.write()
+
+    #*** ----- Latency per utterance ----- ***#
+    summary = get_latency_summary(latencies)
+    print(f"\n[INFO]{vosky.last_audio_duration:.1f}s of audio, {summary['count']} utterances.")
+    if summary['count'] > 0:
+        print("[INFO]Latency: mean {:.0f} ms, median {:.0f} ms, p95 {:.0f} ms, max {:.0f} ms.".format(
+            summary['mean'] * 1000, summary['p50'] * 1000, summary['p95'] * 1000, summary['max'] * 1000))
+
+    profiler.print_summary()
+    profiler.save(results_dir)
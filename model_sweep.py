@@ -0,0 +1,313 @@
+import os
+import sys
+import time
+import json
+import configparser
+import concurrent.futures
+
+# class imports
+from classes import AudioHandler, VoskHandler, DataHandler, CompareHandler, BatchCompareHandler, ResultsStore
+from classes import JobManifest, NormalizationCache, profiler
+from classes import read_model_sample_rate, read_vosk_options, get_options_hash, hash_file, get_checkpoint_path
+from classes import transcribe_to_files, write_json_atomic
+
+
+# Sweep mode: converts the audio once, transcribes it with every model of SWEEPCONFIG.model_paths &
+# evaluates all transcripts against the original transcripts.
+# Every model runs in its own process; models run side by side as long as their estimated RAM fits
+# into the limit. Output: one row per model & file ('model_sweep' table) + one row per model ('model_sweep_summary').
+
+# Get relevant configs
+config = configparser.ConfigParser()
+config.read('config.ini')
+input_path = config.get('DATACONFIG','input_path')
+original_dir = config.get('DATACONFIG','orig_transcripts_path')
+results_dir = config.get('DATACONFIG','csv_results_path')
+max_cache_size_mb = config.getint('CONVERTCONFIG', 'max_cache_size_mb', fallback=0)
+streaming_conversion = config.getboolean('CONVERTCONFIG', 'streaming', fallback=True)
+conversion_block_seconds = config.getfloat('CONVERTCONFIG', 'block_seconds', fallback=10.0)
+conversion_workers = config.getint('CONVERTCONFIG', 'num_workers', fallback=1)
+results_backend = config.get('RESULTSCONFIG', 'results_backend', fallback='csv')
+overwrite_policy = config.get('OUTPUTCONFIG', 'overwrite_policy', fallback='overwrite')
+vosk_options = read_vosk_options(config)
+
+model_paths = [p.strip() for p in config.get('SWEEPCONFIG', 'model_paths', fallback='').split(',') if p.strip()]
+# transcripts of every model go to <sweep_dir>/<model name>/
+sweep_dir = config.get('SWEEPCONFIG', 'sweep_dir', fallback=os.path.join(input_path, 'model_sweep'))
+# RAM for all models running at once in MB; 0 = 80% of the available RAM
+ram_limit_mb = config.getint('SWEEPCONFIG', 'ram_limit_mb', fallback=0)
+# RAM of a model ~ size of the model dir * model_ram_factor
+model_ram_factor = config.getfloat('SWEEPCONFIG', 'model_ram_factor', fallback=1.2)
+# at most this many models at once (also with enough RAM)
+max_parallel_models = config.getint('SWEEPCONFIG', 'max_parallel_models', fallback=2)
+
+
+def get_model_name(model_path):
+    return os.path.basename(os.path.normpath(model_path))
+
+
+def get_model_dir(model_path):
+    return os.path.join(sweep_dir, get_model_name(model_path))
+
+
+def get_dir_size(path):
+    size = 0
+    for root, dirs, files in os.walk(path):
+        for f in files:
+            size += os.path.getsize(os.path.join(root, f))
+    return size
+
+
+def get_available_ram_mb():
+    # MemAvailable of linux; None if unknown
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    return None
+
+
+def estimate_model_ram_mb(model_path):
+    return get_dir_size(model_path) / 1024.0 / 1024.0 * model_ram_factor
+
+
+def get_job(model_path, file, abs_path):
+    model_dir = get_model_dir(model_path)
+    return {
+        'file': file,
+        'audio_path': abs_path,
+        'text_path': os.path.join(model_dir, 'ai', file + '.txt'),
+        'word_timings_path': os.path.join(model_dir, 'word_dicts', file + '.npz'),
+        'checkpoint_path': get_checkpoint_path(os.path.join(model_dir, 'checkpoints'), file),
+    }
+
+
+def transcribe_model(model_path, audios):
+    # runs in its own process (its memory is freed when the model is done)
+    # audios: key=filename (no ext); value=path of the converted file
+    # Files that are done with this model (job manifest of the model) are skipped.
+    model_dir = get_model_dir(model_path)
+    for d in ('ai', 'word_dicts', 'checkpoints'):
+        os.makedirs(os.path.join(model_dir, d), exist_ok=True)
+
+    manifest = JobManifest(get_model_name(model_path), os.path.join(model_dir, 'job_manifest.json'))
+    # a file done with other recognizer options (e.g. another grammar) is transcribed again; per model, because
+    # a model without a dynamic graph can't use the grammar
+    options_hash = get_options_hash(vosk_options, model_path)
+    info_path = os.path.join(model_dir, 'model_info.json')
+    todo = []
+    for file in audios:
+        job = get_job(model_path, file, audios[file])
+        job['input_hash'] = hash_file(job['audio_path'])
+        if manifest.is_done(file, job['input_hash'], model_path, options_hash) and os.path.exists(job['text_path']) \
+                and os.path.exists(job['word_timings_path']):
+            continue
+        todo.append(job)
+    if len(todo) == 0 and os.path.exists(info_path):
+        # nothing to do: the numbers of the run that transcribed the files are kept
+        print(f"[INFO]All files are done with '{get_model_name(model_path)}'.")
+        with open(info_path) as f:
+            info = json.load(f)
+        info['transcribe_wall'] = 0.0
+        return info
+
+    start = time.perf_counter()
+    vosky = VoskHandler(get_model_name(model_path), model_path, **vosk_options)
+    vosky.initialize_model()
+    load_time = time.perf_counter() - start
+
+    DataHandle = DataHandler(get_model_name(model_path), os.path.join(model_dir, 'ai'), overwrite_policy)
+    for job in todo:
+        manifest.add(job['file'], job['audio_path'], job['input_hash'])
+        manifest.set_state(job['file'], 'running')
+        file, ok, elapsed, audio_duration = transcribe_to_files(vosky, DataHandle, job)
+        if ok:
+            # paths the outputs were saved under (see transcribe_to_files)
+            manifest.set_state(file, 'done', elapsed=elapsed, audio_duration=audio_duration, model_path=model_path,
+                               options_hash=options_hash, text_path=job['text_path'],
+                               word_timings_path=job['word_timings_path'])
+        else:
+            print(f"[ERROR]Failure during recognizing audio with name {file} ({get_model_name(model_path)}).")
+            manifest.set_state(file, 'failed', error='recognition failed')
+
+    info = {'model_path': model_path, 'load_time': load_time, 'peak_rss_mb': profiler.read_peak_rss(),
+            'transcribe_wall': time.perf_counter() - start}
+    write_json_atomic(info_path, info)
+    return info
+
+
+def run_models(audios_by_rate):
+    # Starts the biggest models first & as many at once as fit into the RAM limit.
+    # A model that is bigger than the limit runs alone.
+    available = get_available_ram_mb()
+    limit = ram_limit_mb if ram_limit_mb > 0 else (0.8 * available if available is not None else float('inf'))
+    estimates = {model_path: estimate_model_ram_mb(model_path) for model_path in model_paths}
+    print("[INFO]RAM limit for the models: {:.0f} MB.".format(limit))
+    for model_path in model_paths:
+        print("[INFO]Estimated RAM of '{}': {:.0f} MB.".format(get_model_name(model_path), estimates[model_path]))
+
+    pending = sorted(model_paths, key=lambda m: -estimates[m])
+    running = {}
+    infos = {}
+    while len(pending) > 0 or len(running) > 0:
+        used = sum(estimates[model_path] for model_path, executor in running.values())
+        for model_path in list(pending):
+            if len(running) >= max_parallel_models:
+                break
+            if used + estimates[model_path] > limit and len(running) > 0:
+                continue
+            if estimates[model_path] > limit:
+                print(f"[WARNING]'{get_model_name(model_path)}' probably needs more RAM than the limit. It runs alone.")
+            print(f"[INFO]Starting model '{get_model_name(model_path)}'.")
+            executor = concurrent.futures.ProcessPoolExecutor(max_workers=1)
+            audios = audios_by_rate[read_model_sample_rate(model_path)]
+            running[executor.submit(transcribe_model, model_path, audios)] = (model_path, executor)
+            used += estimates[model_path]
+            pending.remove(model_path)
+
+        done, not_done = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+        for future in done:
+            model_path, executor = running.pop(future)
+            executor.shutdown()
+            try:
+                info = future.result()
+            except Exception as err:
+                print(f"[ERROR]Model '{get_model_name(model_path)}' failed.\n", err)
+                continue
+            infos[model_path] = info
+            print("[INFO]Model '{}' is done in {:.1f}s (peak RSS {:.0f} MB, estimated {:.0f} MB).".format(
+                get_model_name(model_path), info['transcribe_wall'], info['peak_rss_mb'], estimates[model_path]))
+    return infos
+
+
+def evaluate_model(model_path, originals, normalization_cache, store):
+    # one row per file of the model; returns the rows
+    model_dir = get_model_dir(model_path)
+    with open(os.path.join(model_dir, 'model_info.json')) as f:
+        info = json.load(f)
+    with open(os.path.join(model_dir, 'job_manifest.json')) as f:
+        jobs = json.load(f)
+
+    comparisons = []
+    for file in sorted(jobs):
+        name = file + '.txt'
+        ai_file = jobs[file].get('text_path', os.path.join(model_dir, 'ai', name))
+        if jobs[file]['state'] != 'done' or name not in originals or not os.path.exists(ai_file):
+            continue
+        with open(os.path.join(original_dir, name), 'r', encoding= 'unicode_escape') as f: original_f = f.read()
+        with open(ai_file, 'r', encoding= 'unicode_escape') as f: ai_f = f.read()
+        comparisons.append(CompareHandler(file, original_f, ai_f, normalization_cache))
+    if len(comparisons) == 0:
+        return []
+
+    distances = BatchCompareHandler(get_model_name(model_path), comparisons).calculate_distances()
+    rows = []
+    for Comparison in comparisons:
+        job = jobs[Comparison.name]
+        row = {'model': get_model_name(model_path), 'model_path': model_path}
+        row.update(Comparison.get_results(distances=distances[Comparison.name]))
+        row['audio_duration'] = job.get('audio_duration')
+        row['transcription_time'] = job.get('elapsed')
+        row['rtf'] = job['elapsed'] / job['audio_duration'] if job.get('audio_duration') else None
+        row['model_load_time'] = info['load_time']
+        row['peak_rss_mb'] = info['peak_rss_mb']
+        store.add_row(row)
+        rows.append(row)
+    return rows
+
+
+def summarize(model_path, rows):
+    # corpus level numbers of one model: WER over all words (not the mean of the files)
+    m = sum(row['m'] for row in rows)
+    ld = sum(row['ld'] for row in rows)
+    audio = sum(row['audio_duration'] or 0.0 for row in rows)
+    elapsed = sum(row['transcription_time'] or 0.0 for row in rows)
+    return {
+        'model': get_model_name(model_path),
+        'model_path': model_path,
+        'files': len(rows),
+        'wer': ld / m if m > 0 else float('nan'),
+        'cosine': sum(row['cosine'] for row in rows) / len(rows),
+        'audio_duration': audio,
+        'transcription_time': elapsed,
+        'rtf': elapsed / audio if audio > 0 else None,
+        'model_load_time': rows[0]['model_load_time'],
+        'peak_rss_mb': rows[0]['peak_rss_mb'],
+    }
+
+
+if __name__ == '__main__':
+    if len(model_paths) == 0:
+        print("[FATAL]No models to compare. Set sweep_model_paths in configurate.py.")
+        sys.exit()
+    for model_path in model_paths:
+        if not os.path.isdir(model_path):
+            print(f"[FATAL]Model '{model_path}' doesn't exist.")
+            sys.exit()
+
+    #*** ----- STEP1: convert once per sample rate the models need ----- ***#
+    audios_by_rate = {}
+    # the handlers of all rates share <input_path>/convert: the cache is evicted once all of them are done,
+    # so no rate evicts the files another one converted for this run
+    run_keys = set()
+    for rate in sorted(set(read_model_sample_rate(model_path) for model_path in model_paths)):
+        AudioHandle = AudioHandler('data_{}'.format(rate), input_path, target_frame_rate=rate,
+                                   max_cache_size_mb=max_cache_size_mb,
+                                   streaming=streaming_conversion,
+                                   block_seconds=conversion_block_seconds)
+        AudioHandle.setup()
+        AudioHandle.convert_audio(conversion_workers, evict=False)
+        run_keys.update(AudioHandle.run_keys.values())
+        audios_by_rate[rate] = AudioHandle.check_convert_dir()
+        if audios_by_rate[rate] is None:
+            print("[FATAL] There are no converted audios to transcribe.")
+            sys.exit()
+    # the last handler read the cache manifest after all others saved theirs, so it knows every entry
+    AudioHandle.evict_cache(run_keys)
+
+    #*** ----- STEP2: transcribe with every model ----- ***#
+    run_start = time.perf_counter()
+    run_models(audios_by_rate)
+    print("[INFO]All models are done in {:.1f}s.".format(time.perf_counter() - run_start))
+
+    #*** ----- STEP3: evaluate (originals are normalized once for all models) ----- ***#
+    originals = set(os.listdir(original_dir))
+    normalization_cache = NormalizationCache("normalization", os.path.join(results_dir, 'normalization_cache'))
+    store = ResultsStore("model_sweep", results_dir, results_backend, table='model_sweep')
+    summary_store = ResultsStore("model_sweep_summary", results_dir, results_backend, table='model_sweep_summary')
+    summaries = []
+    matrix = {}
+    for model_path in model_paths:
+        if not os.path.exists(os.path.join(get_model_dir(model_path), 'model_info.json')):
+            continue
+        rows = evaluate_model(model_path, originals, normalization_cache, store)
+        if len(rows) == 0:
+            print(f"[WARNING]Model '{get_model_name(model_path)}' has no transcripts to evaluate.")
+            continue
+        summary = summarize(model_path, rows)
+        summaries.append(summary)
+        summary_store.add_row(summary)
+        matrix[summary['model']] = {row['file']: row['wer'] for row in rows}
+    store.write()
+    summary_store.write()
+
+    # WER matrix: one line per file, one column per model
+    models = list(matrix)
+    files = sorted(set(file for wers in matrix.values() for file in wers))
+    print("\n{:<30}".format('WER') + ''.join('{:>24}'.format(model[:22]) for model in models))
+    for file in files:
+        print("{:<30}".format(file[:28]) + ''.join(
+            '{:>24.3f}'.format(matrix[model][file]) if file in matrix[model] else '{:>24}'.format('-') for model in models))
+
+    # ranking: accuracy vs speed
+    print("\n{:<30}{:>8}{:>8}{:>8}{:>10}{:>10}".format('model', 'files', 'WER', 'RTF', 'load_s', 'peak_MB'))
+    for summary in sorted(summaries, key=lambda s: s['wer']):
+        print("{:<30}{:>8}{:>8.3f}{:>8}{:>10.1f}{:>10.0f}".format(
+            summary['model'][:28], summary['files'], summary['wer'],
+            '{:.2f}'.format(summary['rtf']) if summary['rtf'] is not None else '-',
+            summary['model_load_time'], summary['peak_rss_mb']))
+
+    print("[INFO] All done.")
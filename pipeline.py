@@ -0,0 +1,223 @@
+import os
+import json
+import configparser
+import concurrent.futures
+import multiprocessing
+
+# class imports
+from classes import AudioHandler, VoskHandler, DataHandler, CompareHandler, ResultsStore, JobManifest
+from classes import AsyncPipeline, PipelineStage, NormalizationCache, profiler
+from classes import read_model_sample_rate, read_vosk_options, get_options_hash, hash_file, get_checkpoint_path
+from classes import transcribe_to_files
+
+
+# One entry point for preprocessing.py -> recognize_audio.py -> calculations.py.
+# The three steps run as concurrent stages: while file N is recognized, file N+1 is converted
+# and file N-1 is evaluated. Outputs are the same as those of the three scripts.
+
+# Get relevant configs
+config = configparser.ConfigParser()
+config.read('config.ini')
+input_path = config.get('DATACONFIG','input_path')
+output_dir = config.get('DATACONFIG','output_dir')
+ai_transcripts_path = config.get('DATACONFIG','output_dir')
+wd_path = config.get('DATACONFIG','word_dicts_path')
+original_dir = config.get('DATACONFIG','orig_transcripts_path')
+results_dir = config.get('DATACONFIG','csv_results_path')
+model_path = config.get('MODELCONFIG','model_path')
+max_cache_size_mb = config.getint('CONVERTCONFIG', 'max_cache_size_mb', fallback=0)
+streaming_conversion = config.getboolean('CONVERTCONFIG', 'streaming', fallback=True)
+conversion_block_seconds = config.getfloat('CONVERTCONFIG', 'block_seconds', fallback=10.0)
+results_backend = config.get('RESULTSCONFIG', 'results_backend', fallback='csv')
+vosk_options = read_vosk_options(config)
+# a file done with other recognizer options (e.g. another grammar) is transcribed again
+options_hash = get_options_hash(vosk_options, model_path)
+# existing transcripts: 'skip', 'overwrite', 'version' (save as <name>_v2) or 'fail'
+overwrite_policy = config.get('OUTPUTCONFIG', 'overwrite_policy', fallback='overwrite')
+
+# files waiting between two stages; a full queue makes the stage before it wait
+queue_size = config.getint('PIPELINECONFIG', 'queue_size', fallback=2)
+# conversion & recognition run in threads (recognition threads share ONE model),
+# evaluation is pure python & runs in processes
+convert_workers = config.getint('PIPELINECONFIG', 'convert_workers', fallback=1)
+recognize_workers = config.getint('PIPELINECONFIG', 'recognize_workers', fallback=1)
+evaluate_workers = config.getint('PIPELINECONFIG', 'evaluate_workers', fallback=1)
+
+# stage timings & resources of this run (see StageProfiler); saved under csv_results_path
+if config.getboolean('PROFILECONFIG', 'profile', fallback=False):
+    profiler.enable(config.get('PROFILECONFIG', 'cprofile_stage', fallback=''))
+
+# normalized & tokenized transcripts are cached (by content), so an original is normalized only once
+# for all the models & settings evaluated against it
+normalization_cache = None
+if config.getboolean('EVALUATIONCONFIG', 'normalization_cache', fallback=True):
+    normalization_cache = NormalizationCache("normalization", os.path.join(results_dir, 'normalization_cache'))
+
+manifest_path = os.path.join(input_path, 'job_manifest.json')
+checkpoint_dir = os.path.join(input_path, 'checkpoints')
+
+
+def get_job(file, abs_path):
+    # same paths as recognize_audio.py
+    return {
+        'file': file,
+        'audio_path': abs_path,
+        'text_path': "{}/{}.txt".format(ai_transcripts_path, file),
+        'word_timings_path': "{}/{}.npz".format(wd_path, file),
+        'checkpoint_path': get_checkpoint_path(checkpoint_dir, file),
+    }
+
+
+def init_evaluate_worker():
+    # the records sent back by evaluate_job are only those of the worker
+    profiler.reset_records()
+
+
+def evaluate_job(job):
+    # runs in a worker process: compares the transcript with the original transcript of the file
+    # returns the row & the profiler records of the worker
+    with open(job['original_path'], 'r', encoding= 'unicode_escape') as f: original_f = f.read()
+    with open(job['text_path'], 'r', encoding= 'unicode_escape') as f: ai_f = f.read()
+    row = CompareHandler(job['file'], original_f, ai_f, normalization_cache).get_results()
+
+    audio_duration = job.get('audio_duration')
+    transcription_time = job.get('elapsed')
+    row['audio_duration'] = audio_duration
+    row['transcription_time'] = transcription_time
+    row['rtf'] = transcription_time / audio_duration if audio_duration and transcription_time is not None else None
+    return row, profiler.pop_records()
+
+
+if __name__ == '__main__':
+    #*** ----- Setup: audio files, model, manifest & results ----- ***#
+    AudioHandle = AudioHandler('data1', input_path,
+                               target_frame_rate=read_model_sample_rate(model_path),
+                               max_cache_size_mb=max_cache_size_mb,
+                               streaming=streaming_conversion,
+                               block_seconds=conversion_block_seconds)
+    AudioHandle.setup()
+
+    vosky = VoskHandler("vosky", model_path, **vosk_options)
+    vosky.initialize_model()
+
+    DataHandle = DataHandler("data", output_dir, overwrite_policy)
+
+    manifest = JobManifest("jobs", manifest_path)
+    if not os.path.isdir(checkpoint_dir):
+        os.mkdir(checkpoint_dir)
+
+    # original transcripts are listed once
+    originals = set(os.listdir(original_dir))
+
+    store = ResultsStore("results", results_dir, results_backend, run_metadata={'model_path': model_path})
+
+    #*** ----- Stages ----- ***#
+    def convert(audio):
+        aud, ext = audio
+        abs_path = AudioHandle.convert_file(aud, str(ext))
+        job = get_job(os.path.splitext(os.path.basename(aud))[0], abs_path)
+        job['input_hash'] = hash_file(abs_path)
+        return job
+
+    def register(job):
+        # event loop: skip the recognition of files that are done & unchanged
+        if job is None:
+            return
+        file = job['file']
+        # the outputs of a done file may have been saved under other names (overwrite policy 'version')
+        done = manifest.is_done(file, job['input_hash'], model_path, options_hash)
+        if done:
+            job['text_path'] = manifest.jobs[file].get('text_path', job['text_path'])
+            job['word_timings_path'] = manifest.jobs[file].get('word_timings_path', job['word_timings_path'])
+        if done and os.path.exists(job['text_path']) and os.path.exists(job['word_timings_path']):
+            job['skip'] = True
+            job['elapsed'] = manifest.jobs[file].get('elapsed')
+            job['audio_duration'] = manifest.jobs[file].get('audio_duration')
+            return
+        if not manifest.add(file, job['audio_path'], job['input_hash']):
+            # input changed: a checkpoint of an earlier run would belong to the old audio
+            if os.path.exists(job['checkpoint_path']):
+                os.remove(job['checkpoint_path'])
+        manifest.save()
+
+    def recognize(job):
+        if job.get('skip'):
+            print(f"[INFO]'{job['file']}' is already transcribed.")
+            return job
+        # a handler per file (it holds per file state), all with the one model
+        # (transcribe_to_files sets the paths of the job to those the outputs were saved under)
+        vosky_job = VoskHandler("vosky", model_path, **vosk_options)
+        vosky_job.model = vosky.model
+        file, ok, elapsed, audio_duration = transcribe_to_files(vosky_job, DataHandle, job)
+        job.update({'ok': ok, 'elapsed': elapsed, 'audio_duration': audio_duration})
+        return job
+
+    def finish_recognition(job):
+        # event loop: manifest update & dropping files without an original transcript
+        if job.get('skip'):
+            pass
+        elif not job['ok']:
+            print(f"[ERROR]Failure during recognizing audio with name {job['file']}.")
+            manifest.set_state(job['file'], 'failed', error='recognition failed')
+            job['evaluate'] = False
+            return
+        else:
+            manifest.set_state(job['file'], 'done', elapsed=job['elapsed'], audio_duration=job['audio_duration'],
+                               model_path=model_path, options_hash=options_hash, text_path=job['text_path'],
+                               word_timings_path=job['word_timings_path'])
+        name = job['file'] + '.txt'
+        if name not in originals:
+            print(f"[WARNING]There is no original transcript '{name}'. '{job['file']}' isn't evaluated.")
+            job['evaluate'] = False
+            return
+        job['original_path'] = os.path.join(original_dir, name)
+
+    def evaluate(job):
+        # runs in the event loop's thread pool only to hand the job to the process pool
+        if job.get('evaluate') is False:
+            return None
+        row, records = evaluate_process_pool.submit(evaluate_job, job).result()
+        profiler.merge(records)
+        return row
+
+    def add_result(row):
+        if row is not None:
+            print("Results for {}.".format(row['file']))
+            store.add_row(row)
+
+    convert_pool = concurrent.futures.ThreadPoolExecutor(max_workers=convert_workers)
+    recognize_pool = concurrent.futures.ThreadPoolExecutor(max_workers=recognize_workers)
+    evaluate_pool = concurrent.futures.ThreadPoolExecutor(max_workers=evaluate_workers)
+    # the evaluation processes start while the stage threads run: a forked child could inherit a lock
+    # some thread holds at that moment (model, queues, cache), so they come from a clean forkserver/spawn
+    start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+    evaluate_process_pool = concurrent.futures.ProcessPoolExecutor(max_workers=evaluate_workers,
+                                                                   mp_context=multiprocessing.get_context(start_method),
+                                                                   initializer=init_evaluate_worker)
+
+    pipeline = AsyncPipeline("pipeline", [
+        PipelineStage("convert", convert, convert_pool, convert_workers, callback=register),
+        PipelineStage("recognize", recognize, recognize_pool, recognize_workers, callback=finish_recognition),
+        PipelineStage("evaluate", evaluate, evaluate_pool, evaluate_workers, callback=add_result),
+    ], queue_size=queue_size)
+
+    try:
+        pipeline.run(AudioHandle.audios_to_convert)
+    finally:
+        for pool in (convert_pool, recognize_pool, evaluate_pool, evaluate_process_pool):
+            pool.shutdown(wait=True)
+        # last_used of cache hits + new conversions
+        AudioHandle.save_cache_manifest()
+        AudioHandle.evict_cache()
+
+    store.write()
+
+    #*** ----- Metrics per stage ----- ***#
+    pipeline.print_metrics()
+    profiler.print_summary()
+    profiler.save(results_dir)
+    with open(os.path.join(results_dir, 'pipeline_metrics.json'), 'w') as f:
+        json.dump({'run_id': store.run_metadata['run_id'], 'wall_s': pipeline.wall,
+                   'queue_size': queue_size, 'stages': pipeline.get_metrics()}, f, indent=2)
+
+    print("[INFO] All done.")
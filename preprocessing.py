@@ -4,24 +4,39 @@ import pickle
 import configparser
 
 # class imports
-from classes import AudioHandler
+from classes import AudioHandler, read_model_sample_rate, profiler
 
 
 # Get relevant configs: input_path
 config = configparser.ConfigParser()
 config.read('config.ini')
 input_path = config.get('DATACONFIG','input_path')
+model_path = config.get('MODELCONFIG','model_path')
+max_cache_size_mb = config.getint('CONVERTCONFIG', 'max_cache_size_mb', fallback=0)
+streaming_conversion = config.getboolean('CONVERTCONFIG', 'streaming', fallback=True)
+conversion_block_seconds = config.getfloat('CONVERTCONFIG', 'block_seconds', fallback=10.0)
+conversion_workers = config.getint('CONVERTCONFIG', 'num_workers', fallback=1)
+results_dir = config.get('DATACONFIG','csv_results_path')
+
+# stage timings & resources of this run (see StageProfiler); saved under csv_results_path
+if config.getboolean('PROFILECONFIG', 'profile', fallback=False):
+    profiler.enable(config.get('PROFILECONFIG', 'cprofile_stage', fallback=''))
 
 
 #*** ----- STEP1: AudioHandler --> READ & CONVERT AUDIO ----- ***#
 
     # CONFIGURATE AudioHandler
-AudioHandle = AudioHandler('data1', input_path)
+    # Resample straight to the rate the model was trained on (mostly 16kHz)
+AudioHandle = AudioHandler('data1', input_path,
+                           target_frame_rate=read_model_sample_rate(model_path),
+                           max_cache_size_mb=max_cache_size_mb,
+                           streaming=streaming_conversion,
+                           block_seconds=conversion_block_seconds)
 AudioHandle.setup()
 
-    # AudioConversion: target: .wav mono
-AudioHandle.convert_audio_to_wav()
-AudioHandle.convert_audio_to_mono()
+    # AudioConversion: target: .wav mono 16-bit, decoded & written only once (block by block)
+    # Files that are unchanged since the last run are taken from the conversion cache
+AudioHandle.convert_audio(conversion_workers)
 
     # Return Dictionary of converted files
     # key=filename (no ext); value=absolute_path
@@ -39,3 +54,6 @@ with open(os.path.join(input_path, 'coversion_dict.pkl'), 'wb') as f:
     pickle.dump(converted_audios, f)
 
 print('[INFO]Conversion is done.')
+
+profiler.print_summary()
+profiler.save(results_dir)
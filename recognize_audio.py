@@ -1,11 +1,14 @@
 import sys
 import os
-import json
+import time
 import pickle
 import configparser
+import concurrent.futures
 
 # class imports
-from classes import VoskHandler, DataHandler
+from classes import AudioHandler, VoskHandler, DataHandler, TranscriptionPool, JobManifest, TranscriptionClient
+from classes import read_model_sample_rate, read_vosk_options, get_options_hash, hash_file, get_checkpoint_path
+from classes import transcribe_to_files, transcribe_with_service, profiler
 
 
 # Get relevant configs: input_path
@@ -16,44 +19,175 @@ output_dir = config.get('DATACONFIG','output_dir') #MAYBE TAKE OUT EVERYWHERE; R
 ai_transcripts_path = config.get('DATACONFIG','output_dir')
 wd_path = config.get('DATACONFIG','word_dicts_path')
 model_path = config.get('MODELCONFIG','model_path')
+results_dir = config.get('DATACONFIG','csv_results_path')
+# 1 = transcribe one file after another in this process; >1 = parallel worker processes
+num_workers = config.getint('PROCESSCONFIG', 'num_workers', fallback=1)
+# 'wav' = converted files from preprocessing.py; 'stream' = decode the original audio through an ffmpeg pipe
+input_mode = config.get('PROCESSCONFIG', 'input_mode', fallback='wav')
 
+# Recognizer options (see VoskHandler); the same for the serial mode, every pool worker & the service
+vosk_options = read_vosk_options(config)
+# a file done with other recognizer options (e.g. another grammar) is transcribed again
+options_hash = get_options_hash(vosk_options, model_path)
 
+# existing transcripts: 'skip', 'overwrite', 'version' (save as <name>_v2) or 'fail'
+overwrite_policy = config.get('OUTPUTCONFIG', 'overwrite_policy', fallback='overwrite')
 
-#*** ----- STEP2: VoskHandler & DataHandler --> Setup VoskModel & specify output path ----- ***#
-    # load dict of converted_audio_paths
-with open(os.path.join(input_path, 'coversion_dict.pkl'), 'rb') as f:
-    converted_audios = pickle.load(f)
+# '' = load the model in this process; otherwise url of a running transcription_service.py (model stays loaded)
+service_url = config.get('SERVICECONFIG', 'service_url', fallback='')
+service_token = config.get('SERVICECONFIG', 'service_token', fallback='')
 
+# stage timings & resources of this run (see StageProfiler); saved under csv_results_path
+if config.getboolean('PROFILECONFIG', 'profile', fallback=False):
+    profiler.enable(config.get('PROFILECONFIG', 'cprofile_stage', fallback=''))
 
-    # initialize Vosk-Model
-vosky = VoskHandler("vosky", model_path, output_dir)
-vosky.initialize_model()
+# State of every file (pending/running/done/failed) + checkpoints of unfinished long files
+manifest_path = os.path.join(input_path, 'job_manifest.json')
+checkpoint_dir = os.path.join(input_path, 'checkpoints')
 
-    # Specify output_dir where all files should be stored
-DataHandle = DataHandler("data", output_dir)
 
-#*** ----- STEP3: VoskHandler & DataHandler --> Extract & Handle Data ----- ***#
-    #VoskHandler takes one file at a time
-for file in converted_audios:
-    abs_path = converted_audios[file]
+def get_job(file, abs_path):
+    # text & word timings (compact arrays, see WordTimingStore) are streamed to these paths during recognition
+    return {
+        'file': file,
+        'audio_path': abs_path,
+        'text_path': "{}/{}.txt".format(ai_transcripts_path, file),
+        'word_timings_path': "{}/{}.npz".format(wd_path, file),
+        'checkpoint_path': get_checkpoint_path(checkpoint_dir, file),
+    }
 
-    #Transcribe audio to text & get json data dumb in list as result
-    res = vosky.transcribe_audio_to_text(abs_path)
-    if res is None:
-        print(f"[ERROR]Failure during recognizing audio with name {file}.")
-        continue
 
-    #convert res into (i) pure_text & (ii) list of word dicts
-    data = DataHandle.convert_to_text_and_list_of_word_dicts(res)
-    pure_text, word_dicts = data[0], data[1]
+def outputs_exist(file):
+    job = get_job(file, None)
+    return os.path.exists(job['word_timings_path']) and os.path.exists(job['text_path'])
 
- 
 
-    #!!!!! HARD CODED SHIT TAKE OUT
-    with open("{}/{}".format(wd_path, file), 'w') as fout:
-        json.dump(word_dicts, fout)
-    
-    with open("{}/{}.txt".format(ai_transcripts_path, file), 'w') as fout:
-            fout.write(pure_text)
+def report_progress(done, total, file, elapsed, audio_duration, run_start):
+    # per-file progress + running throughput (audio seconds transcribed per wall second)
+    wall = time.perf_counter() - run_start
+    rtf = elapsed / audio_duration if audio_duration > 0 else 0.0
+    print("[INFO][{}/{}] '{}' done in {:.1f}s (audio {:.1f}s, RTF {:.2f}). Elapsed {:.1f}s, {:.2f} files/min.".format(
+        done, total, file, elapsed, audio_duration, rtf, wall, done / wall * 60))
 
-print("[INFO] All done.")
\ No newline at end of file
+
+if __name__ == '__main__':
+    #*** ----- STEP2: VoskHandler & DataHandler --> Setup VoskModel & specify output path ----- ***#
+    if input_mode == 'stream':
+        # No preprocessing needed: take the original audio files straight from input_path
+        # key=filename (no ext); value=path of the original file
+        AudioHandle = AudioHandler('data1', input_path)
+        AudioHandle.collect_audios()
+        converted_audios = {os.path.splitext(os.path.basename(aud))[0]: str(aud) for aud, ext in AudioHandle.audios_to_convert}
+        stream_rate = read_model_sample_rate(model_path)
+    else:
+            # load dict of converted_audio_paths
+        with open(os.path.join(input_path, 'coversion_dict.pkl'), 'rb') as f:
+            converted_audios = pickle.load(f)
+        stream_rate = None
+
+        # Specify output_dir where all files should be stored
+    DataHandle = DataHandler("data", output_dir, overwrite_policy)
+
+        # Skip files that are already done (same input & outputs still there)
+    manifest = JobManifest("jobs", manifest_path)
+    if not os.path.isdir(checkpoint_dir):
+        os.mkdir(checkpoint_dir)
+    todo = {}
+    for file in converted_audios:
+        abs_path = converted_audios[file]
+        input_hash = hash_file(abs_path)
+        if manifest.is_done(file, input_hash, model_path, options_hash) and outputs_exist(file):
+            continue
+        if overwrite_policy in ('skip', 'fail') and outputs_exist(file):
+            # the outputs wouldn't be saved anyway, so the file isn't recognized
+            print(f"[INFO]Outputs of '{file}' exist already (overwrite policy '{overwrite_policy}').")
+            if overwrite_policy == 'fail':
+                manifest.add(file, abs_path, input_hash)
+                manifest.set_state(file, 'failed', error='outputs exist')
+            continue
+        if not manifest.add(file, abs_path, input_hash):
+            # input changed: a checkpoint of an earlier run would belong to the old audio
+            checkpoint_path = get_checkpoint_path(checkpoint_dir, file)
+            if os.path.exists(checkpoint_path):
+                os.remove(checkpoint_path)
+        todo[file] = abs_path
+    manifest.save()
+    if len(todo) < len(converted_audios):
+        print("[INFO]{} of {} files are already done and will be skipped.".format(len(converted_audios) - len(todo), len(converted_audios)))
+
+    #*** ----- STEP3: VoskHandler & DataHandler --> Extract & Handle Data ----- ***#
+    total = len(todo)
+    done, failed, audio_total = 0, 0, 0.0
+    run_start = time.perf_counter()
+
+    jobs = [get_job(file, todo[file]) for file in todo]
+
+    client = None
+    if service_url:
+        client = TranscriptionClient("client", service_url, service_token)
+        status = client.health()
+        if status is None:
+            print(f"[WARNING]Transcription service at '{service_url}' isn't reachable. The model is loaded locally.")
+            client = None
+        elif os.path.abspath(status['model_path']) != os.path.abspath(model_path):
+            # the manifest would record a model the transcripts weren't made with
+            print(f"[WARNING]The service uses the model '{status['model_path']}', not '{model_path}'. The model is loaded locally.")
+            client = None
+        elif status.get('options_hash') != options_hash:
+            # the service decodes with the recognizer options it was started with (grammar, silence filter, ...)
+            print(f"[WARNING]The service at '{service_url}' uses other recognizer options. The model is loaded locally.")
+            client = None
+
+    if client is not None:
+        def transcribe_service():
+            #the service queues the files onto its own threads; num_workers requests are sent at once
+            with concurrent.futures.ThreadPoolExecutor(max_workers=num_workers) as executor:
+                futures = [executor.submit(transcribe_with_service, client, DataHandle, job, stream_rate) for job in jobs]
+                for future in concurrent.futures.as_completed(futures):
+                    yield future.result()
+        transcriptions = transcribe_service()
+    elif num_workers > 1:
+        #Worker processes load the model once each & take files from a shared queue
+        pool = TranscriptionPool("pool", model_path, output_dir, num_workers, stream_rate=stream_rate,
+                                 vosk_options=vosk_options, overwrite_policy=overwrite_policy)
+        # NOTE files stay 'pending' until a worker returns them; the pool doesn't report when a file is started
+        transcriptions = pool.transcribe(jobs)
+    else:
+            # initialize Vosk-Model
+        vosky = VoskHandler("vosky", model_path, **vosk_options)
+        vosky.initialize_model()
+
+        def transcribe_serial():
+            #VoskHandler takes one file at a time
+            for job in jobs:
+                manifest.set_state(job['file'], 'running')
+                #Transcribe audio & stream (i) pure_text & (ii) word timings to disk while recognizing
+                yield transcribe_to_files(vosky, DataHandle, job, stream_rate)
+        transcriptions = transcribe_serial()
+
+    #Outputs are on disk as soon as a file is finished
+    for file, ok, elapsed, audio_duration in transcriptions:
+        done += 1
+        if not ok:
+            failed += 1
+            print(f"[ERROR]Failure during recognizing audio with name {file}.")
+            manifest.set_state(file, 'failed', error='recognition failed')
+            continue
+
+        manifest.set_state(file, 'done', elapsed=elapsed, audio_duration=audio_duration, model_path=model_path,
+                           options_hash=options_hash)
+
+        audio_total += audio_duration
+        report_progress(done, total, file, elapsed, audio_duration, run_start)
+
+    # Throughput report for the whole run
+    wall = time.perf_counter() - run_start
+    print("[INFO]Transcribed {} of {} files ({} failed) in {:.1f}s.".format(done - failed, total, failed, wall))
+    if wall > 0:
+        print("[INFO]Throughput: {:.2f} files/min, {:.1f}s audio per wall second.".format(
+            (done - failed) / wall * 60, audio_total / wall))
+
+    profiler.print_summary()
+    profiler.save(results_dir)
+
+    print("[INFO] All done.")
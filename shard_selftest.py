@@ -0,0 +1,100 @@
+import os
+import sys
+import json
+import time
+import tempfile
+import multiprocessing
+
+# class imports
+from classes import LeaseQueue, run_leased_tasks
+
+
+# Local self-test of the coordination of shard_worker.py (LeaseQueue & run_leased_tasks), no model or audio needed:
+# several worker processes share one temp dir. Worker 0 is a straggler (the others have to steal its shard)
+# & one worker crashes in the middle of a task (its lease has to expire & be taken over).
+# Exit code 0 if every task was done, only the crashed task ran twice & stealing + recovery happened.
+
+# ------- ENTER TEST SETTINGS HERE --------
+num_workers = 4
+num_tasks = 40
+task_seconds = 0.05
+straggler_seconds = 0.5
+# index of the worker that crashes during its 3rd task
+crashing_worker = 3
+lease_seconds = 1.0
+poll_seconds = 0.1
+# ------- END --------
+
+
+def run_worker(work_dir, index, tasks):
+    queue = LeaseQueue("selftest", work_dir, index, num_workers, lease_seconds)
+    log_path = os.path.join(work_dir, 'executions.log')
+    executed = []
+
+    def func(task):
+        executed.append(task)
+        # one line per execution; appends of single lines don't mix between processes
+        with open(log_path, 'a') as f:
+            f.write("{} {}\n".format(task, index))
+        if index == crashing_worker and len(executed) == 3:
+            # dies holding the lease: no release, no heartbeat
+            os._exit(1)
+        time.sleep(straggler_seconds if index == 0 else task_seconds)
+        return {'worker': index}
+
+    counts = run_leased_tasks([(queue, tasks, func, None)], poll_seconds)
+    with open(os.path.join(work_dir, 'counts_{}.json'.format(index)), 'w') as f:
+        json.dump(counts['selftest'], f)
+
+
+if __name__ == '__main__':
+    tasks = ['task{:03d}'.format(i) for i in range(num_tasks)]
+    failures = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        start = time.perf_counter()
+        workers = [multiprocessing.Process(target=run_worker, args=(work_dir, i, tasks)) for i in range(num_workers)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join(timeout=120)
+            if worker.is_alive():
+                worker.terminate()
+                failures.append("a worker didn't finish")
+        wall = time.perf_counter() - start
+
+        queue = LeaseQueue("check", work_dir, 0, num_workers, lease_seconds)
+        executions = {}
+        with open(os.path.join(work_dir, 'executions.log'), 'r') as f:
+            for line in f:
+                task, index = line.split()
+                executions.setdefault(task, []).append(int(index))
+        counts = {'own': 0, 'stolen': 0, 'recovered': 0}
+        for i in range(num_workers):
+            path = os.path.join(work_dir, 'counts_{}.json'.format(i))
+            if os.path.exists(path):
+                with open(path, 'r') as f:
+                    for kind, count in json.load(f).items():
+                        counts[kind] += count
+
+        #*** ----- Checks ----- ***#
+        missing = [task for task in tasks if queue.get_result(task) is None or not queue.get_result(task)['ok']]
+        if missing:
+            failures.append("tasks without result: {}".format(missing))
+        twice = {task: workers_ for task, workers_ in executions.items() if len(workers_) > 1}
+        if len(twice) != 1 or list(twice.values())[0][0] != crashing_worker:
+            failures.append("only the task of the crashed worker should run twice: {}".format(twice))
+        if counts['stolen'] == 0:
+            failures.append("nobody stole from the straggler")
+        if counts['recovered'] == 0:
+            failures.append("the lease of the crashed worker wasn't taken over")
+        leftover = os.listdir(queue.lease_dir)
+        if leftover:
+            failures.append("leases left: {}".format(leftover))
+
+    print("[INFO]{} tasks, {} workers in {:.1f}s: {} own, {} stolen, {} recovered.".format(
+        num_tasks, num_workers, wall, counts['own'], counts['stolen'], counts['recovered']))
+    if failures:
+        for failure in failures:
+            print("[ERROR]" + failure)
+        sys.exit(1)
+    print("[INFO]Self-test passed.")
@@ -0,0 +1,162 @@
+import os
+import sys
+import configparser
+
+import numpy as np
+
+# class imports
+from classes import AudioHandler, VoskHandler, DataHandler, CompareHandler, ResultsStore, NormalizationCache
+from classes import LeaseQueue, run_leased_tasks, read_model_sample_rate, read_vosk_options, hash_file
+from classes import get_checkpoint_path, get_temp_path, transcribe_to_files, profiler
+
+
+# One of many independent workers: conversion, recognition & evaluation of the files in input_path,
+# shared with all other workers (processes or hosts) through work_dir (see LeaseQueue).
+# Start as many as you like, on every host with the same config & paths:
+#   python shard_worker.py <worker_index> <num_workers>
+# (without arguments: worker_index & num_workers of SHARDCONFIG). A worker exits when everything is done.
+# Crashed workers are simply restarted (or not): their tasks are taken over when the leases expire.
+
+# Get relevant configs
+config = configparser.ConfigParser()
+config.read('config.ini')
+input_path = config.get('DATACONFIG','input_path')
+ai_transcripts_path = config.get('DATACONFIG','output_dir')
+wd_path = config.get('DATACONFIG','word_dicts_path')
+original_dir = config.get('DATACONFIG','orig_transcripts_path')
+results_dir = config.get('DATACONFIG','csv_results_path')
+model_path = config.get('MODELCONFIG','model_path')
+results_backend = config.get('RESULTSCONFIG', 'results_backend', fallback='csv')
+vosk_options = read_vosk_options(config)
+overwrite_policy = config.get('OUTPUTCONFIG', 'overwrite_policy', fallback='overwrite')
+conversion_block_seconds = config.getfloat('CONVERTCONFIG', 'block_seconds', fallback=10.0)
+
+# shared dir of all workers (leases, results of the tasks, converted audio & checkpoints)
+work_dir = config.get('SHARDCONFIG', 'work_dir', fallback=os.path.join(input_path, 'shards'))
+worker_index = config.getint('SHARDCONFIG', 'worker_index', fallback=0)
+num_workers = config.getint('SHARDCONFIG', 'num_workers', fallback=1)
+if len(sys.argv) > 2:
+    worker_index, num_workers = int(sys.argv[1]), int(sys.argv[2])
+# a lease that wasn't renewed for this long belongs to a dead worker
+lease_seconds = config.getfloat('SHARDCONFIG', 'lease_seconds', fallback=120.0)
+# wait between two scans when all open tasks are leased by other workers
+poll_seconds = config.getfloat('SHARDCONFIG', 'poll_seconds', fallback=5.0)
+# stages this worker takes part in
+stages = [s.strip() for s in config.get('SHARDCONFIG', 'stages', fallback='convert,transcribe,evaluate').split(',') if s.strip()]
+
+# stage timings & resources of this run (see StageProfiler); saved under csv_results_path
+if config.getboolean('PROFILECONFIG', 'profile', fallback=False):
+    profiler.enable(config.get('PROFILECONFIG', 'cprofile_stage', fallback=''))
+
+normalization_cache = None
+if config.getboolean('EVALUATIONCONFIG', 'normalization_cache', fallback=True):
+    normalization_cache = NormalizationCache("normalization", os.path.join(results_dir, 'normalization_cache'))
+
+convert_dir = os.path.join(work_dir, 'audio')
+checkpoint_dir = os.path.join(work_dir, 'checkpoints')
+
+
+def get_queue(stage):
+    return LeaseQueue(stage, os.path.join(work_dir, stage), worker_index, num_workers, lease_seconds)
+
+
+def get_result(queue, task):
+    # result of the task in an earlier stage; raises if it failed there
+    entry = queue.get_result(task)
+    if entry is None or not entry['ok']:
+        raise RuntimeError(f"'{task}' failed in stage '{queue.name}'.")
+    return entry['result']
+
+
+if __name__ == '__main__':
+    #*** ----- Setup: the same task list on every worker ----- ***#
+    AudioHandle = AudioHandler('data_{}'.format(worker_index), input_path,
+                               target_frame_rate=read_model_sample_rate(model_path),
+                               block_seconds=conversion_block_seconds)
+    AudioHandle.collect_audios()
+    sources = {os.path.splitext(os.path.basename(aud))[0]: (str(aud), str(ext)) for aud, ext in AudioHandle.audios_to_convert}
+    files = sorted(sources)
+    originals = set(os.listdir(original_dir))
+    evaluated = [file for file in files if file + '.txt' in originals]
+    for path in (convert_dir, checkpoint_dir):
+        os.makedirs(path, exist_ok=True)
+
+    convert_queue = get_queue('convert')
+    transcribe_queue = get_queue('transcribe')
+    evaluate_queue = get_queue('evaluate')
+    collect_queue = get_queue('collect')
+    print(f"[INFO]Worker {worker_index + 1} of {num_workers} ({convert_queue.worker_id}): {len(files)} files, stages {stages}.")
+
+    #*** ----- Stages ----- ***#
+    def convert(file):
+        # straight to work_dir/audio (the conversion cache of AudioHandler is per host)
+        aud, ext = sources[file]
+        target_path = os.path.join(convert_dir, file + '.wav')
+        tmp_path = get_temp_path(target_path, '.part')
+        AudioHandle.convert_stream(aud, ext, tmp_path, file)
+        os.replace(tmp_path, target_path)
+        return {'audio_path': target_path, 'input_hash': hash_file(aud)}
+
+    vosky = None
+    DataHandle = DataHandler("data", ai_transcripts_path, overwrite_policy)
+
+    def transcribe(file):
+        global vosky
+        converted = get_result(convert_queue, file)
+        # the model is only read if this worker gets a file to transcribe
+        if vosky is None:
+            vosky = VoskHandler("vosky", model_path, **vosk_options)
+            vosky.initialize_model()
+        job = {
+            'file': file,
+            'audio_path': converted['audio_path'],
+            'text_path': "{}/{}.txt".format(ai_transcripts_path, file),
+            'word_timings_path': "{}/{}.npz".format(wd_path, file),
+            # a worker taking over the file continues at the last checkpoint
+            'checkpoint_path': get_checkpoint_path(checkpoint_dir, file),
+        }
+        _, ok, elapsed, audio_duration = transcribe_to_files(vosky, DataHandle, job)
+        if not ok:
+            raise RuntimeError(f"Recognition of '{file}' failed.")
+        # the path the transcript was saved under (e.g. <file>_v2.txt with the overwrite policy 'version')
+        return {'text_path': job['text_path'], 'elapsed': elapsed, 'audio_duration': audio_duration}
+
+    def evaluate(file):
+        transcribed = get_result(transcribe_queue, file)
+        with open(os.path.join(original_dir, file + '.txt'), 'r', encoding= 'unicode_escape') as f: original_f = f.read()
+        with open(transcribed['text_path'], 'r', encoding= 'unicode_escape') as f: ai_f = f.read()
+        row = CompareHandler(file, original_f, ai_f, normalization_cache).get_results()
+        row['audio_duration'] = transcribed['audio_duration']
+        row['transcription_time'] = transcribed['elapsed']
+        row['rtf'] = transcribed['elapsed'] / transcribed['audio_duration'] if transcribed['audio_duration'] else None
+        # numpy scalars -> python numbers (json)
+        return {k: v.item() if isinstance(v, np.generic) else v for k, v in row.items()}
+
+    def collect(task):
+        # ONE worker writes the rows of all files into the results table
+        store = ResultsStore("results", results_dir, results_backend,
+                             run_metadata={'model_path': model_path})
+        for file in evaluated:
+            entry = evaluate_queue.get_result(file)
+            if entry is not None and entry['ok']:
+                store.add_row(entry['result'])
+        count = len(store.rows)
+        store.write()
+        return {'rows': count}
+
+    all_stages = {
+        'convert': (convert_queue, files, convert, None),
+        'transcribe': (transcribe_queue, files, transcribe, lambda file: os.path.exists(convert_queue.get_done_path(file))),
+        'evaluate': (evaluate_queue, evaluated, evaluate, lambda file: os.path.exists(transcribe_queue.get_done_path(file))),
+        'collect': (collect_queue, ['results'], collect, lambda task: evaluate_queue.get_done() >= set(evaluated)),
+    }
+    if 'evaluate' in stages:
+        stages.append('collect')
+    counts = run_leased_tasks([all_stages[stage] for stage in all_stages if stage in stages], poll_seconds)
+
+    #*** ----- Report ----- ***#
+    for stage, count in counts.items():
+        print(f"[INFO]{stage}: {count['own']} own, {count['stolen']} stolen & {count['recovered']} recovered tasks.")
+    profiler.print_summary()
+    profiler.save(results_dir)
+    print("[INFO] All done.")
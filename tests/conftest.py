@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the scripts & classes.py live in the root of the repo (no package)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,55 @@
+import math
+import random
+
+import pytest
+
+from classes import align_words
+
+
+# align_words has to count the same edits as werpy.summary (which it replaced), also where several
+# alignments are equally good. Random pairs of a small vocabulary, so there are many of those ties.
+
+KEYS = ['wer', 'ld', 'm', 'insertions', 'deletions', 'substitutions']
+
+
+def get_werpy_summary(reference, hypothesis):
+    werpy = pytest.importorskip("werpy")
+    row = werpy.summary(' '.join(reference), ' '.join(hypothesis)).iloc[0]
+    return {key: row[key] for key in KEYS}
+
+
+def random_words(rng, vocabulary, min_len):
+    return [rng.choice(vocabulary) for _ in range(rng.randint(min_len, 12))]
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_same_as_werpy(seed):
+    rng = random.Random(seed)
+    vocabulary = ['a', 'b', 'c', 'd', 'e'][:rng.randint(1, 5)]
+    for _ in range(50):
+        # werpy needs a reference with at least one word
+        reference = random_words(rng, vocabulary, 1)
+        hypothesis = random_words(rng, vocabulary, 0)
+        result = align_words(reference, hypothesis)
+        expected = get_werpy_summary(reference, hypothesis)
+        assert {key: result[key] for key in KEYS} == pytest.approx(expected), (reference, hypothesis)
+
+
+def test_empty_hypothesis():
+    assert align_words(['a', 'b', 'c'], []) == {
+        'wer': 1.0, 'ld': 3, 'm': 3, 'insertions': 0, 'deletions': 3, 'substitutions': 0}
+
+
+def test_empty_reference():
+    result = align_words([], ['a', 'b'])
+    # no reference words: the WER is undefined, the edits are all insertions
+    assert math.isnan(result['wer'])
+    assert {key: result[key] for key in KEYS[1:]} == {
+        'ld': 2, 'm': 0, 'insertions': 2, 'deletions': 0, 'substitutions': 0}
+
+
+def test_both_empty():
+    result = align_words([], [])
+    assert math.isnan(result['wer'])
+    assert {key: result[key] for key in KEYS[1:]} == {
+        'ld': 0, 'm': 0, 'insertions': 0, 'deletions': 0, 'substitutions': 0}
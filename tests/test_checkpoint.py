@@ -0,0 +1,132 @@
+import json
+import wave
+
+import pytest
+
+from classes import VoskHandler
+
+
+# Resuming an interrupted transcription from its checkpoint (VoskHandler.iter_transcribe_audio) with a fake
+# recognizer: one word per chunk of 100 ms & a finished utterance after every 2nd chunk. A new recognizer starts
+# counting at 0, so the word times of a resumed run have to be shifted by the position it resumed at.
+
+SAMPLE_RATE = 16000
+CHUNK_FRAMES = 1600
+NUM_CHUNKS = 8
+
+
+class FakeRecognizer():
+    # frames fed to all recognizers of a test
+    fed = 0
+
+    def __init__(self, sample_rate):
+        self.sample_rate = sample_rate
+        self.frames = 0
+        self.words = []
+
+    def AcceptWaveform(self, data):
+        start = self.frames / self.sample_rate
+        self.frames += len(data) // 2
+        FakeRecognizer.fed += len(data) // 2
+        # the words are the chunk's first sample, so a resumed run must see the same ones as a full run
+        word = 'w{}'.format(int.from_bytes(data[:2], 'little'))
+        self.words.append({'word': word, 'start': start, 'end': self.frames / self.sample_rate, 'conf': 1.0})
+        return len(self.words) == 2
+
+    def Result(self):
+        words, self.words = self.words, []
+        if len(words) == 0:
+            return json.dumps({'text': ''})
+        return json.dumps({'result': words, 'text': ' '.join(w['word'] for w in words)})
+
+    def FinalResult(self):
+        return self.Result()
+
+
+@pytest.fixture
+def audio_path(tmp_path):
+    # chunk i holds the sample value i
+    path = str(tmp_path / 'audio.wav')
+    with wave.open(path, 'wb') as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(SAMPLE_RATE)
+        for i in range(NUM_CHUNKS):
+            wf.writeframes(i.to_bytes(2, 'little') * CHUNK_FRAMES)
+    FakeRecognizer.fed = 0
+    return path
+
+
+def get_handler(**options):
+    vosky = VoskHandler("vosky", "no_model", recognition_frame_rate=CHUNK_FRAMES, **options)
+    vosky.create_recognizer = FakeRecognizer
+    return vosky
+
+
+def get_words(results):
+    return [(w['word'], pytest.approx(w['start']), pytest.approx(w['end'])) for r in results for w in r.get('result', [])]
+
+
+def interrupt(audio_path, checkpoint_path, utterances, **options):
+    # stops the run after some utterances, like a crash (the checkpoint stays)
+    results = get_handler(**options).iter_transcribe_audio(audio_path, checkpoint_path)
+    for _ in range(utterances):
+        next(results)
+    results.close()
+
+
+def test_resume_after_cut_off_line(audio_path, tmp_path):
+    expected = get_words(get_handler().iter_transcribe_audio(audio_path))
+    assert len(expected) == NUM_CHUNKS
+
+    checkpoint_path = str(tmp_path / 'audio.json')
+    interrupt(audio_path, checkpoint_path, 2)
+    # the crash cut the next line off in the middle
+    with open(checkpoint_path, 'a') as f:
+        f.write('{"frames": 9600, "offs')
+
+    FakeRecognizer.fed = 0
+    results = list(get_handler().iter_transcribe_audio(audio_path, checkpoint_path))
+
+    # same words & times as without the crash; only the audio after the 2 utterances was recognized again
+    assert get_words(results) == expected
+    assert FakeRecognizer.fed == NUM_CHUNKS * CHUNK_FRAMES - 4 * CHUNK_FRAMES
+    assert not (tmp_path / 'audio.json').exists()
+
+
+def test_resumed_lines_are_not_glued_to_a_cut_off_line(audio_path, tmp_path):
+    checkpoint_path = str(tmp_path / 'audio.json')
+    interrupt(audio_path, checkpoint_path, 1)
+    with open(checkpoint_path, 'a') as f:
+        f.write('{"frames": 64')
+    # crashes again after one more utterance: the checkpoint has to be readable
+    interrupt(audio_path, checkpoint_path, 2)
+
+    frames, results = get_handler().load_checkpoint(checkpoint_path)
+    assert frames == 4 * CHUNK_FRAMES
+    assert [r['text'] for r in results] == ['w0 w1', 'w2 w3']
+    # times of the resumed utterance are shifted by the resume position
+    assert results[1]['result'][0]['start'] == pytest.approx(0.2)
+
+
+def test_checkpoint_of_other_options_is_dropped(audio_path, tmp_path):
+    checkpoint_path = str(tmp_path / 'audio.json')
+    interrupt(audio_path, checkpoint_path, 2)
+
+    FakeRecognizer.fed = 0
+    results = list(get_handler(grammar=['w1 w2', 'w3']).iter_transcribe_audio(audio_path, checkpoint_path))
+
+    # started over: all audio recognized, every utterance once
+    assert FakeRecognizer.fed == NUM_CHUNKS * CHUNK_FRAMES
+    assert [r['text'] for r in results if r['text']] == ['w0 w1', 'w2 w3', 'w4 w5', 'w6 w7']
+
+
+def test_lines_of_older_checkpoints(tmp_path):
+    # written before the offset & the options were part of the lines
+    checkpoint_path = str(tmp_path / 'audio.json')
+    with open(checkpoint_path, 'w') as f:
+        f.write('{"frames": 3200, "result": {"text": "a", "result": [{"word": "a", "start": 0.1, "end": 0.2}]}}\n')
+
+    frames, results = get_handler().load_checkpoint(checkpoint_path)
+    assert frames == 3200
+    assert results[0]['result'][0]['start'] == pytest.approx(0.1)
@@ -0,0 +1,47 @@
+import math
+
+import pytest
+
+from classes import CompareHandler, BatchCompareHandler
+
+
+# The distances of many pairs at once (BatchCompareHandler, calculations.py) must be the same as the ones of a
+# single pair (CompareHandler.get_results, pipeline.py & shard_worker.py).
+
+PAIRS = [
+    ('the cat sat on the mat', 'the cat sat on a mat'),
+    ('ab ab bc', 'ab bc cd'),
+    ('one two three', 'one two three'),
+    ('hello hello hello world', 'hello world'),
+    ('nothing in common', 'totally different words'),
+    ('', 'some words'),
+]
+
+
+def get_comparisons():
+    return [CompareHandler(str(i), original, ai) for i, (original, ai) in enumerate(PAIRS)]
+
+
+def assert_same(a, b):
+    if math.isnan(a):
+        assert math.isnan(b)
+    else:
+        assert a == pytest.approx(b)
+
+
+def test_batch_equals_per_pair():
+    distances = BatchCompareHandler("batch", get_comparisons()).calculate_distances()
+    for comparison in get_comparisons():
+        row = comparison.get_results()
+        batch = distances[comparison.name]
+        assert_same(batch['Euclidean'], row['euclidean'])
+        assert_same(batch['Cosine'], row['cosine'])
+        assert_same(batch['Jaccard'], row['jaccard'])
+        # and the same row, whether the distances were passed in or not
+        assert comparison.get_results(batch)['jaccard'] == row['jaccard']
+
+
+def test_jaccard_counts_words_whose_counts_differ():
+    # like scipy 1.9: 'ab' (2 vs 1) & 'cd' (0 vs 1) differ, of the 3 words that occur
+    assert CompareHandler("pair", 'ab ab bc', 'ab bc cd').calculate_jaccard() == pytest.approx(2 / 3)
+    assert CompareHandler("pair", 'hello hello', 'hello').calculate_jaccard() == pytest.approx(1.0)
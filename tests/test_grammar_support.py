@@ -0,0 +1,35 @@
+from classes import VoskHandler, get_options_hash, model_supports_grammar
+
+
+# A model without a dynamic graph ignores a runtime grammar, so the grammar is dropped & left out of the
+# options hash (otherwise the manifest would claim a grammar the transcripts weren't made with).
+
+GRAMMAR = ['one two', 'three']
+
+
+def make_model(tmp_path, name, graph_files):
+    model_path = tmp_path / name
+    (model_path / 'graph').mkdir(parents=True)
+    for graph_file in graph_files:
+        (model_path / 'graph' / graph_file).write_bytes(b'')
+    return str(model_path)
+
+
+def test_static_graph_drops_the_grammar(tmp_path):
+    model_path = make_model(tmp_path, 'big', ['HCLG.fst'])
+    assert not model_supports_grammar(model_path)
+
+    vosky = VoskHandler("vosky", model_path, grammar=GRAMMAR)
+    assert vosky.grammar is None
+    assert vosky.options_hash == get_options_hash({})
+    assert get_options_hash({'grammar': GRAMMAR}, model_path) == get_options_hash({})
+
+
+def test_dynamic_graph_keeps_the_grammar(tmp_path):
+    model_path = make_model(tmp_path, 'small', ['HCLr.fst', 'Gr.fst'])
+    assert model_supports_grammar(model_path)
+
+    vosky = VoskHandler("vosky", model_path, grammar=GRAMMAR)
+    assert vosky.grammar == GRAMMAR
+    assert vosky.options_hash == get_options_hash({'grammar': GRAMMAR}, model_path)
+    assert vosky.options_hash != get_options_hash({})
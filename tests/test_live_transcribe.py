@@ -0,0 +1,99 @@
+import json
+import time
+
+import pytest
+
+from classes import VoskHandler
+
+
+# iter_live_transcribe with a fake recognizer & a fake clock: a chunk of 100 ms arrives every 100 ms &
+# an utterance ends (final result) with the first silent chunk after it, like the endpointing of vosk.
+# So every final result comes one chunk (100 ms) after the last audio of its utterance.
+
+SAMPLE_RATE = 16000
+CHUNK_FRAMES = 1600
+
+
+class FakeClock():
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeRecognizer():
+    # one word per chunk with speech (non-zero samples)
+    def __init__(self, sample_rate):
+        self.sample_rate = sample_rate
+        self.frames = 0
+        self.count = 0
+        self.words = []
+
+    def AcceptWaveform(self, data):
+        start = self.frames / self.sample_rate
+        self.frames += len(data) // 2
+        if any(data):
+            self.words.append({'word': 'w{}'.format(self.count), 'start': start,
+                               'end': self.frames / self.sample_rate, 'conf': 1.0})
+            self.count += 1
+            return False
+        return len(self.words) > 0
+
+    def Result(self):
+        words, self.words = self.words, []
+        if len(words) == 0:
+            return json.dumps({'text': ''})
+        return json.dumps({'result': words, 'text': ' '.join(w['word'] for w in words)})
+
+    def FinalResult(self):
+        return self.Result()
+
+    def PartialResult(self):
+        return json.dumps({'partial': ' '.join(w['word'] for w in self.words)})
+
+
+def timed_chunks(clock, pattern):
+    # 1 = speech, 0 = silence; the clock moves on by the length of a chunk before it arrives
+    for speech in pattern:
+        clock.now += CHUNK_FRAMES / SAMPLE_RATE
+        yield (b'\x01\x00' if speech else b'\x00\x00') * CHUNK_FRAMES
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(time, 'perf_counter', clock)
+    return clock
+
+
+def get_handler():
+    vosky = VoskHandler("live", "no_model")
+    vosky.create_recognizer = FakeRecognizer
+    return vosky
+
+
+def test_latency_per_utterance(clock):
+    vosky = get_handler()
+    events = list(vosky.iter_live_transcribe(timed_chunks(clock, [1, 1, 1, 0, 0, 1, 1, 0, 0]), SAMPLE_RATE))
+    finals = [event for event in events if event['type'] == 'final']
+
+    assert [event['text'] for event in finals] == ['w0 w1 w2', 'w3 w4']
+    assert [event['end'] for event in finals] == pytest.approx([0.3, 0.7])
+    assert [event['latency'] for event in finals] == pytest.approx([0.1, 0.1])
+    assert vosky.last_audio_duration == pytest.approx(0.9)
+
+
+def test_partials(clock):
+    events = list(get_handler().iter_live_transcribe(timed_chunks(clock, [1, 1, 0]), SAMPLE_RATE))
+
+    assert [(event['type'], event['text']) for event in events] == [('partial', 'w0'), ('partial', 'w0 w1'),
+                                                                    ('final', 'w0 w1')]
+    assert [event['audio_time'] for event in events] == pytest.approx([0.1, 0.2, 0.3])
+
+
+def test_end_of_stream(clock):
+    # the last utterance is finished by the end of the audio, right after its last chunk arrived
+    events = list(get_handler().iter_live_transcribe(timed_chunks(clock, [1, 1]), SAMPLE_RATE, partials=False))
+
+    assert [(event['text'], event['latency']) for event in events] == [('w0 w1', pytest.approx(0.0))]
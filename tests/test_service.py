@@ -0,0 +1,13 @@
+from classes import TranscriptionService, get_options_hash
+
+
+# Clients compare the options hash of /health with their own: the service decodes with the options it was
+# started with, not with those of the client.
+
+def test_health_reports_the_options_of_the_service():
+    options = {'words': True, 'grammar': ['one two', 'three']}
+    service = TranscriptionService("service", "no_model", vosk_options=options, token='secret')
+
+    status = service.get_status()
+    assert status['options_hash'] == get_options_hash(options, "no_model")
+    assert status['options_hash'] != get_options_hash(dict(options, grammar=None), "no_model")
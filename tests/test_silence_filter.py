@@ -0,0 +1,80 @@
+import json
+import wave
+
+import numpy as np
+import pytest
+
+from classes import SilenceFilter, VoskHandler
+
+
+# 0.6 s speech, 2 s pause, 0.6 s speech: the pause is cut down to keep_silence, which is shorter than the
+# pause Kaldi needs for an endpoint, so the utterance has to be ended at the cut.
+
+SAMPLE_RATE = 16000
+SILENCE_OPTIONS = {'threshold_db': -40.0, 'min_silence': 1.0, 'keep_silence': 0.3}
+
+
+def get_audio():
+    speech = np.full(int(0.6 * SAMPLE_RATE), 10000, dtype='<i2')
+    pause = np.zeros(2 * SAMPLE_RATE, dtype='<i2')
+    return np.concatenate([speech, pause, speech])
+
+
+class FakeRecognizer():
+    # never finds an endpoint by itself (the pauses it gets are too short); one word per part with speech,
+    # from the first to the last loud sample
+    def __init__(self, sample_rate):
+        self.sample_rate = sample_rate
+        self.frames = 0
+        self.words = []
+
+    def AcceptWaveform(self, data):
+        samples = np.frombuffer(data, dtype='<i2')
+        loud = np.flatnonzero(samples)
+        if len(loud) > 0:
+            self.words.append({'word': 'w', 'start': (self.frames + loud[0]) / self.sample_rate,
+                               'end': (self.frames + loud[-1] + 1) / self.sample_rate, 'conf': 1.0})
+        self.frames += len(samples)
+        return False
+
+    def Result(self):
+        words, self.words = self.words, []
+        if len(words) == 0:
+            return json.dumps({'text': ''})
+        return json.dumps({'result': words, 'text': ' '.join(w['word'] for w in words)})
+
+
+def test_map_time():
+    silence_filter = SilenceFilter("silence", SAMPLE_RATE, **SILENCE_OPTIONS)
+    audio = get_audio().tobytes()
+    filtered = silence_filter.process(audio[:len(audio) // 2]) + silence_filter.process(audio[len(audio) // 2:])
+    filtered += silence_filter.flush()
+
+    # one cut; 0.3 s of the pause are left
+    assert len(silence_filter.cut_points) == 1
+    assert silence_filter.get_skipped() == pytest.approx(1.7, abs=0.03)
+    samples = np.frombuffer(filtered, dtype='<i2')
+    second_start = np.flatnonzero(samples)[int(0.6 * SAMPLE_RATE)] / SAMPLE_RATE
+    # before the cut the times stay, after it they refer to the original audio
+    assert silence_filter.map_time(0.5) == 0.5
+    assert silence_filter.map_time(second_start) == pytest.approx(2.6)
+
+
+def test_utterance_ends_at_cut(tmp_path):
+    audio_path = str(tmp_path / 'audio.wav')
+    with wave.open(audio_path, 'wb') as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(SAMPLE_RATE)
+        wf.writeframes(get_audio().tobytes())
+    vosky = VoskHandler("vosky", "no_model", recognition_frame_rate=1600, silence_options=SILENCE_OPTIONS)
+    vosky.create_recognizer = FakeRecognizer
+
+    results = [r for r in vosky.iter_transcribe_audio(audio_path) if r.get('result')]
+
+    # two utterances, with the times of the original audio
+    assert len(results) == 2
+    assert results[0]['result'][0]['start'] == pytest.approx(0.0)
+    assert results[0]['result'][-1]['end'] == pytest.approx(0.6)
+    assert results[1]['result'][0]['start'] == pytest.approx(2.6)
+    assert results[1]['result'][-1]['end'] == pytest.approx(3.2)
@@ -0,0 +1,22 @@
+from classes import DataHandler, transcribe_to_files
+
+
+# An error of one file fails only that job; the caller records it as failed & goes on with the next files.
+
+class FailingHandler():
+    last_audio_duration = 0.0
+
+    def iter_transcribe_audio(self, audio_path, checkpoint_path=None, name=None):
+        raise ValueError("not a wav file: " + audio_path)
+
+
+def test_error_fails_only_the_job(tmp_path):
+    data_handle = DataHandler("data", str(tmp_path))
+    jobs = [{'file': name, 'audio_path': str(tmp_path / name), 'checkpoint_path': None,
+             'text_path': str(tmp_path / (name + '.txt')), 'word_timings_path': str(tmp_path / (name + '.npz'))}
+            for name in ('a', 'b')]
+
+    results = [transcribe_to_files(FailingHandler(), data_handle, job) for job in jobs]
+
+    assert [(file, ok) for file, ok, _, _ in results] == [('a', False), ('b', False)]
+    assert not (tmp_path / 'a.txt').exists()
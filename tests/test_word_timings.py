@@ -0,0 +1,30 @@
+from classes import WordTimingStore, WordTimingWriter
+
+
+# Word times & confidences have to come back exactly as vosk gave them, not as the nearest float32.
+
+WORDS = [{"WORD": "one", "START": 0.1, "END": 0.33, "CONF": 0.912345},
+         {"WORD": "two", "START": 1234.56, "END": 1234.9, "CONF": 1.0}]
+
+
+def test_store_keeps_the_values(tmp_path):
+    store = WordTimingStore("store")
+    store.add("file", WORDS)
+    assert store.to_word_dicts("file") == WORDS
+
+    path = str(tmp_path / 'timings.npz')
+    store.save(path)
+    loaded = WordTimingStore("loaded")
+    loaded.load(path)
+    assert loaded.to_word_dicts("file") == WORDS
+
+
+def test_writer_keeps_the_values(tmp_path):
+    writer = WordTimingWriter("writer", str(tmp_path / 'file.npz'))
+    for wd in WORDS:
+        writer.add(wd["WORD"], wd["START"], wd["END"], wd["CONF"])
+    path = writer.close()
+
+    store = WordTimingStore("store")
+    store.load(path)
+    assert store.to_word_dicts("file") == WORDS
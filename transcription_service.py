@@ -0,0 +1,40 @@
+import sys
+import configparser
+
+# class imports
+from classes import TranscriptionService, read_vosk_options, profiler
+
+
+# Get relevant configs
+config = configparser.ConfigParser()
+config.read('config.ini')
+model_path = config.get('MODELCONFIG','model_path')
+results_dir = config.get('DATACONFIG','csv_results_path')
+# Recognizer options (see VoskHandler); the same as for recognize_audio.py
+vosk_options = read_vosk_options(config)
+# only local connections by default
+host = config.get('SERVICECONFIG', 'service_host', fallback='127.0.0.1')
+port = config.getint('SERVICECONFIG', 'service_port', fallback=8765)
+# files transcribed at the same time (threads sharing the one model)
+num_threads = config.getint('SERVICECONFIG', 'service_threads', fallback=2)
+# every request has to carry this token
+token = config.get('SERVICECONFIG', 'service_token', fallback='')
+# the service keeps the checkpoints itself; '' = none
+checkpoint_dir = config.get('SERVICECONFIG', 'service_checkpoint_dir', fallback='') or None
+
+# stage timings & resources of this run (see StageProfiler); saved under csv_results_path
+if config.getboolean('PROFILECONFIG', 'profile', fallback=False):
+    profiler.enable(config.get('PROFILECONFIG', 'cprofile_stage', fallback=''))
+
+
+if __name__ == '__main__':
+    # Reads the model once & waits for jobs until Ctrl+C.
+    # recognize_audio.py uses it when service_url in config.ini is set (e.g. 'http://127.0.0.1:8765').
+    if not token:
+        print("[FATAL]Set service_token in config.ini; the service doesn't accept requests without it.")
+        sys.exit()
+    service = TranscriptionService("service", model_path, host, port, num_threads, vosk_options, token, checkpoint_dir)
+    service.serve_forever()
+
+    profiler.print_summary()
+    profiler.save(results_dir)